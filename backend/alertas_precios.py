@@ -0,0 +1,268 @@
+"""
+Motor de alertas de precio
+Evalúa cada observación de precio (scraping, cotizaciones de WhatsApp,
+sugerencias) contra la media móvil del producto guardada en
+estadisticas_precios: una lectura y una actualización por observación.
+
+Umbrales: los de umbrales_alerta para el producto tienen prioridad sobre los
+de su categoría, y estos sobre los valores por defecto del .env. Las alertas
+de un mismo producto se descartan mientras no pase el cooldown.
+
+Configuración (.env):
+- ALERTAS_VARIACION: % de variación respecto a la referencia que dispara la alerta
+- ALERTAS_DESVIACIONES: desviaciones estándar respecto a la media móvil (0 = no se usa)
+- ALERTAS_COOLDOWN_MINUTOS: minutos sin repetir alertas del mismo producto
+- ALERTAS_ALFA: peso de la observación nueva en la media móvil exponencial
+- ALERTAS_MIN_OBSERVACIONES: observaciones antes de usar la regla de desviaciones
+"""
+
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import EstadisticaPrecio, PriceAlert, Product, UmbralAlerta
+
+ALERTAS_VARIACION = float(os.getenv("ALERTAS_VARIACION", "10"))
+ALERTAS_DESVIACIONES = float(os.getenv("ALERTAS_DESVIACIONES", "0"))
+ALERTAS_COOLDOWN_MINUTOS = int(os.getenv("ALERTAS_COOLDOWN_MINUTOS", "1440"))
+ALERTAS_ALFA = float(os.getenv("ALERTAS_ALFA", "0.2"))
+ALERTAS_MIN_OBSERVACIONES = int(os.getenv("ALERTAS_MIN_OBSERVACIONES", "3"))
+
+# Segundos que se reutilizan los umbrales leídos de la BD
+_UMBRALES_TTL = 60
+
+
+def _con_zona(fecha: Optional[datetime]) -> Optional[datetime]:
+    """SQLite devuelve fechas sin zona horaria; se asumen en UTC"""
+    if fecha is not None and fecha.tzinfo is None:
+        return fecha.replace(tzinfo=timezone.utc)
+    return fecha
+
+
+class MotorAlertas:
+    """Estadísticas móviles por producto, umbrales configurables y cooldown"""
+
+    def __init__(self, alfa: float = ALERTAS_ALFA):
+        self.alfa = alfa
+        self.por_defecto = {
+            "variacion_porcentaje": ALERTAS_VARIACION,
+            "desviaciones": ALERTAS_DESVIACIONES,
+            "cooldown_minutos": ALERTAS_COOLDOWN_MINUTOS,
+        }
+        self._umbrales: Optional[Dict] = None
+        self._umbrales_leidos_en = 0.0
+        self._lock = threading.Lock()
+        self.metricas = {"observaciones": 0, "alertas": 0, "suprimidas": 0}
+
+    def invalidar_umbrales(self):
+        """Fuerza a releer umbrales_alerta en la próxima evaluación"""
+        self._umbrales = None
+
+    def _tabla_umbrales(self, db: Session) -> Dict:
+        if self._umbrales is None or time.monotonic() - self._umbrales_leidos_en > _UMBRALES_TTL:
+            umbrales = {}
+            for u in db.query(UmbralAlerta):
+                clave = ("producto", u.product_id) if u.product_id else ("categoria", (u.categoria or "").lower())
+                umbrales[clave] = {
+                    campo: getattr(u, campo)
+                    for campo in self.por_defecto
+                    if getattr(u, campo) is not None
+                }
+            self._umbrales = umbrales
+            self._umbrales_leidos_en = time.monotonic()
+        return self._umbrales
+
+    def umbral(self, db: Session, product_id: int, categoria: Optional[str]) -> Dict:
+        """Umbral efectivo: producto > categoría > valores por defecto"""
+        umbrales = self._tabla_umbrales(db)
+        return {
+            **self.por_defecto,
+            **umbrales.get(("categoria", (categoria or "").lower()), {}),
+            **umbrales.get(("producto", product_id), {}),
+        }
+
+    def _evaluar(
+        self,
+        db: Session,
+        estadistica: EstadisticaPrecio,
+        umbral: Dict,
+        referencia: Optional[float],
+        precio: float,
+        origen: str,
+        ahora: datetime,
+    ) -> Optional[PriceAlert]:
+        if not referencia:
+            return None
+        variacion = (precio - referencia) / referencia * 100
+
+        disparada = abs(variacion) > umbral["variacion_porcentaje"]
+        if (
+            not disparada
+            and umbral["desviaciones"]
+            and (estadistica.observaciones or 0) >= ALERTAS_MIN_OBSERVACIONES
+            and estadistica.varianza
+        ):
+            desvio = abs(precio - estadistica.media) / math.sqrt(estadistica.varianza)
+            disparada = desvio > umbral["desviaciones"]
+        if not disparada:
+            return None
+
+        ultima = _con_zona(estadistica.ultima_alerta_en)
+        if ultima and ahora - ultima < timedelta(minutes=umbral["cooldown_minutos"]):
+            with self._lock:
+                self.metricas["suprimidas"] += 1
+            return None
+
+        alerta = PriceAlert(
+            product_id=estadistica.product_id,
+            old_price=referencia,
+            new_price=precio,
+            variation_percent=variacion,
+            origen=origen,
+            created_at=ahora,
+        )
+        db.add(alerta)
+        estadistica.ultima_alerta_en = ahora
+        with self._lock:
+            self.metricas["alertas"] += 1
+        return alerta
+
+    def _actualizar(self, estadistica: EstadisticaPrecio, precio: float, ahora: datetime):
+        """Media y varianza móviles exponenciales (O(1) por observación)"""
+        if not estadistica.observaciones:
+            estadistica.media, estadistica.varianza = precio, 0.0
+        else:
+            diferencia = precio - estadistica.media
+            estadistica.media += self.alfa * diferencia
+            estadistica.varianza = (1 - self.alfa) * (
+                (estadistica.varianza or 0.0) + self.alfa * diferencia * diferencia
+            )
+        estadistica.observaciones = (estadistica.observaciones or 0) + 1
+        estadistica.ultimo_precio = precio
+        estadistica.actualizado_en = ahora
+
+    @staticmethod
+    def _estadisticas(db: Session, ids: set) -> Dict[int, EstadisticaPrecio]:
+        """
+        Filas de estadisticas_precios de los productos; las que faltan se crean
+        con INSERT ... ON CONFLICT DO NOTHING y se vuelven a leer. Así no chocan
+        con filas creadas por un lote anterior de la misma sesión (sin
+        autoflush, una consulta no ve los objetos pendientes) ni por otra
+        petición concurrente.
+        """
+        estadisticas = {
+            e.product_id: e
+            for e in db.query(EstadisticaPrecio).filter(EstadisticaPrecio.product_id.in_(ids))
+        }
+        faltantes = ids - set(estadisticas)
+        if not faltantes:
+            return estadisticas
+
+        dialecto = db.get_bind().dialect.name
+        if dialecto in ("postgresql", "sqlite"):
+            if dialecto == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            db.execute(
+                insert(EstadisticaPrecio.__table__)
+                .values([{"product_id": p, "observaciones": 0} for p in faltantes])
+                .on_conflict_do_nothing(index_elements=["product_id"])
+            )
+        else:
+            # Otros motores: alta con el ORM y flush inmediato
+            for product_id in faltantes:
+                db.add(EstadisticaPrecio(product_id=product_id, observaciones=0))
+            db.flush()
+        estadisticas.update(
+            (e.product_id, e)
+            for e in db.query(EstadisticaPrecio).filter(
+                EstadisticaPrecio.product_id.in_(faltantes)
+            )
+        )
+        return estadisticas
+
+    def observar_lote(
+        self,
+        db: Session,
+        observaciones: Iterable[Tuple[int, Optional[float]]],
+        origen: str,
+        observado_en: Optional[datetime] = None,
+    ) -> List[PriceAlert]:
+        """
+        Evalúa observaciones (product_id, precio) de un mismo origen con dos
+        consultas (más un insert y una lectura si hay productos sin estadísticas). La referencia es la media móvil del producto o,
+        sin observaciones previas, su precio de catálogo. No hace commit.
+        """
+        observaciones = [(p, precio) for p, precio in observaciones if p and precio]
+        if not observaciones:
+            return []
+        ahora = _con_zona(observado_en) or datetime.now(timezone.utc)
+        ids = {p for p, _ in observaciones}
+
+        productos = {
+            fila.id: fila
+            for fila in db.query(Product.id, Product.category, Product.price).filter(
+                Product.id.in_(ids)
+            )
+        }
+        estadisticas = self._estadisticas(db, set(productos))
+
+        alertas = []
+        for product_id, precio in observaciones:
+            producto = productos.get(product_id)
+            if producto is None:
+                continue
+            estadistica = estadisticas[product_id]
+
+            referencia = estadistica.media if estadistica.observaciones else producto.price
+            alerta = self._evaluar(
+                db,
+                estadistica,
+                self.umbral(db, product_id, producto.category),
+                referencia,
+                precio,
+                origen,
+                ahora,
+            )
+            if alerta:
+                alertas.append(alerta)
+            self._actualizar(estadistica, precio, ahora)
+
+        with self._lock:
+            self.metricas["observaciones"] += len(observaciones)
+        return alertas
+
+    def evaluar_variacion(
+        self,
+        db: Session,
+        product_id: int,
+        categoria: Optional[str],
+        referencia: Optional[float],
+        precio: float,
+        origen: str,
+    ) -> Optional[PriceAlert]:
+        """
+        Compara un precio con una referencia dada (p. ej. el precio propio
+        contra el promedio de mercado en una sugerencia) con los mismos
+        umbrales y cooldown, sin tocar la media móvil. No hace commit.
+        """
+        estadistica = self._estadisticas(db, {product_id})[product_id]
+        return self._evaluar(
+            db,
+            estadistica,
+            self.umbral(db, product_id, categoria),
+            referencia,
+            precio,
+            origen,
+            datetime.now(timezone.utc),
+        )
+
+
+# Instancia global del motor de alertas
+motor_alertas = MotorAlertas()
@@ -0,0 +1,101 @@
+"""
+Micro-benchmark de la extracción sin IA sobre los mensajes guardados por el bot
+Compara la implementación anterior (varios re.findall/re.search por mensaje)
+con extraccion_mensajes (una pasada con patrones precompilados).
+Uso: python benchmark_extraccion.py [repeticiones]
+"""
+
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+from extraccion_mensajes import extraer, patron_sin_respuesta, PATRONES_SIN_RESPUESTA
+from parser_html import convertir_precio
+
+COTIZACIONES = Path(__file__).parent.parent / "whatsapp-bot" / "cotizaciones.json"
+
+
+def anterior(mensaje: str):
+    """Implementación previa: patrones de precio, productos y 15 re.search"""
+    precios = []
+    for patron in [
+        r"\$[\d.,]+",
+        r"[\d.,]+\s*(?:pesos|dólares|dolares|bs|soles|pesos)",
+        r"(?:desde|entre|aprox|aproximadamente|costo|precio)\s*[\$]?[\d.,]+",
+    ]:
+        for coincidencia in re.findall(patron, mensaje, re.IGNORECASE):
+            precios.extend(re.findall(r"[\d.,]+", coincidencia))
+
+    mensaje_lower = mensaje.lower()
+    productos = [
+        p
+        for p in ["silla", "escritorio", "mesa", "armario", "estante", "cajonera", "oficina"]
+        if p in mensaje_lower
+    ]
+    sin_respuesta = any(re.search(p, mensaje_lower) for p in PATRONES_SIN_RESPUESTA)
+    return list(set(precios)), productos, sin_respuesta
+
+
+def nueva(mensaje: str):
+    resultado = extraer(mensaje)
+    return resultado["precios"], resultado["productos"], patron_sin_respuesta(mensaje) is not None
+
+
+def medir(funcion, mensajes, repeticiones: int) -> float:
+    """Microsegundos promedio por mensaje"""
+    for mensaje in mensajes:  # calentamiento
+        funcion(mensaje)
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for mensaje in mensajes:
+            funcion(mensaje)
+    return (time.perf_counter() - inicio) * 1e6 / (repeticiones * len(mensajes))
+
+
+def valores(precios):
+    return {v for v in (convertir_precio(p) for p in precios) if v is not None}
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    if not COTIZACIONES.exists():
+        print(f"⚠️  No se encontró {COTIZACIONES}")
+        return
+    datos = json.loads(COTIZACIONES.read_text(encoding="utf-8"))
+    mensajes = [c["mensajeCompleto"] for c in datos.get("cotizaciones", []) if c.get("mensajeCompleto")]
+    print(f"📄 {COTIZACIONES.name}: {len(mensajes)} mensajes")
+    print(f"🔁 Repeticiones: {repeticiones}\n")
+
+    base_us = medir(anterior, mensajes, repeticiones)
+    nueva_us = medir(nueva, mensajes, repeticiones)
+    print(f"   anterior   {base_us:8.1f} µs/mensaje")
+    print(f"   una pasada {nueva_us:8.1f} µs/mensaje  x{base_us / nueva_us:5.1f}\n")
+
+    iguales, ampliados, distintos = 0, 0, 0
+    for mensaje in mensajes:
+        precios_a, productos_a, sin_a = anterior(mensaje)
+        precios_n, productos_n, sin_n = nueva(mensaje)
+        mismos_resto = set(productos_a) == set(productos_n) and sin_a == sin_n
+        if valores(precios_a) == valores(precios_n) and mismos_resto:
+            iguales += 1
+            continue
+        if valores(precios_a) < valores(precios_n) and mismos_resto:
+            # p. ej. "576 bolivianos" o "500 dólar", que los patrones anteriores no cubrían
+            ampliados += 1
+            marca = "➕"
+        else:
+            distintos += 1
+            marca = "≠"
+        print(f"   {marca} {mensaje[:70]!r}")
+        print(f"     anterior: {sorted(valores(precios_a))} {sorted(productos_a)} {sin_a}")
+        print(f"     nueva:    {sorted(valores(precios_n))} {sorted(productos_n)} {sin_n}")
+    print(
+        f"\n✅ {iguales} iguales  ➕ {ampliados} con precios nuevos detectados  "
+        f"{'❌' if distintos else '✅'} {distintos} distintos (de {len(mensajes)} mensajes)"
+    )
+
+
+if __name__ == "__main__":
+    main()
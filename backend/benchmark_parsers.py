@@ -0,0 +1,60 @@
+"""
+Micro-benchmark de los parsers HTML sobre páginas de listado guardadas
+Uso: python benchmark_parsers.py [repeticiones]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+from parser_html import backends_disponibles, crear_parser
+
+PAGINAS = [
+    Path(__file__).parent.parent / "scra" / "livingroom_debug.html",
+    Path(__file__).parent.parent / "scra" / "debug_420.html",
+]
+
+
+def medir(parser, html: str, repeticiones: int) -> float:
+    """Milisegundos promedio por página"""
+    parser.parsear_listado(html)  # calentamiento
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        parser.parsear_listado(html)
+    return (time.perf_counter() - inicio) * 1000 / repeticiones
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    backends = backends_disponibles()
+    print(f"🔧 Backends disponibles: {', '.join(backends)}")
+    print(f"🔁 Repeticiones por página: {repeticiones}\n")
+
+    for ruta in PAGINAS:
+        if not ruta.exists():
+            print(f"⚠️  No se encontró {ruta}")
+            continue
+        html = ruta.read_text(encoding="utf-8")
+        print(f"📄 {ruta.name} ({len(html) / 1024:.0f} KB)")
+
+        referencia = None
+        base_ms = None
+        for nombre in reversed(backends):  # bs4 primero como referencia
+            parser = crear_parser(nombre)
+            resultado = parser.parsear_listado(html)
+            if referencia is None:
+                referencia = resultado
+            iguales = resultado == referencia
+
+            ms = medir(parser, html, repeticiones)
+            base_ms = base_ms or ms
+            print(
+                f"   {nombre:<11} {ms:8.2f} ms/página  x{base_ms / ms:5.1f}  "
+                f"tarjetas={len(resultado['tarjetas'])}  "
+                f"{'✅ igual a bs4' if iguales else '❌ difiere de bs4'}"
+            )
+        print()
+
+
+if __name__ == "__main__":
+    main()
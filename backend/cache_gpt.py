@@ -0,0 +1,217 @@
+"""
+Caché de respuestas de GPT para llamadas casi deterministas
+(extracción de precios, evaluación SÍ/NO, selección de página de PDF)
+
+La clave es un hash del modelo, los mensajes y los parámetros de la llamada,
+así que un texto repetido de un proveedor no vuelve a gastar tokens. Se guarda
+en SQLite (compartido entre procesos: el backend y gpt/app.py) con TTL y un
+máximo de entradas que descarta las menos usadas; delante hay una copia en
+memoria del proceso para que los aciertos repetidos no toquen el disco.
+
+Configuración (.env):
+- GPT_CACHE: "false" para desactivarla
+- GPT_CACHE_DB: ruta del archivo SQLite (por defecto backend/.cache_gpt.db)
+- GPT_CACHE_TTL: segundos de validez de una respuesta
+- GPT_CACHE_MAX_ENTRADAS: entradas máximas en el archivo
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+GPT_CACHE_ACTIVA = os.getenv("GPT_CACHE", "true").lower() in ("1", "true", "si")
+GPT_CACHE_DB = Path(os.getenv("GPT_CACHE_DB", str(Path(__file__).parent / ".cache_gpt.db")))
+GPT_CACHE_TTL = int(os.getenv("GPT_CACHE_TTL", str(7 * 24 * 3600)))
+GPT_CACHE_MAX_ENTRADAS = int(os.getenv("GPT_CACHE_MAX_ENTRADAS", "5000"))
+
+# Entradas que se mantienen también en memoria del proceso
+_MAX_EN_MEMORIA = 512
+# Cada cuántas escrituras se purgan vencidas y sobrantes
+_PURGAR_CADA = 100
+
+
+class CacheGPT:
+    """Caché direccionada por contenido: hash(modelo, mensajes, parámetros) → respuesta"""
+
+    def __init__(
+        self,
+        ruta: Path = GPT_CACHE_DB,
+        ttl: int = GPT_CACHE_TTL,
+        max_entradas: int = GPT_CACHE_MAX_ENTRADAS,
+        activa: bool = GPT_CACHE_ACTIVA,
+    ):
+        self.ruta = Path(ruta)
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.activa = activa
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._memoria: "OrderedDict[str, tuple]" = OrderedDict()
+        self._escrituras = 0
+        self.stats = {
+            "hits": 0,
+            "hits_memoria": 0,
+            "misses": 0,
+            "guardadas": 0,
+            "tokens_ahorrados": 0,
+        }
+        if self.activa:
+            self._conexion()
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Una conexión por hilo (sqlite3 no comparte conexiones entre hilos)"""
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+            conexion = sqlite3.connect(str(self.ruta), timeout=5, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            conexion.execute(
+                """
+                CREATE TABLE IF NOT EXISTS respuestas (
+                    clave TEXT PRIMARY KEY,
+                    respuesta TEXT NOT NULL,
+                    tokens INTEGER DEFAULT 0,
+                    creado_en REAL NOT NULL,
+                    usado_en REAL NOT NULL
+                )
+                """
+            )
+            conexion.execute(
+                "CREATE INDEX IF NOT EXISTS ix_respuestas_usado_en ON respuestas (usado_en)"
+            )
+            self._local.conexion = conexion
+        return conexion
+
+    @staticmethod
+    def clave(model: str, mensajes: List[Dict], **parametros) -> str:
+        """Hash estable de la llamada (los parámetros se ordenan por nombre)"""
+        contenido = json.dumps(
+            {"model": model, "messages": mensajes, "params": parametros},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+    def obtener(self, clave: str) -> Optional[str]:
+        """Respuesta guardada o None si no está o venció"""
+        if not self.activa:
+            return None
+        ahora = time.time()
+
+        with self._lock:
+            en_memoria = self._memoria.get(clave)
+            if en_memoria and ahora - en_memoria[1] < self.ttl:
+                self._memoria.move_to_end(clave)
+                self.stats["hits"] += 1
+                self.stats["hits_memoria"] += 1
+                self.stats["tokens_ahorrados"] += en_memoria[2]
+                return en_memoria[0]
+
+        try:
+            conexion = self._conexion()
+            fila = conexion.execute(
+                "SELECT respuesta, tokens, creado_en FROM respuestas WHERE clave = ?",
+                (clave,),
+            ).fetchone()
+            if fila and ahora - fila[2] < self.ttl:
+                conexion.execute(
+                    "UPDATE respuestas SET usado_en = ? WHERE clave = ?", (ahora, clave)
+                )
+            elif fila:
+                conexion.execute("DELETE FROM respuestas WHERE clave = ?", (clave,))
+                fila = None
+        except sqlite3.Error as e:
+            print(f"⚠️ Error leyendo la caché de GPT: {e}")
+            fila = None
+
+        with self._lock:
+            if not fila:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self.stats["tokens_ahorrados"] += fila[1] or 0
+            self._recordar(clave, fila[0], fila[2], fila[1] or 0)
+        return fila[0]
+
+    def _recordar(self, clave: str, respuesta: str, creado_en: float, tokens: int):
+        self._memoria[clave] = (respuesta, creado_en, tokens)
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > _MAX_EN_MEMORIA:
+            self._memoria.popitem(last=False)
+
+    def guardar(self, clave: str, respuesta: str, tokens: int = 0):
+        """Guarda la respuesta; `tokens` es lo que costó (se suma al ahorro en cada acierto)"""
+        if not self.activa:
+            return
+        ahora = time.time()
+        try:
+            conexion = self._conexion()
+            conexion.execute(
+                "INSERT OR REPLACE INTO respuestas (clave, respuesta, tokens, creado_en, usado_en) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (clave, respuesta, tokens, ahora, ahora),
+            )
+        except sqlite3.Error as e:
+            print(f"⚠️ Error guardando en la caché de GPT: {e}")
+            return
+
+        with self._lock:
+            self.stats["guardadas"] += 1
+            self._recordar(clave, respuesta, ahora, tokens)
+            self._escrituras += 1
+            purgar = self._escrituras % _PURGAR_CADA == 0
+        if purgar:
+            self.purgar()
+
+    def purgar(self) -> int:
+        """Elimina las vencidas y, si sobran, las usadas hace más tiempo"""
+        try:
+            conexion = self._conexion()
+            eliminadas = conexion.execute(
+                "DELETE FROM respuestas WHERE creado_en < ?", (time.time() - self.ttl,)
+            ).rowcount
+            eliminadas += conexion.execute(
+                """
+                DELETE FROM respuestas WHERE clave IN (
+                    SELECT clave FROM respuestas ORDER BY usado_en DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entradas,),
+            ).rowcount
+            return eliminadas
+        except sqlite3.Error as e:
+            print(f"⚠️ Error purgando la caché de GPT: {e}")
+            return 0
+
+    def limpiar(self):
+        """Vacía la caché (disco y memoria)"""
+        with self._lock:
+            self._memoria.clear()
+        if self.activa:
+            self._conexion().execute("DELETE FROM respuestas")
+
+    def metricas(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+        consultas = stats["hits"] + stats["misses"]
+        stats["tasa_aciertos"] = round(stats["hits"] / consultas, 3) if consultas else 0.0
+        stats["activa"] = self.activa
+        if self.activa:
+            try:
+                stats["entradas"] = self._conexion().execute(
+                    "SELECT COUNT(*) FROM respuestas"
+                ).fetchone()[0]
+            except sqlite3.Error:
+                stats["entradas"] = None
+        return stats
+
+
+# Instancia global de la caché
+cache_gpt = CacheGPT()
@@ -0,0 +1,242 @@
+"""
+Caché HTTP en disco para el scraping
+Guarda las respuestas 200 con su ETag/Last-Modified y revalida con
+If-None-Match/If-Modified-Since. Si el servidor no manda validadores, la copia
+se sirve sin red mientras no supere el TTL.
+
+Cada _PURGAR_CADA escrituras se eliminan las entradas vencidas y, si el
+directorio supera SCRAPER_CACHE_MAX_MB, las guardadas hace más tiempo.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import requests
+
+CACHE_HTTP_ACTIVA = os.getenv("SCRAPER_CACHE_HTTP", "true").lower() in ("1", "true", "si")
+CACHE_HTTP_DIR = Path(
+    os.getenv("SCRAPER_CACHE_DIR", str(Path(__file__).parent / ".cache_http"))
+)
+# Segundos que se sirve una copia sin validadores antes de volver a descargarla
+CACHE_HTTP_TTL = int(os.getenv("SCRAPER_CACHE_TTL", "300"))
+# Segundos sin guardarse ni revalidarse tras los que se elimina cualquier entrada
+CACHE_HTTP_RETENCION = int(os.getenv("SCRAPER_CACHE_RETENCION", str(7 * 24 * 3600)))
+# Tamaño máximo del directorio de la caché
+CACHE_HTTP_MAX_MB = float(os.getenv("SCRAPER_CACHE_MAX_MB", "200"))
+
+# Cada cuántas escrituras se purga el directorio
+_PURGAR_CADA = 200
+
+# Resultados de una consulta a la caché
+HIT = "hit"  # servida desde disco sin tocar la red
+REVALIDADO = "revalidado"  # el servidor respondió 304
+MISS = "miss"  # descargada (no estaba, expiró o cambió)
+
+
+class CacheHTTP:
+    """Caché de respuestas GET por URL, segura entre hilos y procesos"""
+
+    def __init__(
+        self,
+        directorio: Path = CACHE_HTTP_DIR,
+        ttl: int = CACHE_HTTP_TTL,
+        activa: bool = CACHE_HTTP_ACTIVA,
+        retencion: int = CACHE_HTTP_RETENCION,
+        max_mb: float = CACHE_HTTP_MAX_MB,
+    ):
+        self.directorio = Path(directorio)
+        self.ttl = ttl
+        self.activa = activa
+        self.retencion = retencion
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._escrituras = 0
+        if self.activa:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+
+    def _rutas(self, url: str) -> Tuple[Path, Path]:
+        clave = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return (
+            self.directorio / f"{clave}.json",
+            self.directorio / f"{clave}.body",
+        )
+
+    def _leer(self, url: str) -> Optional[Dict]:
+        ruta_meta, ruta_cuerpo = self._rutas(url)
+        try:
+            meta = json.loads(ruta_meta.read_text(encoding="utf-8"))
+            meta["cuerpo"] = ruta_cuerpo.read_bytes()
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("url") == url else None
+
+    def _escribir(self, url: str, response: requests.Response):
+        """Escritura atómica: cuerpo primero, metadatos después"""
+        ruta_meta, ruta_cuerpo = self._rutas(url)
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "encoding": response.encoding,
+            "content_type": response.headers.get("Content-Type"),
+            "guardado_en": time.time(),
+        }
+        sufijo = f".{os.getpid()}.{id(response)}.tmp"
+        for ruta, escribir in (
+            (ruta_cuerpo, lambda r: r.write_bytes(response.content)),
+            (ruta_meta, lambda r: r.write_text(json.dumps(meta), encoding="utf-8")),
+        ):
+            temporal = ruta.with_name(ruta.name + sufijo)
+            escribir(temporal)
+            os.replace(temporal, ruta)
+
+    def _tocar(self, url: str, entrada: Dict):
+        """Renueva la fecha de una entrada revalidada con 304"""
+        ruta_meta, _ = self._rutas(url)
+        meta = {k: v for k, v in entrada.items() if k != "cuerpo"}
+        meta["guardado_en"] = time.time()
+        temporal = ruta_meta.with_name(ruta_meta.name + f".{os.getpid()}.tmp")
+        try:
+            temporal.write_text(json.dumps(meta), encoding="utf-8")
+            os.replace(temporal, ruta_meta)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _como_respuesta(url: str, entrada: Dict) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = entrada["cuerpo"]
+        response.encoding = entrada.get("encoding")
+        if entrada.get("content_type"):
+            response.headers["Content-Type"] = entrada["content_type"]
+        return response
+
+    def obtener(
+        self,
+        session,
+        url: str,
+        timeout: float = 10,
+        headers: Optional[Dict] = None,
+        **kwargs,
+    ) -> Tuple[requests.Response, Optional[str]]:
+        """
+        GET a través de la caché con `session` (una sesión de requests o el
+        cliente HTTP compartido; `kwargs` se pasan a su get). Devuelve
+        (respuesta, estado) con estado HIT, REVALIDADO o MISS (None si la
+        caché está desactivada). Un HIT no sale a la red.
+        """
+        if not self.activa:
+            return session.get(url, timeout=timeout, headers=headers, **kwargs), None
+
+        entrada = self._leer(url)
+        validadores = {}
+        if entrada:
+            if entrada.get("etag"):
+                validadores["If-None-Match"] = entrada["etag"]
+            if entrada.get("last_modified"):
+                validadores["If-Modified-Since"] = entrada["last_modified"]
+            if not validadores and time.time() - entrada["guardado_en"] < self.ttl:
+                return self._como_respuesta(url, entrada), HIT
+
+        response = session.get(
+            url, timeout=timeout, headers={**(headers or {}), **validadores}, **kwargs
+        )
+
+        if response.status_code == 304 and entrada:
+            self._tocar(url, entrada)
+            return self._como_respuesta(url, entrada), REVALIDADO
+        if response.status_code == 200:
+            try:
+                self._escribir(url, response)
+            except OSError as e:
+                print(f"⚠️ No se pudo guardar en caché {url}: {e}")
+            else:
+                with self._lock:
+                    self._escrituras += 1
+                    purgar = self._escrituras % _PURGAR_CADA == 0
+                if purgar:
+                    self.purgar()
+        return response, MISS
+
+    @staticmethod
+    def _eliminar(ruta_meta: Path):
+        ruta_meta.unlink(missing_ok=True)
+        ruta_meta.with_suffix(".body").unlink(missing_ok=True)
+
+    def _entradas(self):
+        """[(ruta de metadatos, metadatos o None si no se pueden leer, bytes)]"""
+        entradas = []
+        for ruta_meta in self.directorio.glob("*.json"):
+            try:
+                meta = json.loads(ruta_meta.read_text(encoding="utf-8"))
+                tamano = ruta_meta.stat().st_size
+                ruta_cuerpo = ruta_meta.with_suffix(".body")
+                if ruta_cuerpo.exists():
+                    tamano += ruta_cuerpo.stat().st_size
+            except (OSError, ValueError):
+                meta, tamano = None, 0
+            entradas.append((ruta_meta, meta, tamano))
+        return entradas
+
+    def purgar(self) -> int:
+        """
+        Elimina las entradas vencidas (sin validadores y con más de ttl
+        segundos, o sin revalidar en más de `retencion`) y, si el directorio
+        supera max_bytes, las guardadas hace más tiempo. Devuelve cuántas eliminó.
+        """
+        if not self.activa:
+            return 0
+        ahora = time.time()
+        eliminadas = 0
+        vigentes = []
+        try:
+            for ruta_meta, meta, tamano in self._entradas():
+                edad = ahora - meta.get("guardado_en", 0) if meta else None
+                sin_validadores = meta and not (meta.get("etag") or meta.get("last_modified"))
+                if meta is None or edad > self.retencion or (sin_validadores and edad > self.ttl):
+                    self._eliminar(ruta_meta)
+                    eliminadas += 1
+                else:
+                    vigentes.append((meta["guardado_en"], tamano, ruta_meta))
+
+            total = sum(tamano for _, tamano, _ in vigentes)
+            for _, tamano, ruta_meta in sorted(vigentes):
+                if total <= self.max_bytes:
+                    break
+                self._eliminar(ruta_meta)
+                total -= tamano
+                eliminadas += 1
+        except OSError as e:
+            print(f"⚠️ Error purgando la caché HTTP: {e}")
+        return eliminadas
+
+    def limpiar(self) -> int:
+        """Elimina todas las entradas; devuelve cuántas había"""
+        eliminadas = 0
+        for ruta in self.directorio.glob("*.json"):
+            self._eliminar(ruta)
+            eliminadas += 1
+        return eliminadas
+
+    def metricas(self) -> Dict:
+        entradas = self._entradas() if self.activa else []
+        return {
+            "activa": self.activa,
+            "directorio": str(self.directorio),
+            "entradas": len(entradas),
+            "megabytes": round(sum(tamano for _, _, tamano in entradas) / (1024 * 1024), 2),
+            "max_megabytes": round(self.max_bytes / (1024 * 1024), 2),
+            "ttl": self.ttl,
+            "retencion": self.retencion,
+        }
+
+
+# Instancia global de la caché
+cache_http = CacheHTTP()
@@ -0,0 +1,343 @@
+"""
+Historial de conversaciones con proveedores para los prompts de GPT
+Reemplaza el diccionario en memoria de gpt_client.py y gpt/app.py: los
+mensajes se guardan en la tabla mensajes_conversacion (SQLite o Postgres),
+así sobreviven a reinicios y se comparten entre workers y entre ambos servicios.
+
+- Por número se guardan a lo sumo CONVERSACION_MAX_MENSAJES mensajes y
+  CONVERSACION_MAX_TOKENS tokens estimados; al agregar se borran los más viejos
+- Delante de la tabla hay una copia en memoria de las conversaciones usadas
+  hace menos tiempo (LRU); agregar la extiende sin releer el historial. Pasados
+  CONVERSACION_VALIDEZ_SEGUNDOS se valida con el último id guardado del
+  número, así un mensaje escrito por otro worker fuerza a releer
+- Los mensajes con más de CONVERSACION_DIAS_INACTIVA días se eliminan
+- El resumen acumulado de los turnos viejos (prompt_conversacion.py) se
+  guarda en resumenes_conversacion; su copia en memoria se valida con el
+  primer y último id guardados del número (limpiar o recortar en otro worker
+  obliga a releerlo)
+
+Configuración (.env):
+- CONVERSACIONES_DB_URL: base de datos del historial (por defecto DATABASE_URL
+  o backend/mobicorp.db)
+- CONVERSACION_MAX_MENSAJES, CONVERSACION_MAX_TOKENS
+- CONVERSACION_EN_MEMORIA: conversaciones que se mantienen en memoria
+- CONVERSACION_VALIDEZ_SEGUNDOS: tiempo que la copia en memoria se usa sin
+  consultar la tabla
+- DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT: los mismos de database.py
+- CONVERSACION_DIAS_INACTIVA
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    delete,
+    func,
+    insert,
+    select,
+    update,
+)
+
+from prompt_conversacion import TOKENS_POR_MENSAJE, contar_tokens
+
+CONVERSACIONES_DB_URL = os.getenv(
+    "CONVERSACIONES_DB_URL",
+    os.getenv("DATABASE_URL", f"sqlite:///{Path(__file__).parent / 'mobicorp.db'}"),
+)
+CONVERSACION_MAX_MENSAJES = int(os.getenv("CONVERSACION_MAX_MENSAJES", "20"))
+CONVERSACION_MAX_TOKENS = int(os.getenv("CONVERSACION_MAX_TOKENS", "1500"))
+CONVERSACION_EN_MEMORIA = int(os.getenv("CONVERSACION_EN_MEMORIA", "256"))
+CONVERSACION_DIAS_INACTIVA = int(os.getenv("CONVERSACION_DIAS_INACTIVA", "30"))
+CONVERSACION_VALIDEZ_SEGUNDOS = float(os.getenv("CONVERSACION_VALIDEZ_SEGUNDOS", "2"))
+# Límites del pool: se leen igual que en database.py (gpt/app.py no lo importa)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "2"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "3"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Cada cuántos mensajes agregados se eliminan los vencidos
+_PURGAR_CADA = 500
+
+metadata = MetaData()
+
+mensajes_conversacion = Table(
+    "mensajes_conversacion",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("numero", String(50), nullable=False),
+    Column("tipo", String(20), nullable=False),
+    Column("mensaje", Text, nullable=False),
+    Column("creado_en", DateTime, nullable=False),
+    Index("ix_mensajes_conversacion_numero_id", "numero", "id"),
+)
+
+resumenes_conversacion = Table(
+    "resumenes_conversacion",
+    metadata,
+    Column("numero", String(50), primary_key=True),
+    # Último id de mensajes_conversacion incluido en el resumen
+    Column("hasta_id", Integer, nullable=False),
+    Column("resumen", Text, nullable=False),
+    Column("actualizado_en", DateTime, nullable=False),
+)
+
+
+class HistorialConversaciones:
+    """Historial acotado por número, persistente y con caché LRU en memoria"""
+
+    def __init__(
+        self,
+        url: str = CONVERSACIONES_DB_URL,
+        max_mensajes: int = CONVERSACION_MAX_MENSAJES,
+        max_tokens: int = CONVERSACION_MAX_TOKENS,
+        en_memoria: int = CONVERSACION_EN_MEMORIA,
+        dias_inactiva: int = CONVERSACION_DIAS_INACTIVA,
+        validez: float = CONVERSACION_VALIDEZ_SEGUNDOS,
+    ):
+        if url.startswith("postgresql://"):
+            url = url.replace("postgresql://", "postgresql+psycopg2://", 1)
+        self.url = url
+        self.max_mensajes = max(1, max_mensajes)
+        self.max_tokens = max_tokens
+        self.en_memoria = en_memoria
+        self.dias_inactiva = dias_inactiva
+        self.validez = validez
+        self._engine = None
+        self._lock = threading.Lock()
+        # numero -> (último id, [(id, tipo, mensaje)], validado en (monotonic))
+        self._memoria: "OrderedDict[str, tuple]" = OrderedDict()
+        # numero -> ((primer id, último id), (hasta_id, resumen))
+        self._resumenes: "OrderedDict[str, tuple]" = OrderedDict()
+        self._agregados = 0
+        self.metricas = {"aciertos": 0, "lecturas_bd": 0, "recortados": 0, "purgados": 0}
+
+    def _motor(self):
+        """
+        Engine propio (gpt/app.py no importa database.py) con los mismos
+        límites de pool que database.py; crea la tabla la primera vez
+        """
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    engine = create_engine(
+                        self.url,
+                        pool_pre_ping=True,
+                        pool_recycle=300,
+                        pool_size=DB_POOL_SIZE,
+                        max_overflow=DB_MAX_OVERFLOW,
+                        pool_timeout=DB_POOL_TIMEOUT,
+                        future=True,
+                    )
+                    metadata.create_all(engine)
+                    self._engine = engine
+        return self._engine
+
+    def _recordar(self, numero: str, ultimo_id: Optional[int], filas: List[tuple]):
+        with self._lock:
+            self._memoria[numero] = (ultimo_id, filas, time.monotonic())
+            self._memoria.move_to_end(numero)
+            while len(self._memoria) > self.en_memoria:
+                self._memoria.popitem(last=False)
+
+    def _filas(self, conexion, numero: str, limite: Optional[int] = None) -> List[tuple]:
+        """Mensajes del número en orden; con `limite`, solo los más nuevos"""
+        t = mensajes_conversacion
+        consulta = select(t.c.id, t.c.tipo, t.c.mensaje).where(t.c.numero == numero)
+        if limite is not None:
+            consulta = consulta.order_by(t.c.id.desc()).limit(limite)
+            return [tuple(fila) for fila in reversed(conexion.execute(consulta).all())]
+        return [tuple(fila) for fila in conexion.execute(consulta.order_by(t.c.id))]
+
+    def _en_memoria(self, numero: str, ultimo_id=None, validar: bool = False):
+        """Filas guardadas si siguen vigentes (por tiempo o por último id)"""
+        with self._lock:
+            guardado = self._memoria.get(numero)
+            if not guardado:
+                return None
+            if validar:
+                if guardado[0] != ultimo_id:
+                    return None
+                self._memoria[numero] = (ultimo_id, guardado[1], time.monotonic())
+            elif time.monotonic() - guardado[2] >= self.validez:
+                return None
+            self._memoria.move_to_end(numero)
+            self.metricas["aciertos"] += 1
+            return guardado[1]
+
+    def obtener(self, numero: str) -> List[Dict]:
+        """Mensajes del número, del más viejo al más nuevo ({"id", "tipo", "mensaje"})"""
+        filas = self._en_memoria(numero)
+        if filas is None:
+            t = mensajes_conversacion
+            with self._motor().connect() as conexion:
+                ultimo_id = conexion.execute(
+                    select(func.max(t.c.id)).where(t.c.numero == numero)
+                ).scalar()
+                filas = self._en_memoria(numero, ultimo_id, validar=True)
+                if filas is None:
+                    filas = self._filas(conexion, numero) if ultimo_id is not None else []
+                    self.metricas["lecturas_bd"] += 1
+                    self._recordar(numero, ultimo_id, filas)
+        return [{"id": id_, "tipo": tipo, "mensaje": mensaje} for id_, tipo, mensaje in filas]
+
+    def _recortar(self, filas: List[tuple]) -> List[tuple]:
+        """Los mensajes más nuevos que entran en el límite de mensajes y de tokens"""
+        conservadas, tokens = [], 0
+        for fila in reversed(filas):
+            tokens += contar_tokens(fila[2]) + TOKENS_POR_MENSAJE
+            if conservadas and (
+                len(conservadas) >= self.max_mensajes or tokens > self.max_tokens
+            ):
+                break
+            conservadas.append(fila)
+        conservadas.reverse()
+        return conservadas
+
+    def agregar(self, numero: str, mensaje: str, tipo: str = "usuario"):
+        """
+        Agrega un mensaje y descarta los más viejos que excedan los límites
+        La copia en memoria se extiende si sigue al día (el id anterior del
+        número es su último id); si no, se leen solo los max_mensajes más nuevos
+        """
+        t = mensajes_conversacion
+        with self._motor().begin() as conexion:
+            nuevo_id = conexion.execute(
+                insert(t).values(
+                    numero=numero,
+                    tipo=tipo,
+                    mensaje=mensaje,
+                    creado_en=datetime.now(timezone.utc),
+                )
+            ).inserted_primary_key[0]
+            anterior_id = conexion.execute(
+                select(func.max(t.c.id)).where(t.c.numero == numero, t.c.id < nuevo_id)
+            ).scalar()
+            with self._lock:
+                guardado = self._memoria.get(numero)
+            if anterior_id is None:
+                filas = [(nuevo_id, tipo, mensaje)]
+            elif guardado and guardado[0] == anterior_id:
+                filas = guardado[1] + [(nuevo_id, tipo, mensaje)]
+            else:
+                filas = self._filas(conexion, numero, limite=self.max_mensajes + 1)
+                self.metricas["lecturas_bd"] += 1
+            conservadas = self._recortar(filas)
+            if len(conservadas) < len(filas):
+                # Se conservan en la tabla los len(conservadas) más nuevos
+                recientes = (
+                    select(t.c.id)
+                    .where(t.c.numero == numero)
+                    .order_by(t.c.id.desc())
+                    .limit(len(conservadas))
+                    .subquery()
+                )
+                self.metricas["recortados"] += conexion.execute(
+                    delete(t).where(
+                        t.c.numero == numero,
+                        t.c.id < select(func.min(recientes.c.id)).scalar_subquery(),
+                    )
+                ).rowcount
+        self._recordar(numero, nuevo_id, conservadas)
+
+        with self._lock:
+            self._agregados += 1
+            purgar = self._agregados % _PURGAR_CADA == 0
+        if purgar:
+            self.purgar_inactivas()
+
+    @staticmethod
+    def _ids(conexion, numero: str) -> Tuple[Optional[int], Optional[int]]:
+        """Primer y último id guardados del número (cambian al agregar, recortar o limpiar)"""
+        t = mensajes_conversacion
+        return tuple(
+            conexion.execute(
+                select(func.min(t.c.id), func.max(t.c.id)).where(t.c.numero == numero)
+            ).one()
+        )
+
+    def obtener_resumen(self, numero: str) -> Tuple[int, Optional[str]]:
+        """(último id resumido, resumen) del número; (0, None) si no tiene"""
+        r = resumenes_conversacion
+        with self._motor().connect() as conexion:
+            ids = self._ids(conexion, numero)
+            with self._lock:
+                guardado = self._resumenes.get(numero)
+                if guardado and guardado[0] == ids:
+                    self._resumenes.move_to_end(numero)
+                    return guardado[1]
+            fila = conexion.execute(
+                select(r.c.hasta_id, r.c.resumen).where(r.c.numero == numero)
+            ).first()
+        resumen = tuple(fila) if fila else (0, None)
+        self._recordar_resumen(numero, ids, resumen)
+        return resumen
+
+    def guardar_resumen(self, numero: str, hasta_id: int, resumen: str):
+        r = resumenes_conversacion
+        valores = {
+            "hasta_id": hasta_id,
+            "resumen": resumen,
+            "actualizado_en": datetime.now(timezone.utc),
+        }
+        with self._motor().begin() as conexion:
+            actualizadas = conexion.execute(
+                update(r).where(r.c.numero == numero).values(**valores)
+            ).rowcount
+            if not actualizadas:
+                conexion.execute(insert(r).values(numero=numero, **valores))
+            ids = self._ids(conexion, numero)
+        self._recordar_resumen(numero, ids, (hasta_id, resumen))
+
+    def _recordar_resumen(self, numero: str, ids: tuple, resumen: tuple):
+        with self._lock:
+            self._resumenes[numero] = (ids, resumen)
+            self._resumenes.move_to_end(numero)
+            while len(self._resumenes) > self.en_memoria:
+                self._resumenes.popitem(last=False)
+
+    def limpiar(self, numero: str):
+        """Elimina la conversación del número y su resumen"""
+        t, r = mensajes_conversacion, resumenes_conversacion
+        with self._motor().begin() as conexion:
+            conexion.execute(delete(t).where(t.c.numero == numero))
+            conexion.execute(delete(r).where(r.c.numero == numero))
+        with self._lock:
+            self._memoria.pop(numero, None)
+            self._resumenes.pop(numero, None)
+
+    def purgar_inactivas(self) -> int:
+        """Elimina los mensajes y resúmenes con más de dias_inactiva días"""
+        t, r = mensajes_conversacion, resumenes_conversacion
+        limite = datetime.now(timezone.utc) - timedelta(days=self.dias_inactiva)
+        with self._motor().begin() as conexion:
+            eliminados = conexion.execute(delete(t).where(t.c.creado_en < limite)).rowcount
+            conexion.execute(delete(r).where(r.c.actualizado_en < limite))
+        if eliminados:
+            # Las copias en memoria pueden tener mensajes eliminados
+            with self._lock:
+                self._memoria.clear()
+                self._resumenes.clear()
+            self.metricas["purgados"] += eliminados
+        return eliminados
+
+    def resumen(self) -> Dict:
+        with self._lock:
+            en_memoria = len(self._memoria)
+        return {**self.metricas, "en_memoria": en_memoria}
+
+
+# Instancia global del historial
+historial_conversaciones = HistorialConversaciones()
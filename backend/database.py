@@ -19,14 +19,19 @@ print(
     f"📊 Conectando a base de datos: {DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else 'SQLite local'}"
 )
 
+# Límites del pool (conversaciones.py lee las mismas variables)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "2"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "3"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
 engine = create_engine(
     DATABASE_URL,
     echo=False,  # Cambiar a True para ver las queries SQL
     pool_pre_ping=True,  # Verificar conexión antes de usar
     pool_recycle=300,  # Reciclar conexiones cada 5 minutos
-    pool_size=2,  # Número máximo de conexiones permanentes
-    max_overflow=3,  # Conexiones adicionales temporales
-    pool_timeout=30,  # Tiempo de espera para obtener conexión
+    pool_size=DB_POOL_SIZE,  # Número máximo de conexiones permanentes
+    max_overflow=DB_MAX_OVERFLOW,  # Conexiones adicionales temporales
+    pool_timeout=DB_POOL_TIMEOUT,  # Tiempo de espera para obtener conexión
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -0,0 +1,424 @@
+"""
+Emparejamiento de nombres de productos externos con el catálogo (Product)
+Índice TF-IDF de n-gramas de caracteres sobre los nombres del catálogo. Las
+similitudes coseno se calculan por lotes con NumPy: producto disperso por
+listas invertidas (un bincount por lote), sin recorrer fila por fila.
+
+Orígenes enlazados:
+- productos_scraped.nombre → ProductoScraped.producto_id
+- whatsapp_productos_cotizados.nombre_producto → WhatsAppProductoCotizado.producto_id
+
+Los casos claros se enlazan en bloque; los dudosos (similitud intermedia o
+dos candidatos casi empatados) quedan en la cola de revisión
+(emparejamientos_revision). Cada pasada solo evalúa filas nuevas: el último
+id evaluado por origen se guarda en emparejamientos_avance (compartido entre
+workers y reinicios) junto con la firma del catálogo; si el catálogo cambia
+se reconstruye el índice y se vuelven a evaluar las filas sin enlace.
+Las rutas que insertan filas lanzan una pasada incremental en segundo plano
+(emparejar_nuevos).
+
+Configuración (.env):
+- MATCH_UMBRAL_AUTO: similitud mínima para enlazar sin revisión
+- MATCH_UMBRAL_REVISION: similitud mínima para enviar a revisión
+- MATCH_MARGEN: diferencia mínima con el segundo candidato para enlazar sin revisión
+- MATCH_NGRAMA: largo de los n-gramas de caracteres
+"""
+
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import Session
+
+from alertas_precios import motor_alertas
+from database import SessionLocal
+from models import (
+    EmparejamientoAvance,
+    EmparejamientoRevision,
+    Product,
+    ProductoScraped,
+    WhatsAppProductoCotizado,
+)
+
+MATCH_UMBRAL_AUTO = float(os.getenv("MATCH_UMBRAL_AUTO", "0.80"))
+MATCH_UMBRAL_REVISION = float(os.getenv("MATCH_UMBRAL_REVISION", "0.55"))
+MATCH_MARGEN = float(os.getenv("MATCH_MARGEN", "0.05"))
+MATCH_NGRAMA = int(os.getenv("MATCH_NGRAMA", "3"))
+
+# Celdas de la matriz de similitudes (consultas x catálogo) por lote
+_CELDAS_POR_LOTE = 4_000_000
+
+# origen: (modelo, columna con el nombre, columna con el precio)
+ORIGENES = {
+    "scraping": (ProductoScraped, ProductoScraped.nombre, ProductoScraped.precio),
+    "whatsapp": (
+        WhatsAppProductoCotizado,
+        WhatsAppProductoCotizado.nombre_producto,
+        WhatsAppProductoCotizado.precio,
+    ),
+}
+
+
+def normalizar_nombre(texto: str) -> str:
+    """Minúsculas, sin tildes, solo letras y números separados por un espacio"""
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    return " ".join(re.findall(r"[a-z0-9]+", texto))
+
+
+def ngramas(texto: str, n: int = MATCH_NGRAMA) -> Counter:
+    """N-gramas de caracteres del nombre normalizado (con bordes de palabra)"""
+    texto = f" {normalizar_nombre(texto)} "
+    return Counter(texto[i : i + n] for i in range(max(1, len(texto) - n + 1)))
+
+
+class IndiceNgramas:
+    """Índice TF-IDF (normalizado L2) de los nombres del catálogo"""
+
+    def __init__(self, ids: List[int], nombres: List[str], n: int = MATCH_NGRAMA):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.n = n
+        self.vocabulario: Dict[str, int] = {}
+
+        documentos, terminos, frecuencias = [], [], []
+        for doc, nombre in enumerate(nombres):
+            for ngrama, cuenta in ngramas(nombre, n).items():
+                documentos.append(doc)
+                terminos.append(self.vocabulario.setdefault(ngrama, len(self.vocabulario)))
+                frecuencias.append(cuenta)
+        documentos = np.asarray(documentos, dtype=np.int64)
+        terminos = np.asarray(terminos, dtype=np.int64)
+        frecuencias = np.asarray(frecuencias, dtype=np.float64)
+
+        total_docs = len(self.ids)
+        df = np.bincount(terminos, minlength=len(self.vocabulario))
+        self.idf = np.log((1 + total_docs) / (1 + df)) + 1
+        # Un n-grama que no está en el catálogo pesa como uno de frecuencia cero
+        self.idf_desconocido = np.log(1 + total_docs) + 1
+
+        pesos = frecuencias * self.idf[terminos]
+        normas = np.sqrt(np.bincount(documentos, pesos**2, minlength=total_docs))
+        pesos /= np.where(normas > 0, normas, 1)[documentos]
+
+        # Listas invertidas: documentos y pesos de cada término, contiguos
+        orden = np.argsort(terminos, kind="stable")
+        self.post_docs = documentos[orden]
+        self.post_pesos = pesos[orden]
+        self.post_inicio = np.concatenate(
+            ([0], np.cumsum(np.bincount(terminos, minlength=len(self.vocabulario))))
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _vectorizar(self, textos: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(fila, término, peso) de los n-gramas conocidos, normalizados L2"""
+        filas, terminos, pesos = [], [], []
+        for fila, texto in enumerate(textos):
+            conocidos, norma2 = [], 0.0
+            for ngrama, cuenta in ngramas(texto, self.n).items():
+                termino = self.vocabulario.get(ngrama)
+                peso = cuenta * (
+                    self.idf[termino] if termino is not None else self.idf_desconocido
+                )
+                norma2 += peso * peso
+                if termino is not None:
+                    conocidos.append((termino, peso))
+            norma = np.sqrt(norma2) or 1.0
+            for termino, peso in conocidos:
+                filas.append(fila)
+                terminos.append(termino)
+                pesos.append(peso / norma)
+        return (
+            np.asarray(filas, dtype=np.int64),
+            np.asarray(terminos, dtype=np.int64),
+            np.asarray(pesos, dtype=np.float64),
+        )
+
+    def mejores(self, textos: List[str], k: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Los k productos más parecidos a cada texto: (ids, similitudes), ambos
+        de forma (len(textos), k) y ordenados de mayor a menor. Si el catálogo
+        tiene menos de k productos, las columnas sobrantes quedan en -1 / 0.
+        """
+        total, docs = len(textos), len(self.ids)
+        ids = np.full((total, k), -1, dtype=np.int64)
+        similitudes = np.zeros((total, k), dtype=np.float64)
+        if not total or not docs:
+            return ids, similitudes
+
+        filas, terminos, pesos = self._vectorizar(textos)
+        k_real = min(k, docs)
+        lote = max(1, _CELDAS_POR_LOTE // docs)
+        limites = np.searchsorted(filas, np.arange(0, total + lote, lote))
+
+        for numero, inicio in enumerate(range(0, total, lote)):
+            a, b = limites[numero], limites[numero + 1]
+            filas_lote = filas[a:b] - inicio
+            if not len(filas_lote):
+                continue
+            terminos_lote = terminos[a:b]
+
+            # Expandir cada (fila, término) a todos los documentos con ese término
+            largos = self.post_inicio[terminos_lote + 1] - self.post_inicio[terminos_lote]
+            desplazamiento = np.repeat(
+                self.post_inicio[terminos_lote] - (np.cumsum(largos) - largos), largos
+            )
+            posiciones = np.arange(largos.sum()) + desplazamiento
+            aportes = np.repeat(pesos[a:b], largos) * self.post_pesos[posiciones]
+
+            filas_matriz = min(lote, total - inicio)
+            puntajes = np.bincount(
+                np.repeat(filas_lote, largos) * docs + self.post_docs[posiciones],
+                weights=aportes,
+                minlength=filas_matriz * docs,
+            ).reshape(filas_matriz, docs)
+
+            candidatos = np.argpartition(-puntajes, k_real - 1, axis=1)[:, :k_real]
+            valores = np.take_along_axis(puntajes, candidatos, axis=1)
+            orden = np.argsort(-valores, axis=1)
+            candidatos = np.take_along_axis(candidatos, orden, axis=1)
+            ids[inicio : inicio + filas_matriz, :k_real] = self.ids[candidatos]
+            similitudes[inicio : inicio + filas_matriz, :k_real] = np.take_along_axis(
+                valores, orden, axis=1
+            )
+
+        return ids, similitudes
+
+
+class EmparejadorProductos:
+    """Enlaza filas de los orígenes con el catálogo y mantiene la cola de revisión"""
+
+    def __init__(
+        self,
+        umbral_auto: float = MATCH_UMBRAL_AUTO,
+        umbral_revision: float = MATCH_UMBRAL_REVISION,
+        margen: float = MATCH_MARGEN,
+    ):
+        self.umbral_auto = umbral_auto
+        self.umbral_revision = min(umbral_revision, umbral_auto)
+        self.margen = margen
+        self._indice: Optional[IndiceNgramas] = None
+        self._firma: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _indice_catalogo(self, db: Session) -> IndiceNgramas:
+        """Reutiliza el índice mientras el catálogo no cambie"""
+        firma = "|".join(
+            str(valor)
+            for valor in db.query(
+                func.count(Product.id),
+                func.max(Product.id),
+                func.sum(func.length(Product.name)),
+            ).one()
+        )
+        if self._indice is None or firma != self._firma:
+            productos = db.query(Product.id, Product.name).order_by(Product.id).all()
+            self._indice = IndiceNgramas(
+                [p.id for p in productos], [p.name for p in productos]
+            )
+            self._firma = firma
+        return self._indice
+
+    @staticmethod
+    def _avances(db: Session, origenes: List[str]) -> Dict[str, EmparejamientoAvance]:
+        """
+        Filas de emparejamientos_avance de los orígenes, bloqueadas hasta el
+        commit (en PostgreSQL dos workers no evalúan las mismas filas a la vez).
+        Las que faltan se crean con INSERT ... ON CONFLICT DO NOTHING.
+        """
+        existentes = {
+            origen
+            for (origen,) in db.query(EmparejamientoAvance.origen).filter(
+                EmparejamientoAvance.origen.in_(origenes)
+            )
+        }
+        faltantes = [origen for origen in origenes if origen not in existentes]
+        if faltantes:
+            dialecto = db.get_bind().dialect.name
+            if dialecto in ("postgresql", "sqlite"):
+                if dialecto == "postgresql":
+                    from sqlalchemy.dialects.postgresql import insert as insertar
+                else:
+                    from sqlalchemy.dialects.sqlite import insert as insertar
+                db.execute(
+                    insertar(EmparejamientoAvance.__table__)
+                    .values([{"origen": origen} for origen in faltantes])
+                    .on_conflict_do_nothing(index_elements=["origen"])
+                )
+            else:
+                for origen in faltantes:
+                    db.add(EmparejamientoAvance(origen=origen))
+                db.flush()
+        return {
+            avance.origen: avance
+            for avance in db.query(EmparejamientoAvance)
+            .filter(EmparejamientoAvance.origen.in_(origenes))
+            .order_by(EmparejamientoAvance.origen)
+            .with_for_update()
+        }
+
+    def clasificar(self, similitud: float, segunda: float) -> Optional[str]:
+        """'enlazar', 'revision' o None según umbrales y margen con el segundo candidato"""
+        if similitud >= self.umbral_auto and similitud - segunda >= self.margen:
+            return "enlazar"
+        if similitud >= self.umbral_revision:
+            return "revision"
+        return None
+
+    def emparejar(
+        self,
+        db: Session,
+        completo: bool = False,
+        origenes: Optional[List[str]] = None,
+        ids: Optional[List[int]] = None,
+    ) -> Dict:
+        """
+        Evalúa las filas sin producto_id que no estén en la cola de revisión y
+        sean posteriores al avance guardado del origen (todas si cambió el
+        catálogo). Con completo=True vuelve a evaluar también las ya vistas
+        sin coincidencia. `origenes` limita la pasada (por defecto todos);
+        `ids` evalúa solo esas filas recién insertadas sin mover el avance.
+        """
+        inicio = time.monotonic()
+        origenes = [origen for origen in ORIGENES if origenes is None or origen in origenes]
+        with self._lock:
+            indice = self._indice_catalogo(db)
+            avances = self._avances(db, origenes) if ids is None else {}
+
+            estadisticas = {"catalogo": len(indice)}
+            for origen in origenes:
+                modelo, columna, columna_precio = ORIGENES[origen]
+                avance = avances.get(origen)
+                # Con otro catálogo las filas ya vistas pueden tener coincidencia
+                desde = (
+                    None
+                    if avance is None or completo or avance.firma_catalogo != self._firma
+                    else avance.evaluados_hasta
+                )
+                en_revision = (
+                    db.query(EmparejamientoRevision.id)
+                    .filter(
+                        EmparejamientoRevision.origen == origen,
+                        EmparejamientoRevision.registro_id == modelo.id,
+                    )
+                    .exists()
+                )
+                consulta = db.query(modelo.id, columna, columna_precio).filter(
+                    modelo.producto_id.is_(None), columna.isnot(None), ~en_revision
+                )
+                if ids is not None:
+                    # Los ids de whatsapp son timestamps del bot: una cotización
+                    # atrasada quedaría detrás del avance, se evalúa por id
+                    consulta = consulta.filter(modelo.id.in_(ids))
+                elif desde is not None:
+                    consulta = consulta.filter(modelo.id > desde)
+                filas = consulta.order_by(modelo.id).all()
+
+                enlazados, revision = self._procesar(db, origen, modelo, filas, indice)
+                estadisticas[origen] = {
+                    "evaluados": len(filas),
+                    "enlazados": enlazados,
+                    "en_revision": revision,
+                }
+                if avance is not None:
+                    avance.evaluados_hasta = filas[-1][0] if filas else desde
+                    avance.firma_catalogo = self._firma
+                    avance.actualizado_en = datetime.now(timezone.utc)
+
+            db.commit()
+
+        estadisticas["segundos"] = round(time.monotonic() - inicio, 3)
+        return estadisticas
+
+    def _procesar(self, db: Session, origen, modelo, filas, indice) -> Tuple[int, int]:
+        if not filas or not len(indice):
+            return 0, 0
+        ids, similitudes = indice.mejores([fila[1] for fila in filas], k=2)
+
+        enlaces, revisiones = [], []
+        ahora = datetime.now(timezone.utc)
+        observaciones = []
+        for (registro_id, nombre, precio), candidatos, sims in zip(filas, ids, similitudes):
+            decision = self.clasificar(sims[0], sims[1])
+            if decision == "enlazar":
+                enlaces.append({"id": registro_id, "producto_id": int(candidatos[0])})
+                observaciones.append((int(candidatos[0]), precio))
+            elif decision == "revision":
+                revisiones.append(
+                    {
+                        "origen": origen,
+                        "registro_id": registro_id,
+                        "nombre": nombre,
+                        "producto_id": int(candidatos[0]),
+                        "similitud": round(float(sims[0]), 4),
+                        "alternativa_id": int(candidatos[1]) if candidatos[1] >= 0 else None,
+                        "similitud_alternativa": round(float(sims[1]), 4),
+                        "estado": "pendiente",
+                        "creado_en": ahora,
+                    }
+                )
+
+        # Actualización e inserción en bloque
+        if enlaces:
+            db.execute(update(modelo), enlaces)
+        if revisiones:
+            db.execute(insert(EmparejamientoRevision), revisiones)
+        # El precio de cada fila enlazada es una observación para el producto
+        motor_alertas.observar_lote(db, observaciones, origen)
+        return len(enlaces), len(revisiones)
+
+    def resolver(
+        self,
+        db: Session,
+        revision: EmparejamientoRevision,
+        aprobar: bool,
+        producto_id: Optional[int] = None,
+    ) -> EmparejamientoRevision:
+        """
+        Aprueba (enlaza con el candidato o con `producto_id`) o rechaza un caso
+        de la cola; un rechazo deja la fila sin enlace y fuera de futuras pasadas
+        """
+        if aprobar:
+            modelo, _, columna_precio = ORIGENES[revision.origen]
+            revision.producto_id = producto_id or revision.producto_id
+            db.query(modelo).filter(modelo.id == revision.registro_id).update(
+                {"producto_id": revision.producto_id}, synchronize_session=False
+            )
+            precio = (
+                db.query(columna_precio).filter(modelo.id == revision.registro_id).scalar()
+            )
+            motor_alertas.observar_lote(
+                db, [(revision.producto_id, precio)], revision.origen
+            )
+        revision.estado = "aprobado" if aprobar else "rechazado"
+        revision.resuelto_en = datetime.now(timezone.utc)
+        db.commit()
+        db.refresh(revision)
+        return revision
+
+
+# Instancia global del emparejador
+emparejador = EmparejadorProductos()
+
+
+def emparejar_nuevos(origenes: Optional[List[str]] = None, ids: Optional[List[int]] = None):
+    """
+    Pasada incremental con su propia sesión, para lanzar en segundo plano
+    después de insertar filas (cotizaciones de WhatsApp, barridos)
+    """
+    db = SessionLocal()
+    try:
+        emparejador.emparejar(db, origenes=origenes, ids=ids)
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ Error emparejando filas nuevas: {e}")
+    finally:
+        db.close()
@@ -0,0 +1,152 @@
+"""
+Extracción rápida (sin IA) de precios, monedas, cantidades y productos en
+mensajes de proveedores. La usan gpt_client.py y gpt/app.py.
+
+Todas las búsquedas están en una sola expresión regular precompilada que
+recorre el mensaje una vez; los patrones de "no responder" (mensajes de
+espera o confirmación) van en otra alternancia precompilada.
+
+Los números se devuelven tal como aparecen ("1.200,50") y normalizados
+(1200.5) con la misma regla que los precios del scraping (convertir_precio).
+"""
+
+import re
+from typing import Dict, List, Optional
+
+from parser_html import convertir_precio
+
+# Palabras clave de producto (coinciden también dentro de plurales: "sillas")
+PRODUCTOS = ["silla", "escritorio", "mesa", "armario", "estante", "cajonera", "oficina"]
+
+# Mensajes de espera o confirmación que no necesitan respuesta
+PATRONES_SIN_RESPUESTA = [
+    r"enseguida te contesto",
+    r"luego te contesto",
+    r"ahorita te contesto",
+    r"un momento",
+    r"espera un segundo",
+    r"deja que",
+    r"dame un minuto",
+    r"estoy ocupado",
+    r"en un momento",
+    r"después te contesto",
+    r"ahora no puedo",
+    r"gracias por esperar",
+    r"recibido",
+    r"copiar",
+    r"entendido",
+]
+
+# Texto de la moneda -> código
+_MONEDAS = {
+    "$": "USD",
+    "us$": "USD",
+    "usd": "USD",
+    "dolar": "USD",
+    "dolares": "USD",
+    "dólar": "USD",
+    "dólares": "USD",
+    "bs": "BOB",
+    "bs.": "BOB",
+    "bolivianos": "BOB",
+    "soles": "PEN",
+    "pesos": "pesos",
+}
+
+_NUMERO = r"\d(?:[\d.,]*\d)?(?!\d)"
+_MONEDA = r"(?:d[oó]lar(?:es)?|usd|bs\.?|bolivianos|pesos|soles)(?!\w)"
+_UNIDADES = r"unidades|unid|piezas|pzas|disponibles|personas"
+_PRODUCTOS = "|".join(PRODUCTOS)
+
+# Se aplica sobre el mensaje en minúsculas. El primer lookahead descarta de
+# entrada las posiciones que no son "$" ni inicio de palabra con una letra o
+# dígito por el que empiece alguna alternativa (la mayoría de las posiciones)
+_PATRON = re.compile(
+    rf"""
+    (?=\$|\b[\dubdeacpsmo])
+    (?:
+      (?P<simbolo>us\$|\$|bs\.?)\s*(?P<n_simbolo>{_NUMERO})(?:\s*{_MONEDA})?
+    | (?:desde|entre|aprox(?:imadamente)?|costo|precio)\s*(?P<s_clave>\$)?\s*
+      (?P<n_clave>{_NUMERO})(?!\s*(?:{_UNIDADES}|{_PRODUCTOS}))(?:\s*(?P<m_clave>{_MONEDA}))?
+    | (?P<numero>{_NUMERO})\s*
+      (?:(?P<m_numero>{_MONEDA})|(?P<unidad>{_UNIDADES})|(?P<p_cantidad>{_PRODUCTOS}))
+    | (?P<producto>{_PRODUCTOS})
+    )
+    """,
+    re.VERBOSE,
+)
+
+_PATRON_SIN_RESPUESTA = re.compile("|".join(PATRONES_SIN_RESPUESTA))
+
+
+def extraer(mensaje: str) -> Dict:
+    """
+    Recorre el mensaje una vez y devuelve:
+    {"precios": ["1.200,50", ...], "valores": [1200.5, ...], "monedas": ["USD", ...],
+     "cantidades": [{"cantidad": 47, "unidad": "disponibles"}], "productos": ["silla", ...]}
+    Precios, monedas y productos sin repetir, en orden de aparición.
+    """
+    precios, valores, monedas, cantidades, productos = [], [], [], [], []
+
+    for coincidencia in _PATRON.finditer((mensaje or "").lower()):
+        producto = coincidencia.group("producto")
+        if producto:
+            if producto not in productos:
+                productos.append(producto)
+            continue
+
+        numero, moneda = coincidencia.group("numero", "m_numero")
+        if numero and not moneda:
+            # Cantidad: "47 disponibles", "5 sillas" (solo enteros)
+            unidad, producto = coincidencia.group("unidad", "p_cantidad")
+            if numero.isdigit():
+                cantidades.append({"cantidad": int(numero), "unidad": unidad or producto})
+            if producto and producto not in productos:
+                productos.append(producto)
+            continue
+
+        if not numero:
+            simbolo, n_simbolo, s_clave, n_clave, m_clave = coincidencia.group(
+                "simbolo", "n_simbolo", "s_clave", "n_clave", "m_clave"
+            )
+            numero = n_simbolo or n_clave
+            moneda = simbolo or s_clave or m_clave
+        if numero not in precios:
+            precios.append(numero)
+            valores.append(convertir_precio(numero))
+        moneda = _MONEDAS.get(moneda)
+        if moneda and moneda not in monedas:
+            monedas.append(moneda)
+
+    return {
+        "precios": precios,
+        "valores": valores,
+        "monedas": monedas,
+        "cantidades": cantidades,
+        "productos": productos,
+    }
+
+
+def extraer_precios(mensaje: str) -> Dict:
+    """Formato de respuesta de extraer-precios cuando alcanza con regex"""
+    resultado = extraer(mensaje)
+    return {
+        "tienePrecio": len(resultado["precios"]) > 0,
+        "precios": resultado["precios"],
+        "valores": resultado["valores"],
+        "monedas": resultado["monedas"],
+        "cantidades": resultado["cantidades"],
+        "productos": resultado["productos"],
+        "metodo": "regex",
+    }
+
+
+def extraer_productos(mensaje: str) -> List[str]:
+    """Palabras clave de producto presentes en el mensaje"""
+    return extraer(mensaje)["productos"]
+
+
+def patron_sin_respuesta(mensaje: str) -> Optional[str]:
+    """Texto del patrón de espera/confirmación encontrado, o None si hay que responder"""
+    coincidencia = _PATRON_SIN_RESPUESTA.search((mensaje or "").lower())
+    return coincidencia.group() if coincidencia else None
@@ -0,0 +1,100 @@
+# Script para extraer precios de muchos mensajes de proveedores de una vez
+# (regex primero, el resto agrupado en llamadas a la IA; ver gpt_client.extraer_precios_lote)
+#
+# Uso: python extraer_precios_lote.py [origen] [salida.ndjson]
+#   origen: "cotizaciones" (whatsapp-bot/cotizaciones.json, por defecto),
+#           "bd" (mensaje_completo de whatsapp_productos_cotizados) o la ruta de un JSON
+#   salida: archivo NDJSON (por defecto se escribe en la consola)
+# Tamaño de lote y concurrencia: GPT_LOTE_TAMANO y GPT_LOTE_CONCURRENCIA (.env)
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# Agregar el directorio backend al path
+backend_dir = Path(__file__).parent
+sys.path.insert(0, str(backend_dir))
+
+from gpt_client import gpt_client
+
+
+def mensajes_json(ruta: Path):
+    """Mensajes de un archivo con el formato de cotizaciones.json del bot"""
+    with open(ruta, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [
+        {"id": c.get("id"), "mensaje": c["mensajeCompleto"]}
+        for c in data.get("cotizaciones", [])
+        if c.get("mensajeCompleto")
+    ]
+
+
+def mensajes_bd():
+    """mensaje_completo de whatsapp_productos_cotizados"""
+    from database import SessionLocal
+    from models import WhatsAppProductoCotizado
+
+    db = SessionLocal()
+    try:
+        filas = (
+            db.query(WhatsAppProductoCotizado.id, WhatsAppProductoCotizado.mensaje_completo)
+            .filter(WhatsAppProductoCotizado.mensaje_completo.isnot(None))
+            .order_by(WhatsAppProductoCotizado.id)
+            .all()
+        )
+    finally:
+        db.close()
+    return [{"id": id_, "mensaje": texto} for id_, texto in filas]
+
+
+async def procesar(mensajes, salida):
+    resumen = None
+    try:
+        async for linea in gpt_client.extraer_precios_lote(mensajes):
+            if linea["status"] == "resumen":
+                resumen = linea
+            salida.write(json.dumps(linea, ensure_ascii=False) + "\n")
+    finally:
+        await gpt_client.cerrar()
+    return resumen
+
+
+def main():
+    origen = sys.argv[1] if len(sys.argv) > 1 else "cotizaciones"
+    if origen == "bd":
+        mensajes = mensajes_bd()
+    else:
+        ruta = (
+            backend_dir.parent / "whatsapp-bot" / "cotizaciones.json"
+            if origen == "cotizaciones"
+            else Path(origen)
+        )
+        if not ruta.exists():
+            print(f"❌ No se encontró el archivo: {ruta}", file=sys.stderr)
+            return False
+        mensajes = mensajes_json(ruta)
+
+    print(f"📊 {len(mensajes)} mensajes para procesar", file=sys.stderr)
+    if not mensajes:
+        return True
+
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "w", encoding="utf-8") as salida:
+            resumen = asyncio.run(procesar(mensajes, salida))
+        print(f"💾 Resultados guardados en {sys.argv[2]}", file=sys.stderr)
+    else:
+        resumen = asyncio.run(procesar(mensajes, sys.stdout))
+
+    print(
+        f"✅ {resumen['total']} mensajes en {resumen['segundos']} s: "
+        f"{resumen['con_precio']} con precio ({resumen['regex']} por regex, "
+        f"{resumen['ia']} por IA en {resumen['llamadas_ia']} llamadas), "
+        f"{resumen['errores']} errores",
+        file=sys.stderr,
+    )
+    return resumen["errores"] == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,103 @@
+"""
+Servidor local que imita la búsqueda de tiendas WooCommerce para probar los
+adaptadores de price_sources sin salir a internet
+
+Uso:
+    python fixture_price_sources.py [puerto]
+
+Rutas (cada una se comporta como una tienda distinta):
+    /<tienda>/?s=...&post_type=product   listado con precios en las tarjetas
+    /unico/?s=...                        un solo producto (meta product:price:amount)
+    /sin-precio/?s=...                   tarjetas sin precio (como livingroom.com.bo)
+    /lenta/?s=...                        responde después de 10 segundos
+    /caida/?s=...                        responde 503
+
+Ejemplo en el .env del backend:
+    PRICE_SOURCES_WOOCOMMERCE=Agimex=http://127.0.0.1:8766/agimex,Blau=http://127.0.0.1:8766/lenta
+"""
+
+import sys
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CATALOGO = [
+    "SILLA GERENCIAL ERGONOMICA",
+    "SILLA SECRETARIA ALTRIX",
+    "ESCRITORIO EJECUTIVO MELAMINA",
+    "MESA DE REUNIONES 8 PERSONAS",
+    "ESTANTE METALICO 5 NIVELES",
+    "BANQUETA DE BAR ALTA",
+    "PUPITRE ESCOLAR UNIPERSONAL",
+]
+
+
+def precio_de(tienda: str, nombre: str) -> float:
+    """Precio estable por tienda y producto"""
+    return 150 + zlib.crc32(f"{tienda}:{nombre}".encode()) % 1500
+
+
+def tarjeta(tienda: str, nombre: str, con_precio: bool = True) -> str:
+    slug = nombre.lower().replace(" ", "-")
+    precio = (
+        '<span class="price"><span class="woocommerce-Price-amount amount"><bdi>'
+        f'<span class="woocommerce-Price-currencySymbol">Bs</span>{precio_de(tienda, nombre):,.2f}'
+        "</bdi></span></span>"
+        if con_precio
+        else '<a class="button" href="https://wa.me/">Informacion</a>'
+    )
+    return (
+        '<div class="product-small col product type-product"><div class="box-image">'
+        f'<a href="http://{tienda}.local/producto/{slug}/"><img src="http://{tienda}.local/{slug}.jpg"/></a></div>'
+        f'<p class="name product-title woocommerce-loop-product__title"><a href="http://{tienda}.local/producto/{slug}/">{nombre}</a></p>'
+        f'<div class="price-wrapper">{precio}</div></div>'
+    )
+
+
+class Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def responder(self, estado: int, cuerpo: str = ""):
+        datos = cuerpo.encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        tienda = url.path.strip("/").split("/")[0] or "tienda"
+        busqueda = parse_qs(url.query).get("s", [""])[0].lower()
+        palabras = set(busqueda.split())
+
+        if tienda == "caida":
+            return self.responder(503)
+        if tienda == "lenta":
+            time.sleep(10)
+
+        encontrados = [n for n in CATALOGO if palabras & set(n.lower().split())]
+        if tienda == "unico" and encontrados:
+            nombre = encontrados[0]
+            return self.responder(
+                200,
+                f'<html><head><meta property="product:price:amount" content="{precio_de(tienda, nombre):.2f}"/>'
+                f"</head><body><h1>{nombre}</h1></body></html>",
+            )
+
+        cuerpo = "".join(
+            tarjeta(tienda, n, con_precio=tienda != "sin-precio") for n in encontrados
+        )
+        if not encontrados:
+            cuerpo = '<p class="woocommerce-info">No se encontraron productos</p>'
+        self.responder(200, f"<html><body>{cuerpo}</body></html>")
+
+
+if __name__ == "__main__":
+    puerto = int(sys.argv[1]) if len(sys.argv) > 1 else 8766
+    print(f"🧪 Tiendas de prueba en http://127.0.0.1:{puerto}/<tienda>/?s=...")
+    ThreadingHTTPServer(("127.0.0.1", puerto), Manejador).serve_forever()
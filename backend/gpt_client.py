@@ -8,11 +8,20 @@ Integración con el servidor de GPT/OpenAI
 import os
 import json
 import re
+import asyncio
+import time
 import unicodedata
+from collections import deque
 from dotenv import load_dotenv
-import openai
+import httpx
 import logging
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
+
+from cache_gpt import cache_gpt
+from conversaciones import historial_conversaciones
+from prompt_conversacion import PROMPT_TOKENS_RESUMEN, constructor_prompt
+import extraccion_mensajes
+from parser_html import convertir_precio
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -24,14 +33,125 @@ load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
 if api_key:
     logger.info("✅ API Key de OpenAI cargada correctamente")
-    openai.api_key = api_key
 else:
     logger.warning("⚠️ API Key de OpenAI NO encontrada en .env")
 
 MODEL = os.getenv("AI_MODEL", "gpt-3.5-turbo")
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+
+# Llamadas simultáneas a OpenAI por proceso (las demás esperan turno)
+GPT_CONCURRENCIA = int(os.getenv("GPT_CONCURRENCIA", "8"))
+# Segundos máximos por llamada, contando la espera por un turno
+GPT_TIMEOUT = float(os.getenv("GPT_TIMEOUT", "15"))
+# Respuesta a proveedores: "json" (una llamada) o "dos_llamadas" (evaluar y luego responder)
+GPT_MODO_RESPUESTA = os.getenv("GPT_MODO_RESPUESTA", "json")
+# Extracción por lotes: mensajes por llamada, llamadas simultáneas por lote,
+# segundos por llamada y caracteres de cada mensaje que se envían
+GPT_LOTE_TAMANO = int(os.getenv("GPT_LOTE_TAMANO", "20"))
+GPT_LOTE_CONCURRENCIA = int(os.getenv("GPT_LOTE_CONCURRENCIA", "4"))
+GPT_LOTE_TIMEOUT = float(os.getenv("GPT_LOTE_TIMEOUT", "60"))
+GPT_LOTE_MAX_CARACTERES = int(os.getenv("GPT_LOTE_MAX_CARACTERES", "800"))
+
+PROMPT_EVALUACION = """Evalúa si el siguiente mensaje REQUIERE una respuesta inmediata.
+
+NO requiere respuesta si:
+- Es una confirmación/reconocimiento (ok, recibido, entendido, listo)
+- Pide esperar (espera, un momento, después)
+- Es solo cortesía (gracias, ok)
+- Es un mensaje de transición (deja que, dame un segundo)
+
+SÍ requiere respuesta si:
+- Hace una pregunta
+- Proporciona información importante
+- Necesita clarificación
+
+Responde SOLO con "NO" o "SÍ"."""
+
+PROMPT_COMPRADOR = """Eres un comprador de una empresa nueva que se acaba de establecer. Necesitas equipar las oficinas con muebles de calidad a largo plazo.
+
+TU PERFIL:
+- Eres de una startup o empresa reciente
+- Buscas proveedores confiables para equipar la oficina
+- Tienes presupuesto moderado pero buscas buen valor
+- Necesitas sillas y escritorios de calidad para el equipo
+
+TU ESTILO DE RESPUESTA:
+- Corto y directo, como en un chat normal
+- Amable pero sin ser formal ni robótico
+- Colegial y natural, como habla un emprendedor
+- Sin emojis
+- Sin comillas y sin puntos (lenguaje muy relajado)
+- Máximo 2-3 líneas por mensaje
+- Responde de forma casual, como hablando con colegas en negocios
 
-# Almacenamiento en memoria para historial de conversaciones
-conversaciones = {}
+TU OBJETIVO: obtener información sobre PRECIOS, MODELOS, DISPONIBILIDAD y ENTREGA de escritorios y sillas.
+
+EJEMPLOS DE CÓMO RESPONDER (sin puntos ni comillas):
+- Oka y cuál sería el precio para equipo de 5 personas
+- Dale eso me sirve, me pasas los precios y disponibilidad
+- Perfecto con eso tengo lo que necesitaba para la oficina nos contactaremos pronto
+- Ok entendido gracias por los datos, cuándo pueden entregar
+
+Si no tienen precios, pregunta de forma simple
+Si ya tienes precios, agradece y cierra de forma natural
+Siempre sé breve y natural, como hablas por chat con colegas de negocios"""
+
+PROMPT_FORMATO_JSON = """
+
+ANTES DE RESPONDER evalúa si el último mensaje del proveedor REQUIERE respuesta.
+NO requiere respuesta si es una confirmación (ok, recibido, entendido, listo), pide
+esperar (espera, un momento, después), es solo cortesía (gracias) o es un mensaje
+de transición (deja que, dame un segundo).
+SÍ requiere respuesta si hace una pregunta, da información importante o necesita clarificación.
+
+Responde SOLO con un objeto JSON:
+{"necesita_respuesta": true o false, "respuesta": "tu mensaje, o vacío si no requiere respuesta"}"""
+
+PROMPT_EXTRACCION_LOTE = """Eres un experto en análisis de mensajes comerciales. Recibirás varios mensajes de proveedores de muebles, cada uno precedido por su número entre corchetes.
+
+Para CADA mensaje extrae:
+1. ¿Hay menciones de precios? (true/false)
+2. ¿Cuáles son los precios mencionados? (lista de números)
+3. ¿Qué productos se mencionan? (sillas, escritorios, armarios, etc)
+
+Importante:
+- Si hay frases como "desde $100", "entre $100 y $200", "aproximadamente 500", detecta los números
+- Si dice "no tengo precio", "precio a consultar", etc → tienePrecio: false
+- Sé flexible: "cien dólares" = 100, "dos mil" = 2000, "un millón" = 1000000
+
+Responde SOLO con un objeto JSON con un elemento por mensaje, en el mismo orden:
+{"resultados": [{"n": 1, "tienePrecio": true, "precios": [500], "productos": ["silla"]}, ...]}"""
+
+
+class LatenciasPorModo:
+    """Latencias recientes de cada modo de respuesta (ventana de las últimas N)"""
+
+    def __init__(self, ventana: int = 200):
+        self.ventana = ventana
+        self.muestras: Dict[str, deque] = {}
+        self.totales: Dict[str, int] = {}
+        self.fallbacks = 0
+
+    def registrar(self, modo: str, segundos: float):
+        self.muestras.setdefault(modo, deque(maxlen=self.ventana)).append(segundos)
+        self.totales[modo] = self.totales.get(modo, 0) + 1
+
+    def contar_fallback(self):
+        self.fallbacks += 1
+
+    def resumen(self) -> Dict:
+        resumen = {"fallbacks_json": self.fallbacks}
+        for modo, muestras in self.muestras.items():
+            ordenadas = sorted(muestras)
+            resumen[modo] = {
+                "llamadas": self.totales[modo],
+                "promedio_ms": round(sum(ordenadas) / len(ordenadas) * 1000, 1),
+                "p50_ms": round(ordenadas[len(ordenadas) // 2] * 1000, 1),
+                "p95_ms": round(ordenadas[int(len(ordenadas) * 0.95)] * 1000, 1)
+                if len(ordenadas) > 1
+                else round(ordenadas[0] * 1000, 1),
+            }
+        return resumen
 
 
 class GPTClient:
@@ -40,27 +160,30 @@ class GPTClient:
     def __init__(self):
         self.model = MODEL
         self.api_key = api_key
+        # Cliente HTTP asíncrono (keep-alive) y semáforo del event loop en uso
+        self._http: Optional[httpx.AsyncClient] = None
+        self._semaforo: Optional[asyncio.Semaphore] = None
+        self._loop = None
+        self.metricas = {"llamadas": 0, "en_curso": 0, "en_espera": 0, "timeouts": 0, "errores": 0}
+        self.latencias = LatenciasPorModo()
+        # response_format de OpenAI; se desactiva si el modelo no lo admite
+        self._json_nativo = True
 
     @staticmethod
     def obtener_historial_conversacion(numero: str) -> List[Dict]:
         """Obtiene el historial de conversación de una persona/proveedor"""
-        if numero not in conversaciones:
-            conversaciones[numero] = []
-        return conversaciones[numero]
+        return historial_conversaciones.obtener(numero)
 
     @staticmethod
     def agregar_al_historial(numero: str, mensaje: str, tipo: str = "usuario"):
         """Agrega un mensaje al historial de conversación"""
-        if numero not in conversaciones:
-            conversaciones[numero] = []
-        conversaciones[numero].append({"tipo": tipo, "mensaje": mensaje})
+        historial_conversaciones.agregar(numero, mensaje, tipo)
 
     @staticmethod
     def limpiar_historial(numero: str):
         """Limpia el historial de conversación"""
-        if numero in conversaciones:
-            del conversaciones[numero]
-            logger.info(f"Historial limpiado para {numero}")
+        historial_conversaciones.limpiar(numero)
+        logger.info(f"Historial limpiado para {numero}")
 
     @staticmethod
     def sanitizar_texto(texto: str) -> str:
@@ -87,209 +210,317 @@ class GPTClient:
 
         return texto
 
-    def llamar_openai(
-        self, mensajes: List[Dict], max_tokens: int = 300, temperature: float = 0.7
+    def _recursos_async(self):
+        """
+        Cliente y semáforo ligados al event loop actual (se recrean si cambia).
+        El cliente anterior se cierra en su loop si sigue corriendo; si ya
+        terminó no se puede cerrar desde otro, por eso quien crea el loop
+        debe llamar a cerrar() antes de terminarlo (lifespan de main.py,
+        extraer_precios_lote.py).
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if self._http is not None:
+                if self._loop.is_running():
+                    asyncio.run_coroutine_threadsafe(self._http.aclose(), self._loop)
+                else:
+                    logger.warning("Cliente de OpenAI de un event loop terminado sin cerrar")
+            self._http = httpx.AsyncClient(
+                base_url=OPENAI_API_BASE,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                limits=httpx.Limits(
+                    max_connections=GPT_CONCURRENCIA,
+                    max_keepalive_connections=GPT_CONCURRENCIA,
+                ),
+            )
+            self._semaforo = asyncio.Semaphore(GPT_CONCURRENCIA)
+            self._loop = loop
+        return self._http, self._semaforo
+
+    async def cerrar(self):
+        """Cierra el cliente HTTP async (llamar desde el loop que lo usó)"""
+        if self._http is not None and self._loop is asyncio.get_running_loop():
+            await self._http.aclose()
+        self._http = None
+        self._semaforo = None
+        self._loop = None
+
+    async def llamar_openai_async(
+        self,
+        mensajes: List[Dict],
+        max_tokens: int = 300,
+        temperature: float = 0.7,
+        presupuesto: float = GPT_TIMEOUT,
+        sanitizar: bool = True,
+        formato_json: bool = False,
+        cachear: bool = False,
     ) -> str:
-        """Llamar a la API de OpenAI"""
-        try:
-            response = openai.ChatCompletion.create(
-                model=self.model,
-                messages=mensajes,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                timeout=15,
+        """
+        Llamar a la API de OpenAI sin bloquear el event loop
+        A lo sumo GPT_CONCURRENCIA llamadas a la vez; `presupuesto` acota el
+        tiempo total (espera de turno + petición) y al agotarse lanza TimeoutError.
+        formato_json pide un objeto JSON (response_format) si el modelo lo admite.
+        cachear reutiliza la respuesta de una llamada idéntica (ver cache_gpt).
+        """
+        clave = None
+        if cachear:
+            clave = cache_gpt.clave(
+                self.model, mensajes,
+                max_tokens=max_tokens, temperature=temperature, formato_json=formato_json,
             )
-            return self.sanitizar_texto(response.choices[0].message.content.strip())
+            contenido = await asyncio.to_thread(cache_gpt.obtener, clave)
+            if contenido is not None:
+                return self.sanitizar_texto(contenido) if sanitizar else contenido
+
+        if not self.api_key:
+            raise RuntimeError("API Key de OpenAI no configurada")
+        http, semaforo = self._recursos_async()
+        limite = asyncio.get_running_loop().time() + presupuesto
+
+        self.metricas["en_espera"] += 1
+        try:
+            await asyncio.wait_for(semaforo.acquire(), presupuesto)
+        except asyncio.TimeoutError:
+            self.metricas["timeouts"] += 1
+            raise TimeoutError("Sin turno para llamar a OpenAI dentro del tiempo límite")
+        finally:
+            self.metricas["en_espera"] -= 1
+
+        self.metricas["en_curso"] += 1
+        self.metricas["llamadas"] += 1
+        try:
+            cuerpo = {
+                "model": self.model,
+                "messages": mensajes,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+            }
+            if formato_json and self._json_nativo:
+                cuerpo["response_format"] = {"type": "json_object"}
+            restante = max(0.1, limite - asyncio.get_running_loop().time())
+            response = await http.post("/chat/completions", json=cuerpo, timeout=restante)
+            if "response_format" in cuerpo and self._rechaza_formato_json(response):
+                # Modelo sin modo JSON: repetir sin response_format y no volver a pedirlo
+                logger.warning(f"{self.model} no admite response_format, se omite")
+                self._json_nativo = False
+                del cuerpo["response_format"]
+                restante = max(0.1, limite - asyncio.get_running_loop().time())
+                response = await http.post("/chat/completions", json=cuerpo, timeout=restante)
+            response.raise_for_status()
+            datos = response.json()
+            contenido = datos["choices"][0]["message"]["content"].strip()
+            if clave:
+                await asyncio.to_thread(
+                    cache_gpt.guardar,
+                    clave, contenido, (datos.get("usage") or {}).get("total_tokens", 0),
+                )
+            return self.sanitizar_texto(contenido) if sanitizar else contenido
+        except httpx.TimeoutException:
+            self.metricas["timeouts"] += 1
+            logger.error("Tiempo agotado llamando a OpenAI")
+            raise TimeoutError("OpenAI no respondió dentro del tiempo límite")
         except Exception as e:
+            self.metricas["errores"] += 1
             logger.error(f"Error llamando a OpenAI: {e}")
             raise
+        finally:
+            self.metricas["en_curso"] -= 1
+            semaforo.release()
 
     @staticmethod
-    def extraer_precios_regex(mensaje: str) -> Dict:
-        """Extrae precios del mensaje usando regex"""
-        patrones_precio = [
-            r"\$[\d.,]+",
-            r"[\d.,]+\s*(?:pesos|dólares|dolares|bs|soles|pesos)",
-            r"(?:desde|entre|aprox|aproximadamente|costo|precio)\s*[\$]?[\d.,]+",
-        ]
+    def _rechaza_formato_json(response: httpx.Response) -> bool:
+        """400 que culpa a response_format; los demás 400 no deben desactivarlo"""
+        if response.status_code != 400:
+            return False
+        texto = response.text
+        return "response_format" in texto or "json_object" in texto
 
-        precios = []
-        for patron in patrones_precio:
-            matches = re.findall(patron, mensaje, re.IGNORECASE)
-            if matches:
-                for match in matches:
-                    numeros = re.findall(r"[\d.,]+", match)
-                    if numeros:
-                        precios.extend(numeros)
-
-        return {
-            "tienePrecio": len(precios) > 0,
-            "precios": list(set(precios)),
-            "metodo": "regex",
-        }
+    @staticmethod
+    def extraer_precios_regex(mensaje: str) -> Dict:
+        """Extrae precios, monedas, cantidades y productos en una pasada (sin IA)"""
+        return extraccion_mensajes.extraer_precios(mensaje)
 
     @staticmethod
     def extraer_productos_regex(mensaje: str) -> List[str]:
         """Extrae nombres de productos del mensaje"""
-        productos_buscados = [
-            "silla",
-            "escritorio",
-            "mesa",
-            "armario",
-            "estante",
-            "cajonera",
-            "oficina",
+        return extraccion_mensajes.extraer_productos(mensaje)
+
+    @staticmethod
+    def _necesita_respuesta_por_patron(mensaje: str) -> bool:
+        """Filtro rápido: mensajes de espera o confirmación no se responden"""
+        patron = extraccion_mensajes.patron_sin_respuesta(mensaje)
+        if patron:
+            logger.info(f"Patrón detectado: '{patron}' - NO es necesario responder")
+            return False
+        return True
+
+    async def _contexto_conversacion(self, numero: str) -> Dict:
+        """
+        Historial del número recortado al presupuesto de tokens del prompt
+        Los turnos que quedan fuera se agregan al resumen acumulado (una
+        llamada a la IA por tanda, ver prompt_conversacion.py)
+        """
+        # Consultas a la BD fuera del event loop
+        historial = await asyncio.to_thread(self.obtener_historial_conversacion, numero)
+        resumido_hasta, resumen = await asyncio.to_thread(
+            historial_conversaciones.obtener_resumen, numero
+        )
+        por_resumir, recientes = constructor_prompt.dividir(historial, resumido_hasta)
+        if por_resumir:
+            try:
+                resumen = await self.llamar_openai_async(
+                    constructor_prompt.mensajes_resumen(resumen, por_resumir),
+                    max_tokens=PROMPT_TOKENS_RESUMEN,
+                    temperature=0.3,
+                )
+                await asyncio.to_thread(
+                    historial_conversaciones.guardar_resumen,
+                    numero,
+                    por_resumir[-1]["id"],
+                    resumen,
+                )
+                constructor_prompt.contar_resumen()
+            except Exception as e:
+                # Sin resumen nuevo los turnos pendientes van completos en el prompt
+                logger.warning(f"No se pudo actualizar el resumen de {numero}: {e}")
+                recientes = por_resumir + recientes
+        return {"historial": historial, "resumen": resumen, "recientes": recientes}
+
+    @staticmethod
+    def _mensajes_conversacion(
+        prompt_sistema: str, contexto: Dict, mensaje: str, tiene_precio: bool
+    ) -> List[Dict]:
+        """Prompt de sistema + resumen + turnos recientes + mensaje actual del proveedor"""
+        adicionales = []
+        # Si ya tenemos precios, indicar que debe cerrar
+        if tiene_precio:
+            adicionales.append(
+                {
+                    "role": "system",
+                    "content": "Ya obtuviste información de precios. Agradece de forma profesional y menciona que evaluarás la propuesta y te pondrás en contacto pronto.",
+                }
+            )
+        return constructor_prompt.construir(
+            prompt_sistema,
+            contexto["resumen"],
+            contexto["recientes"],
+            mensaje,
+            historial_completo=contexto["historial"],
+            adicionales=adicionales,
+        )
+
+    async def _responder_una_llamada(
+        self, mensaje: str, contexto: Dict, tiene_precio: bool
+    ) -> Optional[Dict]:
+        """
+        Evalúa y responde en una sola llamada con salida JSON
+        Devuelve None si la respuesta no es un JSON válido
+        """
+        mensajes_ia = self._mensajes_conversacion(
+            PROMPT_COMPRADOR + PROMPT_FORMATO_JSON, contexto, mensaje, tiene_precio
+        )
+        contenido = await self.llamar_openai_async(
+            mensajes_ia, max_tokens=220, temperature=0.7, sanitizar=False, formato_json=True
+        )
+        try:
+            resultado = json.loads(re.search(r"\{.*\}", contenido, re.DOTALL).group())
+            necesita = resultado["necesita_respuesta"]
+        except (AttributeError, ValueError, KeyError, TypeError):
+            logger.warning(f"Respuesta JSON inválida de IA: {contenido!r}")
+            return None
+        if isinstance(necesita, str):
+            necesita = necesita.strip().lower() in ("true", "si", "sí", "yes")
+        respuesta = self.sanitizar_texto(resultado.get("respuesta") or "")
+        if necesita and not respuesta:
+            return None
+        return {"necesita_respuesta": bool(necesita), "respuesta": respuesta if necesita else ""}
+
+    async def _responder_dos_llamadas(
+        self, mensaje: str, contexto: Dict, tiene_precio: bool
+    ) -> Dict:
+        """Primero pregunta a la IA si hay que responder (SÍ/NO) y luego genera la respuesta"""
+        mensajes_evaluacion = [
+            {"role": "system", "content": PROMPT_EVALUACION},
+            {"role": "user", "content": mensaje},
         ]
-        productos_encontrados = []
 
-        mensaje_lower = mensaje.lower()
-        for producto in productos_buscados:
-            if producto in mensaje_lower:
-                productos_encontrados.append(producto)
+        evaluacion = await self.llamar_openai_async(
+            mensajes_evaluacion, max_tokens=5, temperature=0, cachear=True
+        )
+        evaluacion_lower = evaluacion.lower().strip()
+
+        if "no" in evaluacion_lower:
+            logger.info(f"IA evaluó: NO requiere respuesta - '{mensaje}'")
+            return {"necesita_respuesta": False, "respuesta": ""}
+
+        logger.info(f"IA evaluó: SÍ requiere respuesta")
 
-        return list(set(productos_encontrados))
+        mensajes_ia = self._mensajes_conversacion(
+            PROMPT_COMPRADOR, contexto, mensaje, tiene_precio
+        )
+        respuesta = await self.llamar_openai_async(
+            mensajes_ia, max_tokens=200, temperature=0.7
+        )
+        return {"necesita_respuesta": True, "respuesta": respuesta}
 
-    def generar_respuesta_empresa(
+    async def generar_respuesta_empresa(
         self,
         mensaje: str,
         numero_proveedor: str = "desconocido",
         tiene_precio: bool = False,
+        modo: Optional[str] = None,
     ) -> Dict:
-        """Genera una respuesta profesional para negociar con proveedores"""
+        """
+        Genera una respuesta profesional para negociar con proveedores
+        modo "json" (por defecto, GPT_MODO_RESPUESTA) evalúa y responde en una
+        sola llamada; si falla o no devuelve JSON válido se usa "dos_llamadas"
+        """
         try:
             logger.info(f"Generando respuesta para proveedor {numero_proveedor}")
 
-            # Obtener historial
-            historial = self.obtener_historial_conversacion(numero_proveedor)
-
             # Evaluar si es necesario responder con IA
-            patrones_sin_respuesta = [
-                r"enseguida te contesto",
-                r"luego te contesto",
-                r"ahorita te contesto",
-                r"un momento",
-                r"espera un segundo",
-                r"deja que",
-                r"dame un minuto",
-                r"estoy ocupado",
-                r"en un momento",
-                r"después te contesto",
-                r"ahora no puedo",
-                r"gracias por esperar",
-                r"recibido",
-                r"copiar",
-                r"entendido",
-            ]
-
-            mensaje_lower = mensaje.lower()
-            necesita_respuesta = True
-
-            for patron in patrones_sin_respuesta:
-                if re.search(patron, mensaje_lower):
-                    necesita_respuesta = False
-                    logger.info(
-                        f"Patrón detectado: '{patron}' - NO es necesario responder"
-                    )
-                    break
-
-            if not necesita_respuesta:
+            if not self._necesita_respuesta_por_patron(mensaje):
                 return {"exito": True, "respuesta": "", "necesita_respuesta": False}
 
-            # Usar IA para decidir si necesita respuesta
-            mensajes_evaluacion = [
-                {
-                    "role": "system",
-                    "content": """Evalúa si el siguiente mensaje REQUIERE una respuesta inmediata.
-
-NO requiere respuesta si:
-- Es una confirmación/reconocimiento (ok, recibido, entendido, listo)
-- Pide esperar (espera, un momento, después)
-- Es solo cortesía (gracias, ok)
-- Es un mensaje de transición (deja que, dame un segundo)
-
-SÍ requiere respuesta si:
-- Hace una pregunta
-- Proporciona información importante
-- Necesita clarificación
-
-Responde SOLO con "NO" o "SÍ".""",
-                },
-                {"role": "user", "content": mensaje},
-            ]
-
-            evaluacion = self.llamar_openai(
-                mensajes_evaluacion, max_tokens=5, temperature=0
-            )
-            evaluacion_lower = evaluacion.lower().strip()
-
-            if "no" in evaluacion_lower:
-                logger.info(f"IA evaluó: NO requiere respuesta - '{mensaje}'")
-                return {"exito": True, "respuesta": "", "necesita_respuesta": False}
-
-            logger.info(f"IA evaluó: SÍ requiere respuesta")
-
-            # Construir mensajes para IA
-            mensajes_ia = [
-                {
-                    "role": "system",
-                    "content": f"""Eres un comprador de una empresa nueva que se acaba de establecer. Necesitas equipar las oficinas con muebles de calidad a largo plazo.
-
-TU PERFIL:
-- Eres de una startup o empresa reciente
-- Buscas proveedores confiables para equipar la oficina
-- Tienes presupuesto moderado pero buscas buen valor
-- Necesitas sillas y escritorios de calidad para el equipo
-
-TU ESTILO DE RESPUESTA:
-- Corto y directo, como en un chat normal
-- Amable pero sin ser formal ni robótico
-- Colegial y natural, como habla un emprendedor
-- Sin emojis
-- Sin comillas y sin puntos (lenguaje muy relajado)
-- Máximo 2-3 líneas por mensaje
-- Responde de forma casual, como hablando con colegas en negocios
-
-TU OBJETIVO: obtener información sobre PRECIOS, MODELOS, DISPONIBILIDAD y ENTREGA de escritorios y sillas.
-
-EJEMPLOS DE CÓMO RESPONDER (sin puntos ni comillas):
-- Oka y cuál sería el precio para equipo de 5 personas
-- Dale eso me sirve, me pasas los precios y disponibilidad
-- Perfecto con eso tengo lo que necesitaba para la oficina nos contactaremos pronto
-- Ok entendido gracias por los datos, cuándo pueden entregar
+            # Historial recortado al presupuesto de tokens + resumen de lo anterior
+            contexto = await self._contexto_conversacion(numero_proveedor)
 
-Si no tienen precios, pregunta de forma simple
-Si ya tienes precios, agradece y cierra de forma natural
-Siempre sé breve y natural, como hablas por chat con colegas de negocios""",
-                }
-            ]
-
-            # Agregar historial
-            for msg in historial:
-                mensajes_ia.append(
-                    {
-                        "role": "assistant" if msg["tipo"] == "bot" else "user",
-                        "content": msg["mensaje"],
-                    }
+            modo = modo or GPT_MODO_RESPUESTA
+            resultado = None
+            if modo == "json":
+                inicio = time.perf_counter()
+                try:
+                    resultado = await self._responder_una_llamada(
+                        mensaje, contexto, tiene_precio
+                    )
+                except TimeoutError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Modo JSON falló, se usan dos llamadas: {e}")
+                if resultado is not None:
+                    self.latencias.registrar("json", time.perf_counter() - inicio)
+                else:
+                    self.latencias.contar_fallback()
+
+            if resultado is None:
+                inicio = time.perf_counter()
+                resultado = await self._responder_dos_llamadas(
+                    mensaje, contexto, tiene_precio
                 )
+                self.latencias.registrar("dos_llamadas", time.perf_counter() - inicio)
 
-            # Agregar mensaje actual del proveedor
-            mensajes_ia.append({"role": "user", "content": mensaje})
-
-            # Si ya tenemos precios, indicar que debe cerrar
-            if tiene_precio:
-                mensajes_ia.append(
-                    {
-                        "role": "system",
-                        "content": "Ya obtuviste información de precios. Agradece de forma profesional y menciona que evaluarás la propuesta y te pondrás en contacto pronto.",
-                    }
-                )
+            if not resultado["necesita_respuesta"]:
+                return {"exito": True, "respuesta": "", "necesita_respuesta": False}
 
-            # Llamar a OpenAI
-            respuesta = self.llamar_openai(mensajes_ia, max_tokens=200, temperature=0.7)
+            respuesta = resultado["respuesta"]
 
             # Agregar respuesta al historial
-            self.agregar_al_historial(numero_proveedor, respuesta, "bot")
-            self.agregar_al_historial(numero_proveedor, mensaje, "usuario")
+            await asyncio.to_thread(
+                self.agregar_al_historial, numero_proveedor, respuesta, "bot"
+            )
+            await asyncio.to_thread(
+                self.agregar_al_historial, numero_proveedor, mensaje, "usuario"
+            )
 
             logger.info(f"✅ Respuesta generada para proveedor {numero_proveedor}")
 
@@ -299,7 +530,7 @@ Siempre sé breve y natural, como hablas por chat con colegas de negocios""",
             logger.error(f"Error en generar_respuesta_empresa: {e}")
             return {"error": str(e), "exito": False}
 
-    def extraer_precios(
+    async def extraer_precios(
         self, mensaje: str, numero_proveedor: str = "desconocido"
     ) -> Dict:
         """Extrae información de precios de un mensaje"""
@@ -313,24 +544,12 @@ Siempre sé breve y natural, como hablas por chat con colegas de negocios""",
                 logger.info(
                     f"✅ Precios detectados por regex: {resultado_regex['precios']}"
                 )
-                return {
-                    "tienePrecio": True,
-                    "precios": resultado_regex["precios"],
-                    "productos": self.extraer_productos_regex(mensaje),
-                    "metodo": "regex",
-                    "exito": True,
-                }
+                return {**resultado_regex, "exito": True}
 
             # Si no encuentra precios y tenemos API key, usar IA
             if not self.api_key:
                 logger.warning("API Key no configurada, retornando resultado de regex")
-                return {
-                    "tienePrecio": False,
-                    "precios": [],
-                    "productos": self.extraer_productos_regex(mensaje),
-                    "metodo": "regex",
-                    "exito": True,
-                }
+                return {**resultado_regex, "exito": True}
 
             logger.info("Usando IA para analizar precios")
 
@@ -365,8 +584,8 @@ Importante:
                 },
             ]
 
-            respuesta_ia = self.llamar_openai(
-                mensajes_ia, max_tokens=300, temperature=0.3
+            respuesta_ia = await self.llamar_openai_async(
+                mensajes_ia, max_tokens=300, temperature=0.3, cachear=True
             )
             logger.info(f"Respuesta IA: {respuesta_ia}")
 
@@ -374,21 +593,17 @@ Importante:
             json_match = re.search(r"\{.*\}", respuesta_ia, re.DOTALL)
             if not json_match:
                 logger.warning("No se pudo parsear respuesta de IA")
-                return {
-                    "tienePrecio": False,
-                    "precios": [],
-                    "productos": self.extraer_productos_regex(mensaje),
-                    "metodo": "regex",
-                    "exito": True,
-                }
+                return {**resultado_regex, "exito": True}
 
             analisis_ia = json.loads(json_match.group())
 
             if analisis_ia.get("tienePrecio") and analisis_ia.get("precios"):
                 logger.info(f"✅ Precios detectados por IA: {analisis_ia['precios']}")
+                precios = [str(p) for p in analisis_ia["precios"]]
                 return {
                     "tienePrecio": True,
-                    "precios": analisis_ia.get("precios", []),
+                    "precios": precios,
+                    "valores": [convertir_precio(p) for p in precios],
                     "productos": analisis_ia.get("productos", []),
                     "metodo": "ia",
                     "exito": True,
@@ -406,7 +621,133 @@ Importante:
             logger.error(f"Error en extraer_precios: {e}")
             return {"error": str(e), "exito": False}
 
-    def obtener_respuesta(
+    async def _extraer_lote_ia(self, textos: List[str]) -> Dict[int, Dict]:
+        """
+        Una llamada para varios mensajes; devuelve {posición: resultado} con
+        los mensajes que la IA devolvió bien formados
+        """
+        contenido = "\n\n".join(
+            f"[{n}] {texto[:GPT_LOTE_MAX_CARACTERES]}" for n, texto in enumerate(textos, 1)
+        )
+        respuesta = await self.llamar_openai_async(
+            [
+                {"role": "system", "content": PROMPT_EXTRACCION_LOTE},
+                {"role": "user", "content": contenido},
+            ],
+            max_tokens=40 * len(textos) + 50,
+            temperature=0,
+            presupuesto=GPT_LOTE_TIMEOUT,
+            sanitizar=False,
+            formato_json=True,
+            cachear=True,
+        )
+        datos = json.loads(re.search(r"[\[{].*[\]}]", respuesta, re.DOTALL).group())
+        if isinstance(datos, dict):
+            datos = datos.get("resultados") or []
+
+        resultados = {}
+        for posicion, item in enumerate(datos):
+            if not isinstance(item, dict):
+                continue
+            try:
+                indice = int(item.get("n", posicion + 1)) - 1
+            except (TypeError, ValueError):
+                continue
+            if not 0 <= indice < len(textos):
+                continue
+            precios = [str(p) for p in item.get("precios") or []]
+            resultados[indice] = {
+                "tienePrecio": bool(item.get("tienePrecio")) and bool(precios),
+                "precios": precios,
+                "valores": [convertir_precio(p) for p in precios],
+                "productos": item.get("productos") or [],
+                "metodo": "ia",
+            }
+        return resultados
+
+    async def extraer_precios_lote(
+        self,
+        mensajes: List[Dict],
+        tamano_lote: int = GPT_LOTE_TAMANO,
+        concurrencia: int = GPT_LOTE_CONCURRENCIA,
+        usar_ia: bool = True,
+    ) -> AsyncIterator[Dict]:
+        """
+        Extrae precios de muchos mensajes ({"id", "mensaje"}) y produce un
+        resultado por mensaje a medida que están listos, más una línea final
+        con el resumen ({"status": "resumen", ...})
+        1. Regex sobre todos los mensajes (inmediato)
+        2. Los que quedan sin precio van a la IA de a tamano_lote por llamada,
+           con a lo sumo `concurrencia` llamadas a la vez
+        Los textos repetidos se analizan una sola vez. Si falla una llamada,
+        sus mensajes salen con status "error" y el resultado de regex.
+        """
+        inicio = time.perf_counter()
+        resumen = {"total": 0, "con_precio": 0, "regex": 0, "ia": 0, "errores": 0, "llamadas_ia": 0}
+
+        def linea(id_, resultado: Dict, status: str = "ok", detalle: Optional[str] = None) -> Dict:
+            resumen["total"] += 1
+            resumen["con_precio"] += bool(resultado["tienePrecio"])
+            if status == "ok":
+                resumen[resultado["metodo"]] += 1
+            else:
+                resumen["errores"] += 1
+            datos = {"id": id_, "status": status, **resultado}
+            if detalle:
+                datos["detail"] = detalle
+            return datos
+
+        por_texto: Dict[str, List] = {}
+        for mensaje in mensajes:
+            por_texto.setdefault((mensaje.get("mensaje") or "").strip(), []).append(
+                mensaje.get("id")
+            )
+
+        pendientes = []  # (texto, ids, resultado de regex)
+        for texto, ids in por_texto.items():
+            resultado = extraccion_mensajes.extraer_precios(texto)
+            if resultado["tienePrecio"] or not texto or not usar_ia or not self.api_key:
+                for id_ in ids:
+                    yield linea(id_, resultado)
+            else:
+                pendientes.append((texto, ids, resultado))
+
+        tamano_lote = max(1, tamano_lote)
+        lotes = [pendientes[i : i + tamano_lote] for i in range(0, len(pendientes), tamano_lote)]
+        semaforo = asyncio.Semaphore(max(1, concurrencia))
+
+        async def procesar(lote):
+            async with semaforo:
+                try:
+                    return lote, await self._extraer_lote_ia([t for t, _, _ in lote]), None
+                except Exception as e:
+                    logger.error(f"Error en lote de extracción de precios: {e}")
+                    return lote, None, str(e) or type(e).__name__
+
+        tareas = [asyncio.ensure_future(procesar(lote)) for lote in lotes]
+        try:
+            for tarea in asyncio.as_completed(tareas):
+                lote, resultados, error = await tarea
+                resumen["llamadas_ia"] += 1
+                for posicion, (_, ids, resultado_regex) in enumerate(lote):
+                    for id_ in ids:
+                        if error:
+                            yield linea(id_, resultado_regex, "error", error)
+                        else:
+                            # Si la IA omitió el mensaje queda el resultado de regex
+                            yield linea(id_, resultados.get(posicion, resultado_regex))
+        finally:
+            # El cliente puede cortar la respuesta a mitad de camino
+            for tarea in tareas:
+                tarea.cancel()
+
+        yield {
+            "status": "resumen",
+            **resumen,
+            "segundos": round(time.perf_counter() - inicio, 2),
+        }
+
+    async def obtener_respuesta(
         self, mensaje: str, numero_usuario: str = "desconocido"
     ) -> Dict:
         """Obtiene una respuesta de IA general para usuario"""
@@ -423,7 +764,9 @@ Si no sabes algo, indica que transferirás la consulta a un humano.""",
                 {"role": "user", "content": mensaje},
             ]
 
-            respuesta = self.llamar_openai(mensajes_ia, max_tokens=300, temperature=0.7)
+            respuesta = await self.llamar_openai_async(
+                mensajes_ia, max_tokens=300, temperature=0.7
+            )
 
             logger.info(f"✅ Respuesta generada para usuario {numero_usuario}")
 
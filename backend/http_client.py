@@ -0,0 +1,284 @@
+"""
+Cliente HTTP compartido para todo el scraping saliente
+Una sola sesión keep-alive con pool por host, reintentos con backoff
+exponencial y jitter ante 429/5xx (respetando Retry-After), circuito por host
+y contadores de reintentos y latencia consultables desde la API.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Conexiones keep-alive que se mantienen abiertas por host
+HTTP_POOL_POR_HOST = int(os.getenv("HTTP_POOL_POR_HOST", "16"))
+# Reintentos tras el primer intento fallido (429, 5xx o error de red)
+HTTP_REINTENTOS = int(os.getenv("HTTP_REINTENTOS", "3"))
+# Espera base del backoff exponencial y tope de cualquier espera (segundos)
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "30"))
+# Fallos seguidos que abren el circuito de un host y segundos que queda abierto
+HTTP_CIRCUITO_FALLOS = int(os.getenv("HTTP_CIRCUITO_FALLOS", "5"))
+HTTP_CIRCUITO_ESPERA = float(os.getenv("HTTP_CIRCUITO_ESPERA", "30"))
+
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+# Latencias recientes por host para calcular percentiles
+MUESTRAS_LATENCIA = 500
+
+
+class CircuitoAbierto(Exception):
+    """El host acumuló demasiados fallos seguidos y se rechazan peticiones"""
+
+
+class LimitadorPorHost:
+    """
+    Reparte turnos de petición por host para respetar un intervalo mínimo
+    entre peticiones al mismo sitio, sin importar cuántos hilos las hagan
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._proximo_turno: Dict[str, float] = {}
+
+    def esperar_turno(self, url: str, intervalo: float):
+        """Bloquea hasta que el host de la URL tenga un turno libre"""
+        host = urlparse(url).netloc
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self._proximo_turno.get(host, 0.0))
+            self._proximo_turno[host] = turno + max(intervalo, 0.0)
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+class CircuitoHost:
+    """
+    Circuito por host: se abre tras `umbral` fallos seguidos, rechaza
+    peticiones durante `espera` segundos y luego deja pasar una de prueba
+    (semiabierto); si sale bien se cierra, si falla vuelve a abrirse.
+    """
+
+    def __init__(self, umbral: int = HTTP_CIRCUITO_FALLOS, espera: float = HTTP_CIRCUITO_ESPERA):
+        self.umbral = umbral
+        self.espera = espera
+        self._lock = threading.Lock()
+        self.fallos_seguidos = 0
+        self.abierto_hasta = 0.0
+        self._prueba_en_curso = False
+
+    @property
+    def estado(self) -> str:
+        if self.fallos_seguidos < self.umbral:
+            return "cerrado"
+        return "abierto" if time.monotonic() < self.abierto_hasta else "semiabierto"
+
+    def permitir(self) -> bool:
+        with self._lock:
+            estado = self.estado
+            if estado == "cerrado":
+                return True
+            if estado == "semiabierto" and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return True
+            return False
+
+    def exito(self):
+        with self._lock:
+            self.fallos_seguidos = 0
+            self._prueba_en_curso = False
+
+    def fallo(self):
+        with self._lock:
+            self.fallos_seguidos += 1
+            self._prueba_en_curso = False
+            if self.fallos_seguidos >= self.umbral:
+                self.abierto_hasta = time.monotonic() + self.espera
+
+
+class MetricasHost:
+    """Contadores de un host (se actualizan bajo el lock del cliente)"""
+
+    def __init__(self):
+        self.peticiones = 0
+        self.reintentos = 0
+        self.errores = 0
+        self.rechazadas_circuito = 0
+        self.por_estado: Dict[int, int] = {}
+        self.latencia_total = 0.0
+        self.latencias = deque(maxlen=MUESTRAS_LATENCIA)
+
+    def a_dict(self) -> Dict:
+        ordenadas = sorted(self.latencias)
+
+        def percentil(p):
+            if not ordenadas:
+                return None
+            return round(ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p))] * 1000, 1)
+
+        return {
+            "peticiones": self.peticiones,
+            "reintentos": self.reintentos,
+            "errores": self.errores,
+            "rechazadas_circuito": self.rechazadas_circuito,
+            "por_estado": dict(self.por_estado),
+            "latencia_ms_promedio": (
+                round(self.latencia_total / self.peticiones * 1000, 1)
+                if self.peticiones
+                else None
+            ),
+            "latencia_ms_p50": percentil(0.5),
+            "latencia_ms_p95": percentil(0.95),
+        }
+
+
+class ClienteHTTP:
+    """Sesión compartida con reintentos, circuito y límite de ritmo por host"""
+
+    def __init__(
+        self,
+        pool_por_host: int = HTTP_POOL_POR_HOST,
+        reintentos: int = HTTP_REINTENTOS,
+        backoff_base: float = HTTP_BACKOFF_BASE,
+        backoff_max: float = HTTP_BACKOFF_MAX,
+    ):
+        self.reintentos = reintentos
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        self.session.headers.update(
+            {
+                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+                "Accept-Language": "es-ES,es;q=0.9",
+            }
+        )
+        # Los reintentos se hacen aquí (con métricas), no dentro de urllib3
+        adaptador = HTTPAdapter(
+            pool_connections=8, pool_maxsize=pool_por_host, max_retries=0
+        )
+        self.session.mount("https://", adaptador)
+        self.session.mount("http://", adaptador)
+        self.limitador = LimitadorPorHost()
+        self._lock = threading.Lock()
+        self._circuitos: Dict[str, CircuitoHost] = {}
+        self._metricas: Dict[str, MetricasHost] = {}
+
+    def _del_host(self, host: str):
+        with self._lock:
+            if host not in self._circuitos:
+                self._circuitos[host] = CircuitoHost()
+                self._metricas[host] = MetricasHost()
+            return self._circuitos[host], self._metricas[host]
+
+    def _espera_backoff(self, intento: int, response: Optional[requests.Response]) -> float:
+        """Retry-After si el servidor lo manda; si no, backoff exponencial con jitter"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.backoff_max)
+                except ValueError:
+                    try:
+                        fecha = parsedate_to_datetime(retry_after)
+                        espera = (fecha - datetime.now(timezone.utc)).total_seconds()
+                        return min(max(espera, 0.0), self.backoff_max)
+                    except (TypeError, ValueError):
+                        pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**intento))
+
+    def get(
+        self,
+        url: str,
+        timeout: float = 10,
+        headers: Optional[Dict] = None,
+        intervalo: float = 0.0,
+        plazo: Optional[float] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        GET con reintentos. `intervalo` es la separación mínima entre
+        peticiones al mismo host (se aplica también a cada reintento).
+        `plazo` acota en segundos la duración total (intentos y esperas): el
+        timeout de cada intento se recorta a lo que queda y no se reintenta si
+        la espera del backoff no entra en el plazo.
+        Lanza CircuitoAbierto si el host está bloqueado y la última excepción
+        de red si se agotan los reintentos; un 429/5xx final se devuelve tal cual.
+        """
+        host = urlparse(url).netloc
+        circuito, metricas = self._del_host(host)
+        if not circuito.permitir():
+            with self._lock:
+                metricas.rechazadas_circuito += 1
+            raise CircuitoAbierto(f"Circuito abierto para {host}")
+
+        limite = time.monotonic() + plazo if plazo is not None else None
+        for intento in range(self.reintentos + 1):
+            self.limitador.esperar_turno(url, intervalo)
+            inicio = time.monotonic()
+            if limite is not None:
+                timeout = max(0.01, min(timeout, limite - inicio))
+            response = None
+            error = None
+            try:
+                response = self.session.get(url, timeout=timeout, headers=headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                with self._lock:
+                    metricas.peticiones += 1
+                    metricas.errores += 1
+                    metricas.latencia_total += time.monotonic() - inicio
+                error = e
+            except requests.RequestException:
+                with self._lock:
+                    metricas.peticiones += 1
+                    metricas.errores += 1
+                circuito.fallo()
+                raise
+            else:
+                latencia = time.monotonic() - inicio
+                with self._lock:
+                    metricas.peticiones += 1
+                    metricas.latencia_total += latencia
+                    metricas.latencias.append(latencia)
+                    metricas.por_estado[response.status_code] = (
+                        metricas.por_estado.get(response.status_code, 0) + 1
+                    )
+                if response.status_code not in ESTADOS_REINTENTABLES:
+                    circuito.exito()
+                    return response
+
+            espera = self._espera_backoff(intento, response)
+            if intento == self.reintentos or (
+                limite is not None and time.monotonic() + espera >= limite
+            ):
+                circuito.fallo()
+                if error is not None:
+                    raise error
+                return response
+
+            with self._lock:
+                metricas.reintentos += 1
+            time.sleep(espera)
+
+    def metricas(self) -> Dict:
+        """Contadores por host y estado de su circuito"""
+        with self._lock:
+            return {
+                host: {
+                    **self._metricas[host].a_dict(),
+                    "circuito": self._circuitos[host].estado,
+                }
+                for host in self._metricas
+            }
+
+
+# Instancia global del cliente
+cliente_http = ClienteHTTP()
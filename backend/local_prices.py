@@ -0,0 +1,143 @@
+"""
+Precios de mercado a partir de lo ya scrapeado (tabla productos_scraped)
+Es la primera opción de /api/prices/suggest: una consulta local con
+agregados en SQL en lugar de salir a las fuentes externas.
+
+Coincidencia de un Product con filas de productos_scraped:
+1. Enlace explícito ProductoScraped.producto_id (columna indexada)
+2. Si no hay enlaces, filas de las categorías scrapeadas que comparten una
+   palabra con la categoría del producto cuyo nombre normalizado empieza por
+   la primera palabra significativa del producto (prefijo sobre el índice
+   (categoria, nombre_normalizado)) y contiene las demás.
+   Sin categoría coincidente no se usa la fuente local.
+
+Configuración (.env):
+- LOCAL_PRICES: "false" para desactivar la fuente local
+- LOCAL_PRICES_MIN_MATCHES: coincidencias por nombre mínimas para usar la
+  fuente local (con enlaces explícitos alcanza uno)
+- LOCAL_PRICES_MAX_SOURCES: filas devueltas como market_sources
+"""
+
+import os
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from emparejamiento import normalizar_nombre
+from models import Product, ProductoScraped
+
+LOCAL_PRICES = os.getenv("LOCAL_PRICES", "true").lower() in ("1", "true", "si")
+LOCAL_PRICES_MIN_MATCHES = int(os.getenv("LOCAL_PRICES_MIN_MATCHES", "3"))
+LOCAL_PRICES_MAX_SOURCES = int(os.getenv("LOCAL_PRICES_MAX_SOURCES", "20"))
+
+# Palabras que no distinguen productos
+_PALABRAS_VACIAS = {
+    "de", "del", "la", "las", "el", "los", "con", "sin", "para", "por", "y",
+    "en", "a", "un", "una",
+}
+
+
+def significant_words(name: str) -> List[str]:
+    """Palabras del nombre normalizado (solo letras y números) sin palabras vacías"""
+    return [
+        p for p in normalizar_nombre(name).split() if len(p) > 2 and p not in _PALABRAS_VACIAS
+    ]
+
+
+def _raiz(palabra: str) -> str:
+    """Sin la última letra, para cubrir singular y plural"""
+    return palabra[:-1] if len(palabra) > 4 else palabra
+
+
+class LocalPriceSource:
+    """Estadísticas de precio de la competencia calculadas en la base de datos"""
+
+    def __init__(
+        self,
+        min_matches: int = LOCAL_PRICES_MIN_MATCHES,
+        max_sources: int = LOCAL_PRICES_MAX_SOURCES,
+        enabled: bool = LOCAL_PRICES,
+    ):
+        self.min_matches = max(1, min_matches)
+        self.max_sources = max_sources
+        self.enabled = enabled
+
+    @staticmethod
+    def _categorias(db: Session, category: Optional[str]) -> List[str]:
+        """Categorías scrapeadas que comparten alguna raíz con la del producto"""
+        raices = {_raiz(p) for p in significant_words(category)}
+        if not raices:
+            return []
+        return [
+            categoria
+            for (categoria,) in db.query(ProductoScraped.categoria).distinct()
+            if categoria and raices & {_raiz(p) for p in significant_words(categoria)}
+        ]
+
+    def _condiciones(self, db: Session, product: Product) -> Optional[tuple]:
+        """(criterio, filtro) de las filas que corresponden al producto"""
+        base = ProductoScraped.precio.isnot(None)
+        enlazados = db.query(func.count(ProductoScraped.id)).filter(
+            base, ProductoScraped.producto_id == product.id
+        ).scalar()
+        if enlazados:
+            return "producto_id", and_(base, ProductoScraped.producto_id == product.id)
+
+        raices = [_raiz(p) for p in significant_words(product.name)]
+        categorias = self._categorias(db, product.category)
+        if not raices or not categorias:
+            return None
+        # Las palabras normalizadas son solo [a-z0-9]: no hay comodines que escapar
+        nombre = ProductoScraped.nombre_normalizado
+        return "nombre", and_(
+            base,
+            ProductoScraped.categoria.in_(categorias),
+            nombre.like(f"{raices[0]}%"),
+            *[nombre.like(f"% {raiz}%") for raiz in raices[1:]],
+        )
+
+    def market_stats(self, db: Session, product: Product) -> Optional[Dict]:
+        """
+        Devuelve {"match", "count", "min_price", "max_price", "avg_price",
+        "sources"} o None si no hay suficientes coincidencias
+        """
+        if not self.enabled:
+            return None
+        condiciones = self._condiciones(db, product)
+        if condiciones is None:
+            return None
+        criterio, filtro = condiciones
+
+        count, min_price, max_price, avg_price = db.query(
+            func.count(ProductoScraped.id),
+            func.min(ProductoScraped.precio),
+            func.max(ProductoScraped.precio),
+            func.avg(ProductoScraped.precio),
+        ).filter(filtro).one()
+        if not count or (criterio == "nombre" and count < self.min_matches):
+            return None
+
+        # Las filas más cercanas al promedio como fuentes de referencia
+        filas = (
+            db.query(ProductoScraped.fuente, ProductoScraped.precio, ProductoScraped.link)
+            .filter(filtro)
+            .order_by(func.abs(ProductoScraped.precio - avg_price))
+            .limit(self.max_sources)
+            .all()
+        )
+        return {
+            "match": criterio,
+            "count": count,
+            "min_price": min_price,
+            "max_price": max_price,
+            "avg_price": float(avg_price),
+            "sources": [
+                {"source": fuente or "scraping", "price": precio, "url": link}
+                for fuente, precio, link in filas
+            ],
+        }
+
+
+# Instancia global de la fuente local
+local_price_source = LocalPriceSource()
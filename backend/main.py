@@ -1,5 +1,6 @@
 from fastapi import (
     FastAPI,
+    BackgroundTasks,
     Depends,
     HTTPException,
     status,
@@ -10,11 +11,16 @@ from fastapi import (
 )
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, timezone
 from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import asynccontextmanager
 import uvicorn
+import json
 import os
 import shutil
 import time
@@ -34,6 +40,10 @@ from models import (
     WhatsAppProveedor,
     WhatsAppProductoCotizado,
     ProductoScraped,
+    HistorialPrecioScraped,
+    ScrapingCheckpoint,
+    EmparejamientoRevision,
+    UmbralAlerta,
 )
 from schemas import (
     UserCreate,
@@ -46,6 +56,8 @@ from schemas import (
     ProductResponse,
     PriceComparisonResponse,
     PriceSuggestion,
+    PriceSuggestionBatchRequest,
+    GPTExtraerPreciosLoteRequest,
     ChatMessage,
     ChatResponse,
     GPTRespuestaEmpresaRequest,
@@ -64,7 +76,16 @@ from schemas import (
     ProductoScrapedResponse,
     ScrapingRequest,
     ScrapingFullRequest,
+    ScrapingCategoriasRequest,
     ScrapingResponse,
+    TrabajoScrapingResponse,
+    ScrapingCheckpointResponse,
+    HistorialPrecioResponse,
+    SeriePrecioResponse,
+    EmparejamientoRevisionResponse,
+    EmparejamientoResolverRequest,
+    UmbralAlertaRequest,
+    UmbralAlertaResponse,
 )
 from auth import (
     get_current_user,
@@ -73,18 +94,37 @@ from auth import (
     get_password_hash,
 )
 from price_scraper import PriceScraper
+from price_cache import market_price_cache
+from local_prices import local_price_source
+from emparejamiento import emparejador, emparejar_nuevos
+from alertas_precios import motor_alertas
 from chatbot import ChatbotAssistant
-from gpt_client import gpt_client
+from gpt_client import gpt_client, GPT_LOTE_TAMANO, GPT_LOTE_CONCURRENCIA
+from cache_gpt import cache_gpt
+from conversaciones import historial_conversaciones
+from prompt_conversacion import constructor_prompt
 from whatsapp_service import whatsapp_service
-from scraper_service import scraper_service
+from scraper_service import scraper_service, MODOS_ESCANEO, CATEGORIAS_SCRAPING
+from trabajos_scraping import trabajos_scraping
+from http_client import cliente_http
+from cache_http import cache_http
 
 # Crear tablas
 Base.metadata.create_all(bind=engine)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Cerrar las conexiones keep-alive con OpenAI en el loop que las abrió
+    await gpt_client.cerrar()
+
+
 app = FastAPI(
     title="MobiCorp - Sistema de Gestión de Muebles y Mobiliario",
     description="Sistema especializado en la gestión de ventas de muebles y mobiliario de oficina (sillas ejecutivas, escritorios, mesas, etc.)",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS
@@ -481,19 +521,109 @@ def approve_order(
 # ==================== COMPARACIÓN DE PRECIOS ====================
 
 
+def estadisticas_mercado(market_prices: List[dict]) -> dict:
+    """Mínimo, máximo, promedio y precio sugerido (promedio de mercado)"""
+    prices = [p["price"] for p in market_prices]
+    avg_price = sum(prices) / len(prices)
+    return {
+        "suggested_price": avg_price,
+        "min_price": min(prices),
+        "max_price": max(prices),
+        "avg_price": avg_price,
+    }
+
+
+def estadisticas_locales(local: dict) -> dict:
+    """Estadísticas de la fuente local (agregadas en SQL) con el mismo formato"""
+    return {
+        "suggested_price": local["avg_price"],
+        "min_price": local["min_price"],
+        "max_price": local["max_price"],
+        "avg_price": local["avg_price"],
+    }
+
+
+def registrar_comparacion(
+    db: Session,
+    product_id: int,
+    category: Optional[str],
+    product_price: Optional[float],
+    stats: dict,
+    source_count: int,
+    user_id: int,
+):
+    """
+    Agrega a la sesión la comparación de precios y, si el promedio de mercado
+    supera el umbral de variación del producto (motor de alertas, con
+    cooldown), la alerta. No hace commit; devuelve (comparación, alerta o None)
+    """
+    comparison = PriceComparison(
+        product_id=product_id,
+        min_price=stats["min_price"],
+        max_price=stats["max_price"],
+        avg_price=stats["avg_price"],
+        suggested_price=stats["suggested_price"],
+        source_count=source_count,
+        user_id=user_id,
+    )
+
+    db.add(comparison)
+    alert = motor_alertas.evaluar_variacion(
+        db, product_id, category, product_price, stats["avg_price"], "sugerencia"
+    )
+    return comparison, alert
+
+
 @app.post("/api/prices/suggest", response_model=PriceSuggestion)
 def suggest_price(
     product_id: int,
+    refresh: bool = False,
+    use_local: bool = True,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Obtener precio sugerido basado en comparación de mercado"""
+    """
+    Obtener precio sugerido basado en comparación de mercado
+    - Primero se usan los precios ya scrapeados de la competencia
+      (productos_scraped) que corresponden al producto; use_local=false lo omite
+    - Los precios de mercado se cachean por nombre y categoría: dentro del TTL
+      se reutilizan y, si están viejos, se sirven mientras se refrescan en segundo plano
+    - refresh=true fuerza una consulta nueva a las fuentes
+    """
     product = db.query(Product).filter(Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
 
-    # Realizar web scraping para obtener precios del mercado
-    market_prices = price_scraper.scrape_prices(product.name, product.category)
+    local = local_price_source.market_stats(db, product) if use_local else None
+    if local:
+        stats = estadisticas_locales(local)
+        comparison, _ = registrar_comparacion(
+            db,
+            product_id,
+            product.category,
+            product.price,
+            stats,
+            local["count"],
+            current_user.id,
+        )
+        db.commit()
+        return {
+            **stats,
+            "market_sources": local["sources"],
+            "comparison_id": comparison.id,
+            "price_origin": "local",
+            "local_match_count": local["count"],
+        }
+
+    # Consultar las fuentes de mercado en paralelo (las que no responden a tiempo se omiten)
+    entrada, cache_meta = market_price_cache.get(
+        product.name,
+        product.category,
+        lambda: price_scraper.fetch_market_prices(product.name, product.category),
+        force_refresh=refresh,
+    )
+    mercado = entrada.result
+    market_prices = mercado["sources"]
 
     if not market_prices:
         raise HTTPException(
@@ -501,51 +631,212 @@ def suggest_price(
             detail="No se encontraron precios en el mercado para este producto",
         )
 
-    # Calcular estadísticas
-    prices = [p["price"] for p in market_prices]
-    min_price = min(prices)
-    max_price = max(prices)
-    avg_price = sum(prices) / len(prices)
-
-    # Precio sugerido basado en promedio de mercado
-    suggested_price = avg_price
-
-    # Guardar comparación en BD
-    comparison = PriceComparison(
-        product_id=product_id,
-        min_price=min_price,
-        max_price=max_price,
-        avg_price=avg_price,
-        suggested_price=suggested_price,
-        source_count=len(market_prices),
-        user_id=current_user.id,
-    )
-    db.add(comparison)
-    db.commit()
-
-    # Verificar alertas de precio
-    if (
-        product.price and abs(product.price - avg_price) / product.price > 0.1
-    ):  # 10% de variación
-        alert = PriceAlert(
-            product_id=product_id,
-            old_price=product.price,
-            new_price=avg_price,
-            variation_percent=((avg_price - product.price) / product.price) * 100,
+    stats = estadisticas_mercado(market_prices)
+
+    # Con datos de caché ya comparados para este producto (al mismo precio de
+    # catálogo) se reutiliza la comparación
+    comparada = entrada.comparisons.get(product_id)
+    comparison_id = comparada[1] if comparada and comparada[0] == product.price else None
+    if comparison_id is None:
+        comparison, _ = registrar_comparacion(
+            db,
+            product_id,
+            product.category,
+            product.price,
+            stats,
+            len(market_prices),
+            current_user.id,
         )
-        db.add(alert)
         db.commit()
+        comparison_id = comparison.id
+        entrada.comparisons[product_id] = (product.price, comparison_id)
 
     return {
-        "suggested_price": suggested_price,
-        "min_price": min_price,
-        "max_price": max_price,
-        "avg_price": avg_price,
+        **stats,
         "market_sources": market_prices,
-        "comparison_id": comparison.id,
+        "comparison_id": comparison_id,
+        "failed_sources": mercado["failed_sources"],
+        **cache_meta,
     }
 
 
+@app.post("/api/prices/suggest/batch")
+def suggest_price_batch(
+    request: PriceSuggestionBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Precio sugerido para varios productos (lista de ids o una categoría)
+    - Los productos con precios ya scrapeados se resuelven localmente al inicio
+    - Las fuentes de mercado se consultan en paralelo para todos los productos
+    - Responde NDJSON: una línea por producto a medida que termina y una
+      línea final con el resumen
+    - Comparaciones y alertas se guardan todas juntas en una sola transacción
+      al final (la línea final trae los comparison_id por producto)
+    """
+    if not request.product_ids and not request.category:
+        raise HTTPException(
+            status_code=400, detail="Indique product_ids o category"
+        )
+
+    query = db.query(Product)
+    if request.product_ids:
+        query = query.filter(Product.id.in_(request.product_ids))
+    if request.category:
+        # Igualdad sin distinguir mayúsculas: la categoría no es un patrón LIKE
+        query = query.filter(
+            func.lower(Product.category) == request.category.strip().lower()
+        )
+    productos, locales = [], []
+    for p in query.order_by(Product.id):
+        producto = {"id": p.id, "name": p.name, "category": p.category, "price": p.price}
+        local = local_price_source.market_stats(db, p) if request.use_local else None
+        if local:
+            locales.append((producto, local))
+        else:
+            productos.append(producto)
+    if not productos and not locales:
+        raise HTTPException(status_code=404, detail="No se encontraron productos")
+
+    no_encontrados = sorted(
+        set(request.product_ids or [])
+        - {p["id"] for p in productos}
+        - {p["id"] for p, _ in locales}
+    )
+    concurrency = max(1, min(request.concurrency or 8, 32))
+    user_id = current_user.id
+
+    def consultar(producto):
+        return market_price_cache.get(
+            producto["name"],
+            producto["category"],
+            lambda: price_scraper.fetch_market_prices(
+                producto["name"], producto["category"]
+            ),
+            force_refresh=request.refresh,
+        )
+
+    def generar():
+        pendientes = []  # (producto, entrada, stats, source_count)
+        errores = 0
+        for product_id in no_encontrados:
+            errores += 1
+            yield json.dumps(
+                {"product_id": product_id, "status": "error", "detail": "Producto no encontrado"}
+            ) + "\n"
+
+        for producto, local in locales:
+            stats = estadisticas_locales(local)
+            pendientes.append((producto, None, stats, local["count"]))
+            yield json.dumps(
+                {
+                    "product_id": producto["id"],
+                    "status": "ok",
+                    **stats,
+                    "market_sources": local["sources"],
+                    "price_origin": "local",
+                    "local_match_count": local["count"],
+                }
+            ) + "\n"
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futuros = {executor.submit(consultar, p): p for p in productos}
+            for futuro in as_completed(futuros):
+                producto = futuros[futuro]
+                try:
+                    entrada, cache_meta = futuro.result()
+                except Exception as e:
+                    errores += 1
+                    yield json.dumps(
+                        {"product_id": producto["id"], "status": "error", "detail": str(e)}
+                    ) + "\n"
+                    continue
+
+                mercado = entrada.result
+                if not mercado["sources"]:
+                    errores += 1
+                    yield json.dumps(
+                        {
+                            "product_id": producto["id"],
+                            "status": "error",
+                            "detail": "No se encontraron precios en el mercado para este producto",
+                            "failed_sources": mercado["failed_sources"],
+                        }
+                    ) + "\n"
+                    continue
+
+                stats = estadisticas_mercado(mercado["sources"])
+                pendientes.append((producto, entrada, stats, len(mercado["sources"])))
+                yield json.dumps(
+                    {
+                        "product_id": producto["id"],
+                        "status": "ok",
+                        **stats,
+                        "market_sources": mercado["sources"],
+                        "failed_sources": mercado["failed_sources"],
+                        "price_origin": "market",
+                        **cache_meta,
+                    }
+                ) + "\n"
+
+        # Una sola transacción para todas las comparaciones y alertas
+        comparaciones = {}
+        alertas = 0
+        sesion = SessionLocal()
+        try:
+            nuevas = []
+            for producto, entrada, stats, source_count in pendientes:
+                comparada = entrada.comparisons.get(producto["id"]) if entrada else None
+                if comparada and comparada[0] == producto["price"]:
+                    comparaciones[producto["id"]] = comparada[1]
+                    continue
+                comparison, alert = registrar_comparacion(
+                    sesion,
+                    producto["id"],
+                    producto["category"],
+                    producto["price"],
+                    stats,
+                    source_count,
+                    user_id,
+                )
+                if alert:
+                    alertas += 1
+                nuevas.append((producto, entrada, comparison))
+            sesion.commit()
+            for producto, entrada, comparison in nuevas:
+                comparaciones[producto["id"]] = comparison.id
+                if entrada:
+                    entrada.comparisons[producto["id"]] = (producto["price"], comparison.id)
+            resumen = {"status": "done"}
+        except Exception as e:
+            sesion.rollback()
+            print(f"❌ Error guardando comparaciones en lote: {e}")
+            comparaciones, alertas = {}, 0
+            resumen = {"status": "error", "detail": str(e)}
+        finally:
+            sesion.close()
+
+        yield json.dumps(
+            {
+                **resumen,
+                "total": len(productos) + len(locales) + len(no_encontrados),
+                "ok": len(pendientes),
+                "errors": errores,
+                "alerts_created": alertas,
+                "comparison_ids": comparaciones,
+            }
+        ) + "\n"
+
+    return StreamingResponse(generar(), media_type="application/x-ndjson")
+
+
+@app.get("/api/prices/cache")
+def price_cache_metrics(current_user: User = Depends(get_current_user)):
+    """Aciertos, aciertos viejos, fallos y refrescos de la caché de precios de mercado"""
+    return market_price_cache.metrics()
+
+
 @app.get("/api/prices/comparisons", response_model=List[PriceComparisonResponse])
 def get_price_comparisons(
     product_id: Optional[int] = None,
@@ -569,24 +860,123 @@ def get_price_comparisons(
 
 @app.get("/api/prices/alerts")
 def get_price_alerts(
-    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    product_id: Optional[int] = None,
+    origen: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
 ):
-    """Obtener alertas de variación de precios"""
-    alerts = db.query(PriceAlert).order_by(PriceAlert.created_at.desc()).limit(50).all()
+    """
+    Obtener alertas de variación de precios, de la más reciente a la más antigua
+    - Paginación por cursor: para la página siguiente enviar before_id con el
+      id de la última alerta recibida
+    - Filtros opcionales por producto y origen (sugerencia, scraping, whatsapp)
+    """
+    query = db.query(PriceAlert, Product.name).outerjoin(
+        Product, PriceAlert.product_id == Product.id
+    )
+    if before_id is not None:
+        query = query.filter(PriceAlert.id < before_id)
+    if product_id is not None:
+        query = query.filter(PriceAlert.product_id == product_id)
+    if origen:
+        query = query.filter(PriceAlert.origen == origen)
+
     return [
         {
             "id": alert.id,
             "product_id": alert.product_id,
-            "product_name": alert.product.name if alert.product else "N/A",
+            "product_name": product_name or "N/A",
             "old_price": alert.old_price,
             "new_price": alert.new_price,
             "variation_percent": alert.variation_percent,
+            "origen": alert.origen,
             "created_at": alert.created_at,
         }
-        for alert in alerts
+        for alert, product_name in query.order_by(PriceAlert.id.desc()).limit(limit)
     ]
 
 
+@app.get("/api/prices/alerts/umbrales", response_model=List[UmbralAlertaResponse])
+def listar_umbrales_alerta(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Umbrales de alerta configurados por producto o categoría
+    Los campos nulos heredan el valor de la categoría o el de por defecto
+    """
+    return db.query(UmbralAlerta).order_by(UmbralAlerta.id).all()
+
+
+@app.put("/api/prices/alerts/umbrales", response_model=UmbralAlertaResponse)
+def guardar_umbral_alerta(
+    request: UmbralAlertaRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Crea o actualiza el umbral de un producto (product_id) o de una categoría
+    """
+    if (request.product_id is None) == (request.categoria is None):
+        raise HTTPException(
+            status_code=400, detail="Indique product_id o categoria (solo uno)"
+        )
+    if request.product_id is not None:
+        if not db.query(Product).filter(Product.id == request.product_id).first():
+            raise HTTPException(status_code=404, detail="Producto no encontrado")
+        umbral = (
+            db.query(UmbralAlerta)
+            .filter(UmbralAlerta.product_id == request.product_id)
+            .first()
+        )
+    else:
+        umbral = (
+            db.query(UmbralAlerta)
+            .filter(UmbralAlerta.categoria == request.categoria)
+            .first()
+        )
+
+    if umbral is None:
+        umbral = UmbralAlerta(product_id=request.product_id, categoria=request.categoria)
+        db.add(umbral)
+    umbral.variacion_porcentaje = request.variacion_porcentaje
+    umbral.desviaciones = request.desviaciones
+    umbral.cooldown_minutos = request.cooldown_minutos
+    db.commit()
+    db.refresh(umbral)
+    motor_alertas.invalidar_umbrales()
+    return umbral
+
+
+@app.delete("/api/prices/alerts/umbrales/{umbral_id}")
+def eliminar_umbral_alerta(
+    umbral_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Elimina un umbral (el producto o la categoría vuelven a heredar)
+    """
+    umbral = db.query(UmbralAlerta).filter(UmbralAlerta.id == umbral_id).first()
+    if not umbral:
+        raise HTTPException(status_code=404, detail="Umbral no encontrado")
+    db.delete(umbral)
+    db.commit()
+    motor_alertas.invalidar_umbrales()
+    return {"message": "Umbral eliminado"}
+
+
+@app.get("/api/prices/alerts/metricas")
+def metricas_alertas(current_user: User = Depends(get_current_user)):
+    """
+    Observaciones evaluadas, alertas creadas y alertas suprimidas por cooldown
+    desde que arrancó el proceso
+    """
+    return motor_alertas.metricas
+
+
 # ==================== CHATBOT ====================
 
 
@@ -612,25 +1002,34 @@ def gpt_health():
         "message": "Servicio de GPT activo",
         "model": gpt_client.model,
         "api_key_configured": gpt_client.api_key is not None,
+        "metricas": gpt_client.metricas,
+        "latencias_respuesta_empresa": gpt_client.latencias.resumen(),
+        "cache": cache_gpt.metricas(),
+        "historial": historial_conversaciones.resumen(),
+        "prompts": constructor_prompt.resumen(),
     }
 
 
 @app.post(
     "/api/gpt/generar-respuesta-empresa", response_model=GPTRespuestaEmpresaResponse
 )
-def gpt_generar_respuesta_empresa(
+async def gpt_generar_respuesta_empresa(
     request: GPTRespuestaEmpresaRequest,
     current_user: User = Depends(get_current_user),
 ):
     """
     Genera una respuesta profesional para negociar con proveedores
     Utiliza IA para crear respuestas contextuales y naturales
+    - modo: json (evaluar y responder en una llamada) o dos_llamadas
     """
+    if request.modo not in (None, "json", "dos_llamadas"):
+        raise HTTPException(status_code=400, detail="Modo inválido. Use: json, dos_llamadas")
     try:
-        resultado = gpt_client.generar_respuesta_empresa(
+        resultado = await gpt_client.generar_respuesta_empresa(
             mensaje=request.mensaje,
             numero_proveedor=request.numero_proveedor,
             tiene_precio=request.tiene_precio,
+            modo=request.modo,
         )
 
         if not resultado.get("exito"):
@@ -649,7 +1048,7 @@ def gpt_generar_respuesta_empresa(
 
 
 @app.post("/api/gpt/extraer-precios", response_model=GPTExtraerPreciosResponse)
-def gpt_extraer_precios(
+async def gpt_extraer_precios(
     request: GPTExtraerPreciosRequest,
     current_user: User = Depends(get_current_user),
 ):
@@ -658,7 +1057,7 @@ def gpt_extraer_precios(
     Primero intenta con regex, luego con IA si es necesario
     """
     try:
-        resultado = gpt_client.extraer_precios(
+        resultado = await gpt_client.extraer_precios(
             mensaje=request.mensaje,
             numero_proveedor=request.numero_proveedor,
         )
@@ -672,6 +1071,9 @@ def gpt_extraer_precios(
         return {
             "tienePrecio": resultado.get("tienePrecio", False),
             "precios": resultado.get("precios", []),
+            "valores": resultado.get("valores", []),
+            "monedas": resultado.get("monedas", []),
+            "cantidades": resultado.get("cantidades", []),
             "productos": resultado.get("productos", []),
             "metodo": resultado.get("metodo", "regex"),
             "exito": resultado.get("exito", False),
@@ -680,8 +1082,56 @@ def gpt_extraer_precios(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/gpt/extraer-precios/lote")
+async def gpt_extraer_precios_lote(
+    request: GPTExtraerPreciosLoteRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Extrae precios de muchos mensajes (lista o mensaje_completo de
+    whatsapp_productos_cotizados)
+    - Primero regex sobre todos; los que quedan sin precio van a la IA
+      agrupados (varios mensajes por llamada, respuesta JSON)
+    - Responde NDJSON: una línea por mensaje a medida que termina y una
+      línea final con el resumen
+    """
+    if request.mensajes:
+        mensajes = [m.model_dump() for m in request.mensajes]
+    elif request.origen == "whatsapp_productos_cotizados":
+        query = db.query(
+            WhatsAppProductoCotizado.id, WhatsAppProductoCotizado.mensaje_completo
+        ).filter(WhatsAppProductoCotizado.mensaje_completo.isnot(None))
+        if request.solo_sin_precio:
+            query = query.filter(WhatsAppProductoCotizado.tiene_precio.isnot(True))
+        query = query.order_by(WhatsAppProductoCotizado.id)
+        if request.limite:
+            query = query.limit(request.limite)
+        mensajes = [{"id": id_, "mensaje": texto} for id_, texto in query]
+    else:
+        raise HTTPException(
+            status_code=400,
+            detail='Indique mensajes u origen "whatsapp_productos_cotizados"',
+        )
+    if not mensajes:
+        raise HTTPException(status_code=404, detail="No hay mensajes para procesar")
+
+    lineas = gpt_client.extraer_precios_lote(
+        mensajes,
+        tamano_lote=max(1, min(request.tamano_lote or GPT_LOTE_TAMANO, 50)),
+        concurrencia=max(1, min(request.concurrencia or GPT_LOTE_CONCURRENCIA, 16)),
+        usar_ia=not request.solo_regex,
+    )
+
+    async def generar():
+        async for linea in lineas:
+            yield json.dumps(linea, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(generar(), media_type="application/x-ndjson")
+
+
 @app.post("/api/gpt/obtener-respuesta", response_model=GPTObtenerRespuestaResponse)
-def gpt_obtener_respuesta(
+async def gpt_obtener_respuesta(
     request: GPTObtenerRespuestaRequest,
     current_user: User = Depends(get_current_user),
 ):
@@ -690,7 +1140,7 @@ def gpt_obtener_respuesta(
     Asistente virtual de atención al cliente
     """
     try:
-        resultado = gpt_client.obtener_respuesta(
+        resultado = await gpt_client.obtener_respuesta(
             mensaje=request.mensaje,
             numero_usuario=request.numero_usuario,
         )
@@ -741,7 +1191,6 @@ async def gpt_procesar_pdf(
         from PyPDF2 import PdfReader, PdfWriter
         from io import BytesIO
         import json
-        import openai
 
         # Validar que se envió un archivo
         if not pdf_file or pdf_file.filename == "":
@@ -788,9 +1237,8 @@ Contenido del PDF:
 {resumen_paginas}"""
 
         try:
-            response = openai.ChatCompletion.create(
-                model=gpt_client.model,
-                messages=[
+            resultado_texto = await gpt_client.llamar_openai_async(
+                [
                     {
                         "role": "system",
                         "content": "Eres un asistente especializado en analizar catálogos PDF de muebles. Debes identificar páginas sobre muebles de oficina y responder SOLO con JSON válido.",
@@ -799,11 +1247,10 @@ Contenido del PDF:
                 ],
                 temperature=0.3,
                 max_tokens=200,
-                timeout=15,
+                sanitizar=False,
+                cachear=True,
             )
 
-            resultado_texto = response.choices[0].message.content.strip()
-
             # Parsear respuesta JSON
             try:
                 resultado = json.loads(resultado_texto)
@@ -1224,7 +1671,9 @@ async def upload_whatsapp_image(file: UploadFile = File(...)):
 
 @app.post("/api/whatsapp/productos", response_model=WhatsAppProductoCotizadoResponse)
 def crear_producto_cotizado(
-    producto: WhatsAppProductoCotizadoCreate, db: Session = Depends(get_db)
+    producto: WhatsAppProductoCotizadoCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
 ):
     """Guardar un producto individual cotizado por WhatsApp"""
     # Buscar o crear proveedor
@@ -1252,6 +1701,8 @@ def crear_producto_cotizado(
     db.add(db_producto)
     db.commit()
     db.refresh(db_producto)
+    # Enlazar con el catálogo y evaluar alertas sin demorar al bot
+    background_tasks.add_task(emparejar_nuevos, ["whatsapp"], [db_producto.id])
     return db_producto
 
 
@@ -1394,9 +1845,26 @@ def obtener_resumen_proveedor(proveedor_numero: str, db: Session = Depends(get_d
 # ==================== WEB SCRAPING ====================
 
 
+def validar_peticion_scraping(request) -> dict:
+    """Valida categoría y modo de una petición de scraping y devuelve la categoría"""
+    if request.categoria not in CATEGORIAS_SCRAPING:
+        raise HTTPException(
+            status_code=400, detail="Categoría inválida. Use 1, 2, 3 o 4"
+        )
+
+    if request.modo not in MODOS_ESCANEO:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Modo inválido. Use: {', '.join(MODOS_ESCANEO)}",
+        )
+
+    return CATEGORIAS_SCRAPING[request.categoria]
+
+
 @app.post("/api/scraping/rango", response_model=ScrapingResponse)
 def scraping_rango(
     request: ScrapingRequest,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
 ):
     """
@@ -1404,33 +1872,11 @@ def scraping_rango(
     - categoria: 1=Bar, 2=Muebles de Oficina, 3=Mobiliario Educativo, 4=Sillas de Oficina
     - Rápido: min_precio=0, max_precio=100
     - Medio: min_precio=0, max_precio=300
+    - modo: "lineal" (una petición por precio), "biseccion" (menos peticiones)
+      o "incremental" (re-escaneo de precios conocidos, reporta cambios)
+    - Para barridos largos usar /api/scraping/trabajos/rango (no bloquea)
     """
-    # Mapeo de categorías
-    categorias = {
-        1: {
-            "url": "https://www.livingroom.com.bo/product-category/bar/",
-            "nombre": "Bar",
-        },
-        2: {
-            "url": "https://www.livingroom.com.bo/product-category/muebles-de-oficina/",
-            "nombre": "Muebles de Oficina",
-        },
-        3: {
-            "url": "https://www.livingroom.com.bo/product-category/mobiliario_educativo/",
-            "nombre": "Mobiliario Educativo",
-        },
-        4: {
-            "url": "https://www.livingroom.com.bo/product-category/sillas-de-oficina/",
-            "nombre": "Sillas de Oficina",
-        },
-    }
-
-    if request.categoria not in categorias:
-        raise HTTPException(
-            status_code=400, detail="Categoría inválida. Use 1, 2, 3 o 4"
-        )
-
-    cat_info = categorias[request.categoria]
+    cat_info = validar_peticion_scraping(request)
 
     resultado = scraper_service.escanear_rango_rapido(
         db=db,
@@ -1439,7 +1885,12 @@ def scraping_rango(
         categoria_url=cat_info["url"],
         categoria_nombre=cat_info["nombre"],
         delay=request.delay,
+        concurrencia=request.concurrencia,
+        modo=request.modo,
+        reanudar=request.reanudar,
     )
+    # Enlazar los productos nuevos con el catálogo sin demorar la respuesta
+    background_tasks.add_task(emparejar_nuevos, ["scraping"])
 
     return resultado
 
@@ -1447,50 +1898,231 @@ def scraping_rango(
 @app.post("/api/scraping/completo", response_model=ScrapingResponse)
 def scraping_completo(
     request: ScrapingFullRequest,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
 ):
     """
     Escaneo completo de todos los precios disponibles (0-810)
     - categoria: 1=Bar, 2=Muebles de Oficina, 3=Mobiliario Educativo, 4=Sillas de Oficina
     - Más lento pero exhaustivo
+    - modo: "lineal" (una petición por precio), "biseccion" (menos peticiones)
+      o "incremental" (re-escaneo de precios conocidos, reporta cambios)
+    - Para barridos largos usar /api/scraping/trabajos/completo (no bloquea)
     """
-    # Mapeo de categorías
-    categorias = {
-        1: {
-            "url": "https://www.livingroom.com.bo/product-category/bar/",
-            "nombre": "Bar",
-        },
-        2: {
-            "url": "https://www.livingroom.com.bo/product-category/muebles-de-oficina/",
-            "nombre": "Muebles de Oficina",
-        },
-        3: {
-            "url": "https://www.livingroom.com.bo/product-category/mobiliario_educativo/",
-            "nombre": "Mobiliario Educativo",
-        },
-        4: {
-            "url": "https://www.livingroom.com.bo/product-category/sillas-de-oficina/",
-            "nombre": "Sillas de Oficina",
-        },
-    }
-
-    if request.categoria not in categorias:
-        raise HTTPException(
-            status_code=400, detail="Categoría inválida. Use 1, 2, 3 o 4"
-        )
-
-    cat_info = categorias[request.categoria]
+    cat_info = validar_peticion_scraping(request)
 
     resultado = scraper_service.escanear_completo(
         db=db,
         categoria_url=cat_info["url"],
         categoria_nombre=cat_info["nombre"],
         delay=request.delay,
+        concurrencia=request.concurrencia,
+        modo=request.modo,
+        reanudar=request.reanudar,
     )
+    background_tasks.add_task(emparejar_nuevos, ["scraping"])
 
     return resultado
 
 
+@app.post("/api/scraping/trabajos/rango", response_model=TrabajoScrapingResponse)
+def crear_trabajo_scraping_rango(request: ScrapingRequest):
+    """
+    Lanza un escaneo de rango en segundo plano y devuelve el trabajo de inmediato
+    Consultar el progreso en GET /api/scraping/trabajos/{trabajo_id}
+    """
+    cat_info = validar_peticion_scraping(request)
+
+    def ejecutar(db, contexto):
+        return scraper_service.escanear_rango_rapido(
+            db=db,
+            min_precio=request.min_precio,
+            max_precio=request.max_precio,
+            categoria_url=cat_info["url"],
+            categoria_nombre=cat_info["nombre"],
+            delay=request.delay,
+            concurrencia=request.concurrencia,
+            modo=request.modo,
+            contexto=contexto,
+            reanudar=request.reanudar,
+        )
+
+    trabajo = trabajos_scraping.lanzar(
+        "rango", cat_info["nombre"], request.model_dump(), ejecutar
+    )
+    return trabajo.a_dict()
+
+
+@app.post(
+    "/api/scraping/trabajos/completo", response_model=TrabajoScrapingResponse
+)
+def crear_trabajo_scraping_completo(request: ScrapingFullRequest):
+    """
+    Lanza un escaneo completo en segundo plano y devuelve el trabajo de inmediato
+    Consultar el progreso en GET /api/scraping/trabajos/{trabajo_id}
+    """
+    cat_info = validar_peticion_scraping(request)
+
+    def ejecutar(db, contexto):
+        return scraper_service.escanear_completo(
+            db=db,
+            categoria_url=cat_info["url"],
+            categoria_nombre=cat_info["nombre"],
+            delay=request.delay,
+            concurrencia=request.concurrencia,
+            modo=request.modo,
+            contexto=contexto,
+            reanudar=request.reanudar,
+        )
+
+    trabajo = trabajos_scraping.lanzar(
+        "completo", cat_info["nombre"], request.model_dump(), ejecutar
+    )
+    return trabajo.a_dict()
+
+
+@app.post(
+    "/api/scraping/trabajos/categorias", response_model=TrabajoScrapingResponse
+)
+def crear_trabajo_scraping_categorias(request: ScrapingCategoriasRequest):
+    """
+    Barre varias categorías en paralelo en un solo trabajo (p. ej. el refresco nocturno)
+    - categorias: lista de 1=Bar, 2=Muebles de Oficina, 3=Mobiliario Educativo, 4=Sillas de Oficina
+    - concurrencia es un presupuesto global compartido por todas las categorías
+    - Los productos repetidos entre categorías se guardan una sola vez
+      (en la primera categoría de la lista) y se reportan en las estadísticas
+    """
+    categorias = list(dict.fromkeys(request.categorias))
+    if not categorias or any(c not in CATEGORIAS_SCRAPING for c in categorias):
+        raise HTTPException(
+            status_code=400, detail="Categorías inválidas. Use una lista con 1, 2, 3 o 4"
+        )
+    if request.modo not in MODOS_ESCANEO:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Modo inválido. Use: {', '.join(MODOS_ESCANEO)}",
+        )
+    if request.min_precio > request.max_precio:
+        raise HTTPException(
+            status_code=400, detail="min_precio no puede ser mayor que max_precio"
+        )
+
+    cat_infos = [CATEGORIAS_SCRAPING[c] for c in categorias]
+
+    def ejecutar(db, contexto):
+        return scraper_service.escanear_categorias(
+            db=db,
+            categorias=cat_infos,
+            min_precio=request.min_precio,
+            max_precio=request.max_precio,
+            delay=request.delay,
+            concurrencia=request.concurrencia,
+            modo=request.modo,
+            contexto=contexto,
+        )
+
+    trabajo = trabajos_scraping.lanzar(
+        "categorias",
+        ", ".join(c["nombre"] for c in cat_infos),
+        request.model_dump(),
+        ejecutar,
+    )
+    return trabajo.a_dict()
+
+
+@app.get("/api/scraping/trabajos", response_model=List[TrabajoScrapingResponse])
+def listar_trabajos_scraping(incluir_resultado: bool = False):
+    """
+    Lista los trabajos de scraping recientes (sin el detalle de productos por defecto)
+    """
+    trabajos = []
+    for trabajo in trabajos_scraping.listar():
+        datos = trabajo.a_dict()
+        if not incluir_resultado:
+            datos["resultado"] = None
+        trabajos.append(datos)
+    return trabajos
+
+
+@app.get(
+    "/api/scraping/trabajos/{trabajo_id}", response_model=TrabajoScrapingResponse
+)
+def obtener_trabajo_scraping(trabajo_id: str):
+    """
+    Progreso de un trabajo (precios escaneados, productos, ETA) y su resultado final
+    """
+    trabajo = trabajos_scraping.obtener(trabajo_id)
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return trabajo.a_dict()
+
+
+@app.post(
+    "/api/scraping/trabajos/{trabajo_id}/cancelar",
+    response_model=TrabajoScrapingResponse,
+)
+def cancelar_trabajo_scraping(trabajo_id: str):
+    """
+    Cancela un trabajo pendiente o en curso
+    """
+    trabajo = trabajos_scraping.cancelar(trabajo_id)
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return trabajo.a_dict()
+
+
+@app.get("/api/scraping/http/metricas")
+def obtener_metricas_http():
+    """
+    Métricas del cliente HTTP compartido por host: peticiones, reintentos,
+    errores, rechazos por circuito abierto, códigos de estado y latencia (promedio, p50, p95)
+    """
+    return cliente_http.metricas()
+
+
+@app.get("/api/scraping/http/cache")
+def obtener_cache_http():
+    """Entradas y tamaño de la caché HTTP en disco del scraping"""
+    return cache_http.metricas()
+
+
+@app.delete("/api/scraping/http/cache")
+def limpiar_cache_http(solo_vencidas: bool = False):
+    """
+    Vacía la caché HTTP del scraping
+    - solo_vencidas=true: elimina solo las entradas vencidas y las que exceden el tamaño máximo
+    """
+    eliminadas = cache_http.purgar() if solo_vencidas else cache_http.limpiar()
+    return {"eliminadas": eliminadas, **cache_http.metricas()}
+
+
+@app.get(
+    "/api/scraping/checkpoints", response_model=List[ScrapingCheckpointResponse]
+)
+def listar_checkpoints_scraping(
+    pendientes: bool = False,
+    limite: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    """
+    Checkpoints de barridos recientes
+    - pendientes=true: solo barridos interrumpidos (se pueden reanudar con reanudar=true)
+    """
+    query = db.query(ScrapingCheckpoint)
+    if pendientes:
+        query = query.filter(ScrapingCheckpoint.finalizado_en.is_(None))
+    checkpoints = (
+        query.order_by(ScrapingCheckpoint.iniciado_en.desc()).limit(limite).all()
+    )
+    return [
+        {
+            **ScrapingCheckpointResponse.model_validate(c).model_dump(),
+            "total_links": len(c.links_vistos or []),
+        }
+        for c in checkpoints
+    ]
+
+
 @app.get("/api/scraping/productos", response_model=List[ProductoScrapedResponse])
 def obtener_productos_scraped(
     limite: int = Query(100, ge=1, le=500),
@@ -1518,6 +2150,83 @@ def obtener_productos_scraped(
     return productos
 
 
+def obtener_producto_scraped_o_404(db: Session, producto_id: int) -> ProductoScraped:
+    producto = (
+        db.query(ProductoScraped).filter(ProductoScraped.id == producto_id).first()
+    )
+    if not producto:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return producto
+
+
+@app.get(
+    "/api/scraping/productos/{producto_id}/historial",
+    response_model=List[HistorialPrecioResponse],
+)
+def obtener_historial_producto_scraped(
+    producto_id: int,
+    desde: Optional[datetime] = Query(None),
+    hasta: Optional[datetime] = Query(None),
+    limite: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+):
+    """
+    Cambios de precio observados de un producto scraped (más antiguos primero)
+    """
+    obtener_producto_scraped_o_404(db, producto_id)
+
+    query = db.query(HistorialPrecioScraped).filter(
+        HistorialPrecioScraped.producto_scraped_id == producto_id
+    )
+    if desde:
+        query = query.filter(HistorialPrecioScraped.observado_en >= desde)
+    if hasta:
+        query = query.filter(HistorialPrecioScraped.observado_en <= hasta)
+
+    return query.order_by(HistorialPrecioScraped.observado_en).limit(limite).all()
+
+
+@app.get(
+    "/api/scraping/productos/{producto_id}/historial/serie",
+    response_model=SeriePrecioResponse,
+)
+def obtener_serie_precio_producto_scraped(
+    producto_id: int,
+    puntos: int = Query(50, ge=1, le=1000),
+    desde: Optional[datetime] = Query(None),
+    hasta: Optional[datetime] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Historial de precio reducido a `puntos` intervalos para graficar
+    """
+    obtener_producto_scraped_o_404(db, producto_id)
+
+    query = db.query(
+        HistorialPrecioScraped.precio, HistorialPrecioScraped.observado_en
+    ).filter(HistorialPrecioScraped.producto_scraped_id == producto_id)
+    if hasta:
+        query = query.filter(HistorialPrecioScraped.observado_en <= hasta)
+    observaciones = query.order_by(HistorialPrecioScraped.observado_en).all()
+
+    if not observaciones:
+        return {"producto_id": producto_id, "total_observaciones": 0, "puntos": []}
+
+    # SQLite devuelve fechas sin zona; se comparan todas como UTC
+    def a_utc(fecha: datetime) -> datetime:
+        return fecha if fecha.tzinfo else fecha.replace(tzinfo=timezone.utc)
+
+    observaciones = [(o.precio, a_utc(o.observado_en)) for o in observaciones]
+    inicio = a_utc(desde) if desde else observaciones[0][1]
+    fin = a_utc(hasta) if hasta else datetime.now(timezone.utc)
+
+    return {
+        "producto_id": producto_id,
+        "total_observaciones": len(observaciones),
+        "puntos": scraper_service.reducir_serie(observaciones, inicio, fin, puntos),
+    }
+
+
 @app.delete("/api/scraping/productos/{producto_id}")
 def eliminar_producto_scraped(
     producto_id: int,
@@ -1561,6 +2270,93 @@ def obtener_estadisticas_scraping(db: Session = Depends(get_db)):
     }
 
 
+# ==================== EMPAREJAMIENTO CON EL CATÁLOGO ====================
+
+
+@app.post("/api/emparejamiento/ejecutar")
+def ejecutar_emparejamiento(completo: bool = False, db: Session = Depends(get_db)):
+    """
+    Enlaza productos scrapeados y cotizaciones de WhatsApp con el catálogo
+    - Solo evalúa filas nuevas sin producto_id (el avance se guarda en la BD);
+      completo=true revisa también las que no tuvieron coincidencia en pasadas
+      anteriores
+    - Los barridos y las cotizaciones nuevas ya lanzan una pasada incremental
+    - Los casos dudosos quedan en GET /api/emparejamiento/revision
+    """
+    return emparejador.emparejar(db, completo=completo)
+
+
+@app.get(
+    "/api/emparejamiento/revision", response_model=List[EmparejamientoRevisionResponse]
+)
+def listar_revision_emparejamiento(
+    estado: str = "pendiente",
+    origen: Optional[str] = None,
+    skip: int = 0,
+    limit: int = Query(100, le=500),
+    db: Session = Depends(get_db),
+):
+    """
+    Cola de revisión de coincidencias dudosas (origen: scraping | whatsapp)
+    """
+    query = db.query(EmparejamientoRevision).filter(
+        EmparejamientoRevision.estado == estado
+    )
+    if origen:
+        query = query.filter(EmparejamientoRevision.origen == origen)
+    return (
+        query.order_by(EmparejamientoRevision.similitud.desc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+
+
+def obtener_revision_o_404(db: Session, revision_id: int) -> EmparejamientoRevision:
+    revision = (
+        db.query(EmparejamientoRevision)
+        .filter(EmparejamientoRevision.id == revision_id)
+        .first()
+    )
+    if not revision:
+        raise HTTPException(status_code=404, detail="Caso de revisión no encontrado")
+    if revision.estado != "pendiente":
+        raise HTTPException(status_code=400, detail="El caso ya fue resuelto")
+    return revision
+
+
+@app.post(
+    "/api/emparejamiento/revision/{revision_id}/aprobar",
+    response_model=EmparejamientoRevisionResponse,
+)
+def aprobar_emparejamiento(
+    revision_id: int,
+    request: EmparejamientoResolverRequest,
+    db: Session = Depends(get_db),
+):
+    """
+    Aprueba el candidato propuesto o, si se indica producto_id, enlaza con otro producto
+    """
+    revision = obtener_revision_o_404(db, revision_id)
+    if request.producto_id is not None and not db.query(Product).filter(
+        Product.id == request.producto_id
+    ).first():
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return emparejador.resolver(db, revision, aprobar=True, producto_id=request.producto_id)
+
+
+@app.post(
+    "/api/emparejamiento/revision/{revision_id}/rechazar",
+    response_model=EmparejamientoRevisionResponse,
+)
+def rechazar_emparejamiento(revision_id: int, db: Session = Depends(get_db)):
+    """
+    Rechaza el caso: la fila queda sin enlace y no se vuelve a proponer
+    """
+    revision = obtener_revision_o_404(db, revision_id)
+    return emparejador.resolver(db, revision, aprobar=False)
+
+
 # ============================================
 # BÚSQUEDA EN GOOGLE CON SELENIUM
 # ============================================
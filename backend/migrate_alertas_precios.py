@@ -0,0 +1,42 @@
+"""
+Script de migración para el motor de alertas de precio
+- Agrega la columna origen a price_alerts
+- Crea las tablas estadisticas_precios y umbrales_alerta
+"""
+
+from database import engine
+from models import Base
+from sqlalchemy import inspect, text
+
+
+def migrate():
+    print("🔄 Iniciando migración del motor de alertas...")
+
+    try:
+        inspector = inspect(engine)
+        tablas = inspector.get_table_names()
+
+        columnas = {c["name"] for c in inspector.get_columns("price_alerts")}
+        if "origen" in columnas:
+            print("⚠️  La columna 'origen' ya existe en price_alerts")
+        else:
+            print("📝 Agregando columna origen a price_alerts...")
+            with engine.begin() as conexion:
+                conexion.execute(text("ALTER TABLE price_alerts ADD COLUMN origen VARCHAR"))
+            print("✅ Columna agregada")
+
+        for tabla in ("estadisticas_precios", "umbrales_alerta"):
+            if tabla in tablas:
+                print(f"⚠️  La tabla '{tabla}' ya existe")
+            else:
+                print(f"📝 Creando tabla {tabla}...")
+                Base.metadata.tables[tabla].create(engine, checkfirst=True)
+                print("✅ Tabla creada")
+
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate()
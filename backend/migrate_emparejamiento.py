@@ -0,0 +1,69 @@
+"""
+Script de migración para el emparejamiento con el catálogo
+- Agrega producto_id (FK a products, indexado) a whatsapp_productos_cotizados
+- Crea la tabla emparejamientos_revision (cola de revisión)
+- Crea la tabla emparejamientos_avance (último id evaluado por origen)
+"""
+
+from database import engine
+from models import Base
+from sqlalchemy import inspect, text
+
+
+def migrate():
+    print("🔄 Iniciando migración de emparejamiento con el catálogo...")
+
+    try:
+        inspector = inspect(engine)
+        tablas = inspector.get_table_names()
+
+        if "whatsapp_productos_cotizados" in tablas:
+            columnas = {
+                c["name"] for c in inspector.get_columns("whatsapp_productos_cotizados")
+            }
+            if "producto_id" in columnas:
+                print("⚠️  La columna 'producto_id' ya existe en whatsapp_productos_cotizados")
+            else:
+                print("📝 Agregando columna producto_id...")
+                with engine.begin() as conexion:
+                    conexion.execute(
+                        text(
+                            """
+                            ALTER TABLE whatsapp_productos_cotizados
+                            ADD COLUMN producto_id INTEGER REFERENCES products(id)
+                            """
+                        )
+                    )
+                    conexion.execute(
+                        text(
+                            """
+                            CREATE INDEX ix_whatsapp_productos_cotizados_producto_id
+                            ON whatsapp_productos_cotizados (producto_id)
+                            """
+                        )
+                    )
+                print("✅ Columna e índice agregados")
+        else:
+            print("⚠️  La tabla 'whatsapp_productos_cotizados' no existe, ejecute migrate_whatsapp_cotizaciones.py")
+
+        if "emparejamientos_revision" in tablas:
+            print("⚠️  La tabla 'emparejamientos_revision' ya existe")
+        else:
+            print("📝 Creando tabla emparejamientos_revision...")
+            Base.metadata.tables["emparejamientos_revision"].create(engine, checkfirst=True)
+            print("✅ Tabla creada")
+
+        if "emparejamientos_avance" in tablas:
+            print("⚠️  La tabla 'emparejamientos_avance' ya existe")
+        else:
+            print("📝 Creando tabla emparejamientos_avance...")
+            Base.metadata.tables["emparejamientos_avance"].create(engine, checkfirst=True)
+            print("✅ Tabla creada")
+
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,56 @@
+"""
+Script de migración para crear la tabla historial_precios_scraped
+Siembra una observación inicial por producto scraped con su precio actual
+"""
+
+from database import engine, SessionLocal
+from models import Base
+from sqlalchemy import inspect, text
+
+
+def migrate():
+    print("🔄 Iniciando migración de tabla historial_precios_scraped...")
+
+    db = SessionLocal()
+
+    try:
+        inspector = inspect(engine)
+        if "historial_precios_scraped" in inspector.get_table_names():
+            print("⚠️  La tabla 'historial_precios_scraped' ya existe")
+        else:
+            print("📝 Creando tabla historial_precios_scraped...")
+            Base.metadata.tables["historial_precios_scraped"].create(
+                engine, checkfirst=True
+            )
+            print("✅ Tabla creada")
+
+        # Precio actual como primera observación de los productos sin historial
+        print("🌱 Sembrando observaciones iniciales...")
+        resultado = db.execute(
+            text(
+                """
+                INSERT INTO historial_precios_scraped
+                    (producto_scraped_id, precio, observado_en)
+                SELECT p.id, p.precio, p.fecha_scraping
+                FROM productos_scraped p
+                WHERE p.precio IS NOT NULL
+                  AND NOT EXISTS (
+                    SELECT 1 FROM historial_precios_scraped h
+                    WHERE h.producto_scraped_id = p.id
+                  )
+                """
+            )
+        )
+        db.commit()
+        print(f"✅ {resultado.rowcount} observaciones iniciales registradas")
+
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    migrate()
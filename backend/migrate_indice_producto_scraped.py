@@ -0,0 +1,39 @@
+"""
+Script de migración para indexar productos_scraped.producto_id
+La fuente local de precios sugeridos busca por este enlace
+"""
+
+from database import engine
+from sqlalchemy import inspect, text
+
+INDICE = "ix_productos_scraped_producto_id"
+
+
+def migrate():
+    print("🔄 Iniciando migración del índice de productos_scraped.producto_id...")
+
+    try:
+        inspector = inspect(engine)
+        if "productos_scraped" not in inspector.get_table_names():
+            print("⚠️  La tabla 'productos_scraped' no existe, ejecute migrate_productos_scraped.py")
+            return
+
+        indices = {i["name"] for i in inspector.get_indexes("productos_scraped")}
+        if INDICE in indices:
+            print(f"⚠️  El índice '{INDICE}' ya existe")
+            return
+
+        print(f"📝 Creando índice {INDICE}...")
+        with engine.begin() as conexion:
+            conexion.execute(
+                text(f"CREATE INDEX {INDICE} ON productos_scraped (producto_id)")
+            )
+        print("✅ Índice creado")
+
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate()
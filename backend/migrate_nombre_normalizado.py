@@ -0,0 +1,74 @@
+"""
+Script de migración para productos_scraped.nombre_normalizado
+- Agrega la columna y la completa con el nombre normalizado
+- Crea el índice (categoria, nombre_normalizado) que usa la fuente local de
+  precios para buscar por prefijo (text_pattern_ops en PostgreSQL)
+"""
+
+from database import engine
+from emparejamiento import normalizar_nombre
+from models import ProductoScraped
+from sqlalchemy import bindparam, inspect, select, text, update
+
+INDICE = "ix_productos_scraped_categoria_nombre_normalizado"
+LOTE = 1000
+
+
+def migrate():
+    print("🔄 Iniciando migración de productos_scraped.nombre_normalizado...")
+
+    try:
+        inspector = inspect(engine)
+        if "productos_scraped" not in inspector.get_table_names():
+            print("⚠️  La tabla 'productos_scraped' no existe, ejecute migrate_productos_scraped.py")
+            return
+
+        columnas = {c["name"] for c in inspector.get_columns("productos_scraped")}
+        if "nombre_normalizado" in columnas:
+            print("⚠️  La columna 'nombre_normalizado' ya existe")
+        else:
+            print("📝 Agregando columna nombre_normalizado...")
+            with engine.begin() as conexion:
+                conexion.execute(
+                    text("ALTER TABLE productos_scraped ADD COLUMN nombre_normalizado VARCHAR")
+                )
+            print("✅ Columna agregada")
+
+        tabla = ProductoScraped.__table__
+        print("📝 Completando nombres normalizados...")
+        completados = 0
+        with engine.begin() as conexion:
+            filas = conexion.execute(
+                select(tabla.c.id, tabla.c.nombre).where(tabla.c.nombre_normalizado.is_(None))
+            ).all()
+            actualizar = (
+                update(tabla)
+                .where(tabla.c.id == bindparam("fila_id"))
+                .values(nombre_normalizado=bindparam("normalizado"))
+            )
+            for inicio in range(0, len(filas), LOTE):
+                conexion.execute(
+                    actualizar,
+                    [
+                        {"fila_id": fila_id, "normalizado": normalizar_nombre(nombre)}
+                        for fila_id, nombre in filas[inicio : inicio + LOTE]
+                    ],
+                )
+                completados += len(filas[inicio : inicio + LOTE])
+        print(f"✅ {completados} filas completadas")
+
+        indices = {i["name"] for i in inspector.get_indexes("productos_scraped")}
+        if INDICE in indices:
+            print(f"⚠️  El índice '{INDICE}' ya existe")
+        else:
+            print(f"📝 Creando índice {INDICE}...")
+            next(i for i in tabla.indexes if i.name == INDICE).create(engine)
+            print("✅ Índice creado")
+
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate()
@@ -9,6 +9,8 @@ from sqlalchemy import (
     Boolean,
     JSON,
     BigInteger,
+    Index,
+    UniqueConstraint,
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
@@ -90,11 +92,42 @@ class PriceAlert(Base):
     old_price = Column(Float)
     new_price = Column(Float)
     variation_percent = Column(Float)  # Porcentaje de variación
+    origen = Column(String, nullable=True)  # sugerencia, scraping, whatsapp
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
     product = relationship("Product", back_populates="price_alerts")
 
 
+class EstadisticaPrecio(Base):
+    """Media y varianza móviles de los precios observados de un producto"""
+
+    __tablename__ = "estadisticas_precios"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    observaciones = Column(Integer, default=0)
+    media = Column(Float, nullable=True)
+    varianza = Column(Float, default=0.0)
+    ultimo_precio = Column(Float, nullable=True)
+    actualizado_en = Column(DateTime, nullable=True)
+    ultima_alerta_en = Column(DateTime, nullable=True)  # Para el cooldown
+
+
+class UmbralAlerta(Base):
+    """Umbral de alerta de un producto o de una categoría (el de producto tiene prioridad)"""
+
+    __tablename__ = "umbrales_alerta"
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=True, unique=True)
+    categoria = Column(String, nullable=True, unique=True)
+
+    # Campos nulos heredan el valor de la categoría o el de por defecto
+    variacion_porcentaje = Column(Float, nullable=True)
+    desviaciones = Column(Float, nullable=True)
+    cooldown_minutos = Column(Integer, nullable=True)
+    creado_en = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
 # ============================================
 # MODELOS PARA COTIZACIONES DE WHATSAPP
 # ============================================
@@ -140,6 +173,10 @@ class WhatsAppProductoCotizado(Base):
     fecha = Column(DateTime, index=True)
     timestamp = Column(BigInteger, index=True)
 
+    # Producto del catálogo al que corresponde (lo asigna el emparejador)
+    producto_id = Column(Integer, ForeignKey("products.id"), nullable=True, index=True)
+    producto = relationship("Product")
+
     # Información adicional extraída
     caracteristicas = Column(JSON)  # Array de características mencionadas
     material = Column(String, nullable=True)  # Material mencionado
@@ -157,9 +194,20 @@ class WhatsAppProductoCotizado(Base):
 
 class ProductoScraped(Base):
     __tablename__ = "productos_scraped"
+    __table_args__ = (
+        # Búsqueda por prefijo del nombre dentro de la categoría (fuente local de precios)
+        Index(
+            "ix_productos_scraped_categoria_nombre_normalizado",
+            "categoria",
+            "nombre_normalizado",
+            postgresql_ops={"nombre_normalizado": "text_pattern_ops"},
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     nombre = Column(String, index=True)
+    # Nombre en minúsculas, sin tildes ni signos (emparejamiento.normalizar_nombre)
+    nombre_normalizado = Column(String, nullable=True)
     precio = Column(Float, index=True)
     categoria = Column(String, index=True)
     link = Column(String, unique=True)  # URL única para evitar duplicados
@@ -170,5 +218,93 @@ class ProductoScraped(Base):
     )
 
     # Para comparación con productos existentes
-    producto_id = Column(Integer, ForeignKey("products.id"), nullable=True)
+    producto_id = Column(Integer, ForeignKey("products.id"), nullable=True, index=True)
     producto = relationship("Product")
+
+    historial = relationship(
+        "HistorialPrecioScraped",
+        back_populates="producto_scraped",
+        cascade="all, delete-orphan",
+        order_by="HistorialPrecioScraped.observado_en",
+    )
+
+
+class HistorialPrecioScraped(Base):
+    """Observaciones de precio de un producto scrapeado (solo cuando cambia)"""
+
+    __tablename__ = "historial_precios_scraped"
+    __table_args__ = (
+        Index(
+            "ix_historial_precios_producto_fecha",
+            "producto_scraped_id",
+            "observado_en",
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    producto_scraped_id = Column(
+        Integer, ForeignKey("productos_scraped.id", ondelete="CASCADE"), nullable=False
+    )
+    precio = Column(Float, nullable=False)
+    observado_en = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    producto_scraped = relationship("ProductoScraped", back_populates="historial")
+
+
+class ScrapingCheckpoint(Base):
+    """Avance de un barrido de precios para poder reanudarlo"""
+
+    __tablename__ = "scraping_checkpoints"
+
+    id = Column(Integer, primary_key=True, index=True)
+    categoria = Column(String, index=True)
+    categoria_url = Column(String, index=True)
+    modo = Column(String, default="lineal")
+    min_precio = Column(Integer)
+    max_precio = Column(Integer)
+    ultimo_precio = Column(Integer, nullable=True)  # Último precio ya guardado
+    links_vistos = Column(JSON, default=list)  # Links encontrados hasta ahora
+    productos_nuevos = Column(Integer, default=0)
+    productos_duplicados = Column(Integer, default=0)
+    productos_actualizados = Column(Integer, default=0)
+    iniciado_en = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    actualizado_en = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    finalizado_en = Column(DateTime, nullable=True)
+
+
+class EmparejamientoAvance(Base):
+    """Hasta qué fila de cada origen evaluó el emparejador y con qué catálogo"""
+
+    __tablename__ = "emparejamientos_avance"
+
+    origen = Column(String, primary_key=True)  # scraping, whatsapp
+    evaluados_hasta = Column(BigInteger, nullable=True)  # Último id evaluado
+    firma_catalogo = Column(String, nullable=True)  # Catálogo con el que se evaluó
+    actualizado_en = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class EmparejamientoRevision(Base):
+    """Coincidencias dudosas con el catálogo que esperan revisión manual"""
+
+    __tablename__ = "emparejamientos_revision"
+    __table_args__ = (
+        UniqueConstraint("origen", "registro_id", name="uq_emparejamiento_origen_registro"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    origen = Column(String, index=True)  # scraping, whatsapp
+    registro_id = Column(BigInteger)  # id en productos_scraped o whatsapp_productos_cotizados
+    nombre = Column(String)  # Nombre evaluado
+
+    # Mejor candidato y el siguiente, con su similitud coseno
+    producto_id = Column(Integer, ForeignKey("products.id"))
+    similitud = Column(Float)
+    alternativa_id = Column(Integer, ForeignKey("products.id"), nullable=True)
+    similitud_alternativa = Column(Float, nullable=True)
+
+    estado = Column(String, default="pendiente", index=True)  # pendiente, aprobado, rechazado
+    creado_en = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    resuelto_en = Column(DateTime, nullable=True)
+
+    producto = relationship("Product", foreign_keys=[producto_id])
+    alternativa = relationship("Product", foreign_keys=[alternativa_id])
@@ -0,0 +1,261 @@
+"""
+Parsers de páginas de listado WooCommerce
+Backends intercambiables: selectolax (si está instalado), lxml o BeautifulSoup.
+Todos devuelven la misma estructura para que el scraper no dependa del backend.
+"""
+
+import os
+import re
+from typing import Dict, List, Optional
+
+# auto | selectolax | lxml | bs4
+PARSER_HTML = os.getenv("SCRAPER_PARSER_HTML", "auto")
+
+_PATRON_NUMERO = re.compile(r"\d[\d.,]*")
+
+
+def convertir_precio(texto: Optional[str]) -> Optional[float]:
+    """
+    Convierte el texto del precio de una tarjeta a número.
+    Acepta "Bs 1,234.50", "Bs1.234,50" y "1.200"; None si no hay número.
+    """
+    if not texto:
+        return None
+    coincidencia = _PATRON_NUMERO.search(texto)
+    if not coincidencia:
+        return None
+    numero = coincidencia.group().rstrip(".,")
+
+    coma, punto = numero.rfind(","), numero.rfind(".")
+    if coma >= 0 and punto >= 0:
+        # El separador que aparece último es el decimal
+        decimal = "," if coma > punto else "."
+        miles = "." if decimal == "," else ","
+        numero = numero.replace(miles, "").replace(decimal, ".")
+    elif coma >= 0 or punto >= 0:
+        separador = "," if coma >= 0 else "."
+        partes = numero.split(separador)
+        if len(partes) == 2 and len(partes[1]) != 3:
+            numero = numero.replace(separador, ".")
+        else:
+            numero = numero.replace(separador, "")
+    try:
+        return float(numero)
+    except ValueError:
+        return None
+
+
+def _tarjeta(nombre, link, imagen, precio_texto) -> Dict:
+    return {
+        "nombre": nombre or "Sin nombre",
+        "link": link,
+        "imagen": imagen,
+        "precio": convertir_precio(precio_texto),
+    }
+
+
+class ParserBS4:
+    """BeautifulSoup con html.parser: sin dependencias nativas, el más lento"""
+
+    nombre = "bs4"
+
+    def __init__(self):
+        from bs4 import BeautifulSoup
+
+        self._soup = BeautifulSoup
+
+    def parsear_listado(self, html: str) -> Dict:
+        soup = self._soup(html, "html.parser")
+        productos = soup.find_all("li", class_="product") or soup.find_all(
+            "div", class_="product"
+        )
+
+        tarjetas = []
+        for prod in productos:
+            titulo = prod.find("p", class_="woocommerce-loop-product__title")
+            if titulo:
+                titulo = titulo.find("a") or titulo
+            else:
+                titulo = prod.find("h2") or prod.find("h3")
+
+            link_tag = prod.find("a", href=True)
+            img = prod.find("img")
+            precio = prod.find(class_="price")
+            if precio:
+                precio = precio.find("ins") or precio
+
+            tarjetas.append(
+                _tarjeta(
+                    titulo.get_text().strip() if titulo else None,
+                    link_tag["href"] if link_tag else None,
+                    (img.get("src") or img.get("data-src")) if img else None,
+                    precio.get_text() if precio else None,
+                )
+            )
+
+        contador = soup.find(class_="woocommerce-result-count")
+        return {
+            "tarjetas": tarjetas,
+            "contador": contador.get_text().strip() if contador else None,
+            "paginacion": soup.find("nav", class_="woocommerce-pagination") is not None,
+        }
+
+
+def _clase(nombre: str) -> str:
+    """Condición XPath equivalente al selector CSS .nombre"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {nombre} ')"
+
+
+class ParserLxml:
+    """lxml.html con consultas XPath precompiladas"""
+
+    nombre = "lxml"
+
+    def __init__(self):
+        from lxml import etree, html
+
+        self._html = html
+        self._li = etree.XPath(f"//li[{_clase('product')}]")
+        self._div = etree.XPath(f"//div[{_clase('product')}]")
+        self._titulo = etree.XPath(
+            f"(.//p[{_clase('woocommerce-loop-product__title')}])[1]"
+        )
+        self._encabezado = etree.XPath("(.//h2 | .//h3)[1]")
+        self._link = etree.XPath("(.//a[@href])[1]/@href")
+        self._img = etree.XPath("(.//img)[1]")
+        self._precio = etree.XPath(f"(.//*[{_clase('price')}])[1]")
+        self._contador = etree.XPath(f"(//*[{_clase('woocommerce-result-count')}])[1]")
+        self._paginacion = etree.XPath(
+            f"boolean(//nav[{_clase('woocommerce-pagination')}])"
+        )
+
+    def parsear_listado(self, html: str) -> Dict:
+        if isinstance(html, str) and html.lstrip().startswith("<?xml"):
+            html = html.encode("utf-8")
+        arbol = self._html.fromstring(html)
+
+        tarjetas = []
+        for prod in self._li(arbol) or self._div(arbol):
+            titulo = self._titulo(prod)
+            if titulo:
+                enlace = titulo[0].find(".//a")
+                titulo = enlace if enlace is not None else titulo[0]
+            else:
+                titulo = self._encabezado(prod)
+                titulo = titulo[0] if titulo else None
+
+            link = self._link(prod)
+            img = self._img(prod)
+            precio = self._precio(prod)
+            precio = precio[0] if precio else None
+            if precio is not None:
+                ins = precio.find(".//ins")
+                precio = ins if ins is not None else precio
+
+            tarjetas.append(
+                _tarjeta(
+                    titulo.text_content().strip() if titulo is not None else None,
+                    str(link[0]) if link else None,
+                    (img[0].get("src") or img[0].get("data-src")) if img else None,
+                    precio.text_content() if precio is not None else None,
+                )
+            )
+
+        contador = self._contador(arbol)
+        return {
+            "tarjetas": tarjetas,
+            "contador": contador[0].text_content().strip() if contador else None,
+            "paginacion": bool(self._paginacion(arbol)),
+        }
+
+
+class ParserSelectolax:
+    """selectolax (motor lexbor): el más rápido si está instalado"""
+
+    nombre = "selectolax"
+
+    def __init__(self):
+        try:
+            from selectolax.lexbor import LexborHTMLParser as HTMLParser
+        except ImportError:
+            # Versiones anteriores a lexbor
+            from selectolax.parser import HTMLParser
+
+        self._parser = HTMLParser
+
+    def parsear_listado(self, html: str) -> Dict:
+        arbol = self._parser(html)
+
+        tarjetas = []
+        for prod in arbol.css("li.product") or arbol.css("div.product"):
+            titulo = prod.css_first("p.woocommerce-loop-product__title")
+            if titulo is not None:
+                enlace = titulo.css_first("a")
+                titulo = enlace if enlace is not None else titulo
+            else:
+                titulo = prod.css_first("h2")
+                if titulo is None:
+                    titulo = prod.css_first("h3")
+
+            link_tag = prod.css_first("a[href]")
+            img = prod.css_first("img")
+            precio = prod.css_first(".price")
+            if precio is not None:
+                ins = precio.css_first("ins")
+                precio = ins if ins is not None else precio
+
+            tarjetas.append(
+                _tarjeta(
+                    titulo.text().strip() if titulo is not None else None,
+                    link_tag.attributes.get("href") if link_tag is not None else None,
+                    (
+                        (img.attributes.get("src") or img.attributes.get("data-src"))
+                        if img is not None
+                        else None
+                    ),
+                    precio.text() if precio is not None else None,
+                )
+            )
+
+        contador = arbol.css_first(".woocommerce-result-count")
+        return {
+            "tarjetas": tarjetas,
+            "contador": contador.text().strip() if contador is not None else None,
+            "paginacion": arbol.css_first("nav.woocommerce-pagination") is not None,
+        }
+
+
+BACKENDS = {
+    "selectolax": ParserSelectolax,
+    "lxml": ParserLxml,
+    "bs4": ParserBS4,
+}
+
+
+def backends_disponibles() -> List[str]:
+    """Backends cuyas dependencias están instaladas, del más rápido al más lento"""
+    disponibles = []
+    for nombre, clase in BACKENDS.items():
+        try:
+            clase()
+        except ImportError:
+            continue
+        disponibles.append(nombre)
+    return disponibles
+
+
+def crear_parser(nombre: str = PARSER_HTML):
+    """Crea el parser pedido; con "auto" usa el más rápido disponible"""
+    if nombre != "auto":
+        if nombre not in BACKENDS:
+            raise ValueError(
+                f"Parser HTML desconocido: {nombre}. Opciones: auto, {', '.join(BACKENDS)}"
+            )
+        return BACKENDS[nombre]()
+
+    for clase in BACKENDS.values():
+        try:
+            return clase()
+        except ImportError:
+            continue
+    raise ImportError("No hay ningún parser HTML instalado (bs4, lxml o selectolax)")
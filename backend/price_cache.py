@@ -0,0 +1,146 @@
+"""
+Caché de precios de mercado para /api/prices/suggest
+Clave: (nombre, categoría) normalizados. Dentro del TTL se sirve tal cual;
+entre el TTL y PRICE_CACHE_STALE se sirve la copia vieja y se refresca en
+segundo plano (stale-while-revalidate); más allá se consulta de nuevo.
+"""
+
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+PRICE_CACHE_TTL = float(os.getenv("PRICE_CACHE_TTL", "600"))
+PRICE_CACHE_STALE = float(os.getenv("PRICE_CACHE_STALE", "3600"))
+PRICE_CACHE_MAX_ENTRIES = int(os.getenv("PRICE_CACHE_MAX_ENTRIES", "1000"))
+
+
+def normalize_key(product_name: str, category: Optional[str]) -> Tuple[str, str]:
+    """Minúsculas, sin tildes y con espacios colapsados"""
+
+    def normalizar(texto):
+        texto = unicodedata.normalize("NFKD", texto or "")
+        texto = "".join(c for c in texto if not unicodedata.combining(c))
+        return re.sub(r"\s+", " ", texto).strip().lower()
+
+    return normalizar(product_name), normalizar(category)
+
+
+class CacheEntry:
+    def __init__(self, result: Dict):
+        self.result = result
+        self.fetched_at = time.monotonic()
+        # Comparaciones ya guardadas con estos datos, por producto:
+        # {product_id: (precio de catálogo comparado, comparison_id)}
+        self.comparisons: Dict[int, Tuple[Optional[float], int]] = {}
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+class MarketPriceCache:
+    """Caché LRU en memoria con refresco en segundo plano de una sola vuelta por clave"""
+
+    def __init__(
+        self,
+        ttl: float = PRICE_CACHE_TTL,
+        stale: float = PRICE_CACHE_STALE,
+        max_entries: int = PRICE_CACHE_MAX_ENTRIES,
+    ):
+        self.ttl = ttl
+        self.stale = max(stale, ttl)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._refreshing = set()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="precios-cache")
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0}
+
+    def _store(self, key, result: Dict) -> CacheEntry:
+        entry = CacheEntry(result)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                expulsada, _ = self._entries.popitem(last=False)
+                self._key_locks.pop(expulsada, None)
+        return entry
+
+    def _refresh(self, key, fetch: Callable[[], Dict]):
+        try:
+            result = fetch()
+            if result.get("sources"):
+                self._store(key, result)
+            with self._lock:
+                self.stats["refreshes"] += 1
+        except Exception as e:
+            print(f"⚠️ Error refrescando precios de mercado {key}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(
+        self,
+        product_name: str,
+        category: Optional[str],
+        fetch: Callable[[], Dict],
+        force_refresh: bool = False,
+    ) -> Tuple[CacheEntry, Dict]:
+        """
+        Devuelve (entrada, metadatos) con metadatos cache_hit,
+        cache_age_seconds y cache_stale. `fetch()` debe devolver el dict de
+        PriceScraper.fetch_market_prices; los resultados sin fuentes no se guardan.
+        """
+        key = normalize_key(product_name, category)
+        with self._lock:
+            entry = None if force_refresh else self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry.age > self.stale:
+                    entry = None
+
+            if entry is not None:
+                stale = entry.age > self.ttl
+                self.stats["stale_hits" if stale else "hits"] += 1
+                if stale and key not in self._refreshing:
+                    self._refreshing.add(key)
+                    self._executor.submit(self._refresh, key, fetch)
+                return entry, {
+                    "cache_hit": True,
+                    "cache_age_seconds": round(entry.age, 1),
+                    "cache_stale": stale,
+                }
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Una sola consulta a la vez por clave; las demás esperan su resultado
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None and not force_refresh and entry.age <= self.ttl:
+                with self._lock:
+                    self.stats["hits"] += 1
+                return entry, {
+                    "cache_hit": True,
+                    "cache_age_seconds": round(entry.age, 1),
+                    "cache_stale": False,
+                }
+
+            with self._lock:
+                self.stats["misses"] += 1
+            result = fetch()
+            entry = self._store(key, result) if result.get("sources") else CacheEntry(result)
+            return entry, {"cache_hit": False, "cache_age_seconds": 0.0, "cache_stale": False}
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "refreshing": len(self._refreshing)}
+
+
+# Instancia global de la caché
+market_price_cache = MarketPriceCache()
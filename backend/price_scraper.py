@@ -1,9 +1,11 @@
-import requests
 from bs4 import BeautifulSoup
 from typing import List, Dict
-import time
 import random
 
+from cache_http import cache_http
+from http_client import cliente_http
+from price_sources import build_registry
+
 class PriceScraper:
     """
     Clase para realizar web scraping de precios de productos
@@ -16,59 +18,23 @@ class PriceScraper:
             "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36",
             "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36"
         ]
+        # Fuentes de mercado: simuladas salvo las configuradas como reales en el .env
+        self.sources = build_registry(self._estimate_base_price)
     
     def scrape_prices(self, product_name: str, category: str = None) -> List[Dict]:
         """
         Realizar scraping de precios para un producto
-        En producción, esto se conectaría a APIs reales o realizaría scraping real
-        Por ahora, simula resultados basados en el nombre del producto
+        Consulta todas las fuentes registradas en paralelo (ver price_sources);
+        las fuentes que no responden a tiempo se omiten
         """
-        # Simular delay de red
-        time.sleep(0.5)
-        
-        # En un entorno real, aquí se haría scraping real de:
-        # - Páginas de competidores
-        # - Marketplaces (MercadoLibre, Amazon, etc.)
-        # - APIs de precios
-        # - Catálogos abiertos
-        
-        # Por ahora, generamos datos simulados realistas
-        base_price = self._estimate_base_price(product_name, category)
-        
-        sources = [
-            {
-                "source": "Agimex",
-                "price": round(base_price * random.uniform(0.85, 1.15), 2),
-                "url": f"https://agimex.com/productos/{product_name.replace(' ', '-')}"
-            },
-            {
-                "source": "Corimexo",
-                "price": round(base_price * random.uniform(0.90, 1.20), 2),
-                "url": f"https://corimexo.com/buscar?q={product_name}"
-            },
-            {
-                "source": "Blau",
-                "price": round(base_price * random.uniform(0.88, 1.12), 2),
-                "url": f"https://blau.com/productos/{product_name}"
-            },
-            {
-                "source": "Living Room",
-                "price": round(base_price * random.uniform(0.92, 1.18), 2),
-                "url": f"https://livingroom.com/item/{product_name}"
-            },
-            {
-                "source": "Tua Casa",
-                "price": round(base_price * random.uniform(0.85, 1.10), 2),
-                "url": f"https://tuacasa.com/catalogo/{product_name}"
-            },
-            {
-                "source": "La cuisine",
-                "price": round(base_price * random.uniform(0.90, 1.15), 2),
-                "url": f"https://lacuisine.com/productos/{product_name.replace(' ', '-')}"
-            }
-        ]
-        
-        return sources
+        return self.fetch_market_prices(product_name, category)["sources"]
+
+    def fetch_market_prices(self, product_name: str, category: str = None) -> Dict:
+        """
+        Igual que scrape_prices pero reporta también las fuentes que fallaron:
+        {"sources": [...], "failed_sources": [{"source", "reason"}]}
+        """
+        return self.sources.fetch_all(product_name, category)
     
     def _estimate_base_price(self, product_name: str, category: str = None) -> float:
         """
@@ -105,7 +71,8 @@ class PriceScraper:
                 "Accept-Language": "es-ES,es;q=0.9",
             }
             
-            response = requests.get(url, headers=headers, timeout=10)
+            # Cliente compartido (reintentos y circuito) detrás de la caché en disco
+            response, _ = cache_http.obtener(cliente_http, url, timeout=10, headers=headers)
             response.raise_for_status()
             
             soup = BeautifulSoup(response.content, 'html.parser')
@@ -0,0 +1,222 @@
+"""
+Fuentes de precios de mercado para PriceScraper
+Cada fuente es un adaptador con su propio extractor; el registro las consulta
+en paralelo con un timeout por fuente y devuelve lo que haya llegado a tiempo.
+
+Configuración (.env):
+- PRICE_SOURCES_WOOCOMMERCE: fuentes reales con búsqueda WooCommerce,
+  "Nombre=https://tienda,Nombre2=https://otra". El resto queda simulado.
+- PRICE_SOURCE_TIMEOUT: segundos máximos por fuente.
+- PRICE_SOURCES_SIMULATED_DELAY: latencia simulada de las fuentes simuladas.
+"""
+
+import os
+import random
+from abc import ABC, abstractmethod
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from typing import Dict, List, Optional
+from urllib.parse import quote_plus
+
+from http_client import cliente_http
+from parser_html import convertir_precio, crear_parser
+
+PRICE_SOURCE_TIMEOUT = float(os.getenv("PRICE_SOURCE_TIMEOUT", "3"))
+PRICE_SOURCES_SIMULATED_DELAY = float(os.getenv("PRICE_SOURCES_SIMULATED_DELAY", "0.5"))
+
+# Precio de la página de un solo producto (WooCommerce redirige si hay un único resultado)
+_PATRON_PRECIO_META = re.compile(
+    r'<meta[^>]+(?:property="product:price:amount"|itemprop="price")[^>]+content="([^"]+)"'
+)
+_PATRON_PRECIO_JSONLD = re.compile(r'"price"\s*:\s*"?([\d.,]+)')
+
+
+def _palabras(texto: str) -> set:
+    return set(re.findall(r"\w+", texto.lower()))
+
+
+class PriceSource(ABC):
+    """Adaptador base: devuelve {"source", "price", "url"} o None si no encontró precio"""
+
+    def __init__(self, name: str, timeout: float = PRICE_SOURCE_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+
+    @abstractmethod
+    def fetch(self, product_name: str, category: Optional[str] = None) -> Optional[Dict]:
+        """Cada adaptador implementa su consulta (se valida al instanciarlo)"""
+
+
+class SimulatedSource(PriceSource):
+    """Fuente simulada: precio base estimado con una variación aleatoria"""
+
+    def __init__(
+        self,
+        name: str,
+        url_template: str,
+        low: float,
+        high: float,
+        estimate_base_price,
+        delay: float = PRICE_SOURCES_SIMULATED_DELAY,
+    ):
+        super().__init__(name)
+        self.url_template = url_template
+        self.low = low
+        self.high = high
+        self.estimate_base_price = estimate_base_price
+        self.delay = delay
+
+    def fetch(self, product_name: str, category: Optional[str] = None) -> Optional[Dict]:
+        # Simular delay de red
+        time.sleep(self.delay)
+        base_price = self.estimate_base_price(product_name, category)
+        return {
+            "source": self.name,
+            "price": round(base_price * random.uniform(self.low, self.high), 2),
+            "url": self.url_template.format(
+                slug=product_name.replace(" ", "-"), q=product_name
+            ),
+        }
+
+
+class WooCommerceSource(PriceSource):
+    """
+    Búsqueda real en una tienda WooCommerce (?s=...&post_type=product).
+    Toma la tarjeta con precio cuyo nombre comparte más palabras con el
+    producto buscado; si la tienda redirige a un único producto, lee su precio.
+    """
+
+    def __init__(self, name: str, base_url: str, timeout: float = PRICE_SOURCE_TIMEOUT):
+        super().__init__(name, timeout)
+        self.base_url = base_url.rstrip("/")
+        self.parser = crear_parser()
+
+    def search_url(self, product_name: str) -> str:
+        return f"{self.base_url}/?s={quote_plus(product_name)}&post_type=product"
+
+    def fetch(self, product_name: str, category: Optional[str] = None) -> Optional[Dict]:
+        # Reintentos y backoff dentro del timeout de la fuente: al vencer, el
+        # registro deja de esperarla y el hilo del pool debe quedar libre
+        response = cliente_http.get(
+            self.search_url(product_name), timeout=self.timeout, plazo=self.timeout
+        )
+        response.raise_for_status()
+
+        pagina = self.parser.parsear_listado(response.text)
+        buscadas = _palabras(product_name)
+        candidatas = [t for t in pagina["tarjetas"] if t["precio"] and t["link"]]
+        if candidatas:
+            mejor = max(candidatas, key=lambda t: len(buscadas & _palabras(t["nombre"])))
+            return {"source": self.name, "price": mejor["precio"], "url": mejor["link"]}
+
+        if not pagina["tarjetas"]:
+            coincidencia = _PATRON_PRECIO_META.search(
+                response.text
+            ) or _PATRON_PRECIO_JSONLD.search(response.text)
+            precio = convertir_precio(coincidencia.group(1)) if coincidencia else None
+            if precio:
+                return {"source": self.name, "price": precio, "url": response.url}
+        return None
+
+
+class PriceSourceRegistry:
+    """Registro de fuentes consultadas en paralelo con timeout por fuente"""
+
+    def __init__(self, max_workers: int = 16):
+        self.sources: Dict[str, PriceSource] = {}
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="fuentes-precio"
+        )
+
+    def register(self, source: PriceSource):
+        """Registra (o reemplaza por nombre) una fuente"""
+        self.sources[source.name] = source
+
+    def fetch_all(self, product_name: str, category: Optional[str] = None) -> Dict:
+        """
+        Consulta todas las fuentes a la vez. La latencia total queda acotada
+        por el timeout de la fuente más lenta; las que no responden a tiempo o
+        fallan se reportan en "failed_sources" junto con el motivo.
+        """
+        inicio = time.monotonic()
+        futuros = [
+            (source, self.executor.submit(source.fetch, product_name, category))
+            for source in self.sources.values()
+        ]
+
+        prices: List[Dict] = []
+        failed: List[Dict] = []
+        for source, futuro in sorted(futuros, key=lambda f: f[0].timeout):
+            restante = max(0.0, inicio + source.timeout - time.monotonic())
+            try:
+                resultado = futuro.result(timeout=restante)
+            except FuturesTimeoutError:
+                futuro.cancel()
+                failed.append({"source": source.name, "reason": "timeout"})
+                continue
+            except Exception as e:
+                failed.append({"source": source.name, "reason": str(e) or type(e).__name__})
+                continue
+            if resultado is None:
+                failed.append({"source": source.name, "reason": "sin precio"})
+            else:
+                prices.append(resultado)
+
+        # Mantener el orden de registro en la respuesta
+        orden = list(self.sources)
+        prices.sort(key=lambda p: orden.index(p["source"]))
+        return {"sources": prices, "failed_sources": failed}
+
+
+# Tiendas WooCommerce reales que se pueden activar por .env
+TIENDAS_WOOCOMMERCE = {
+    "Living Room": "https://www.livingroom.com.bo",
+}
+
+
+def _woocommerce_desde_env() -> Dict[str, str]:
+    """
+    Lee PRICE_SOURCES_WOOCOMMERCE ("Nombre=url,Nombre2=url2"). Un nombre sin
+    url usa la de TIENDAS_WOOCOMMERCE (p. ej. "Living Room").
+    """
+    configuradas = {}
+    for par in os.getenv("PRICE_SOURCES_WOOCOMMERCE", "").split(","):
+        nombre, _, url = par.partition("=")
+        nombre, url = nombre.strip(), url.strip() or TIENDAS_WOOCOMMERCE.get(nombre.strip())
+        if nombre and url:
+            configuradas[nombre] = url
+    return configuradas
+
+
+# Fuentes conocidas: (nombre, url de ejemplo, variación mínima, variación máxima)
+FUENTES_SIMULADAS = [
+    ("Agimex", "https://agimex.com/productos/{slug}", 0.85, 1.15),
+    ("Corimexo", "https://corimexo.com/buscar?q={q}", 0.90, 1.20),
+    ("Blau", "https://blau.com/productos/{q}", 0.88, 1.12),
+    ("Living Room", "https://livingroom.com/item/{q}", 0.92, 1.18),
+    ("Tua Casa", "https://tuacasa.com/catalogo/{q}", 0.85, 1.10),
+    ("La cuisine", "https://lacuisine.com/productos/{slug}", 0.90, 1.15),
+]
+
+
+def build_registry(estimate_base_price) -> PriceSourceRegistry:
+    """
+    Registro por defecto: las seis fuentes simuladas, reemplazando por el
+    adaptador WooCommerce real las que estén configuradas en el .env
+    """
+    registry = PriceSourceRegistry()
+    reales = _woocommerce_desde_env()
+    for nombre, url_template, low, high in FUENTES_SIMULADAS:
+        if nombre in reales:
+            registry.register(WooCommerceSource(nombre, reales[nombre]))
+        else:
+            registry.register(
+                SimulatedSource(nombre, url_template, low, high, estimate_base_price)
+            )
+    # Tiendas configuradas que no están entre las simuladas
+    for nombre, url in reales.items():
+        if nombre not in registry.sources:
+            registry.register(WooCommerceSource(nombre, url))
+    return registry
@@ -0,0 +1,201 @@
+"""
+Armado de prompts de conversación con presupuesto de tokens
+En lugar de mandar todo el historial en cada llamada, se mandan los turnos
+más recientes que entran en PROMPT_PRESUPUESTO_HISTORIAL tokens (y a lo sumo
+PROMPT_MAX_TURNOS); los anteriores se reemplazan por un resumen acumulado que
+se actualiza de a tandas (cuando los turnos sin resumir superan
+PROMPT_RESUMEN_MINIMO tokens o la mitad de PROMPT_MAX_TURNOS) y se guarda
+junto al historial (ver conversaciones.py).
+
+Los límites del prompt deben quedar por debajo de los del historial guardado
+(CONVERSACION_MAX_MENSAJES/TOKENS) para que ningún turno se borre antes de
+entrar al resumen.
+
+Los tokens se cuentan con tiktoken si está instalado; si no, se estiman
+como 1 token cada 4 caracteres.
+
+Configuración (.env):
+- PROMPT_PRESUPUESTO_HISTORIAL: tokens de turnos recientes por prompt
+- PROMPT_MAX_TURNOS: turnos recientes por prompt
+- PROMPT_RESUMEN_MINIMO: tokens fuera de la ventana antes de actualizar el resumen
+- PROMPT_TOKENS_RESUMEN: tokens máximos del resumen
+"""
+
+import logging
+import os
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODEL = os.getenv("AI_MODEL", "gpt-3.5-turbo")
+PROMPT_PRESUPUESTO_HISTORIAL = int(os.getenv("PROMPT_PRESUPUESTO_HISTORIAL", "600"))
+PROMPT_MAX_TURNOS = int(os.getenv("PROMPT_MAX_TURNOS", "10"))
+PROMPT_RESUMEN_MINIMO = int(os.getenv("PROMPT_RESUMEN_MINIMO", "150"))
+PROMPT_TOKENS_RESUMEN = int(os.getenv("PROMPT_TOKENS_RESUMEN", "120"))
+
+# Tokens de formato que OpenAI agrega por mensaje (rol y separadores)
+TOKENS_POR_MENSAJE = 4
+
+PROMPT_RESUMEN = """Resume la conversación entre un comprador de muebles de oficina (assistant) y un proveedor (user).
+Conserva solo lo útil para seguir negociando: productos, precios, cantidades, disponibilidad, entrega y acuerdos.
+Máximo 3 líneas, sin saludos ni cortesías."""
+
+try:
+    import tiktoken
+
+    try:
+        _codificador = tiktoken.encoding_for_model(MODEL)
+    except KeyError:
+        _codificador = tiktoken.get_encoding("cl100k_base")
+    CONTADOR_TOKENS = "tiktoken"
+except ImportError:
+    _codificador = None
+    CONTADOR_TOKENS = "estimado"
+
+
+@lru_cache(maxsize=4096)
+def contar_tokens(texto: str) -> int:
+    """Tokens del texto (los mensajes del historial se repiten, por eso la caché)"""
+    if not texto:
+        return 0
+    if _codificador is not None:
+        return len(_codificador.encode(texto))
+    return len(texto) // 4 + 1
+
+
+def tokens_mensajes(mensajes: List[Dict]) -> int:
+    """Tokens de un prompt en formato de mensajes de OpenAI"""
+    return sum(contar_tokens(m["content"]) + TOKENS_POR_MENSAJE for m in mensajes) + 2
+
+
+def _a_mensaje(turno: Dict) -> Dict:
+    return {
+        "role": "assistant" if turno["tipo"] == "bot" else "user",
+        "content": turno["mensaje"],
+    }
+
+
+class ConstructorPrompt:
+    """Ventana de turnos recientes + resumen acumulado de los anteriores"""
+
+    def __init__(
+        self,
+        presupuesto: int = PROMPT_PRESUPUESTO_HISTORIAL,
+        max_turnos: int = PROMPT_MAX_TURNOS,
+        resumen_minimo: int = PROMPT_RESUMEN_MINIMO,
+    ):
+        self.presupuesto = presupuesto
+        self.max_turnos = max(1, max_turnos)
+        self.resumen_minimo = resumen_minimo
+        self._lock = threading.Lock()
+        self.metricas = {
+            "prompts": 0,
+            "tokens_prompt": 0,
+            "tokens_historial_completo": 0,
+            "resumenes": 0,
+            "contador": CONTADOR_TOKENS,
+        }
+
+    def dividir(
+        self, historial: List[Dict], resumido_hasta: Optional[int]
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """
+        (turnos por resumir, turnos recientes)
+        Los recientes son los que entran en el presupuesto (y en max_turnos)
+        contando desde el último. Los anteriores no cubiertos por el resumen
+        solo se devuelven para resumir si suman resumen_minimo tokens o la
+        mitad de max_turnos; si no, siguen en el prompt hasta la próxima tanda.
+        """
+        resumido_hasta = resumido_hasta or 0
+        pendientes = [t for t in historial if t.get("id", 0) > resumido_hasta]
+
+        inicio, tokens = len(pendientes), 0
+        while inicio > 0:
+            tokens += contar_tokens(pendientes[inicio - 1]["mensaje"]) + TOKENS_POR_MENSAJE
+            recientes = len(pendientes) - inicio
+            if recientes and (tokens > self.presupuesto or recientes >= self.max_turnos):
+                break
+            inicio -= 1
+
+        fuera = pendientes[:inicio]
+        tokens_fuera = sum(contar_tokens(t["mensaje"]) + TOKENS_POR_MENSAJE for t in fuera)
+        if tokens_fuera < self.resumen_minimo and len(fuera) < self.max_turnos // 2:
+            return [], pendientes
+        return fuera, pendientes[inicio:]
+
+    @staticmethod
+    def mensajes_resumen(resumen: Optional[str], turnos: List[Dict]) -> List[Dict]:
+        """Prompt para incorporar turnos nuevos al resumen anterior"""
+        conversacion = "\n".join(
+            f"{'Comprador' if t['tipo'] == 'bot' else 'Proveedor'}: {t['mensaje']}"
+            for t in turnos
+        )
+        contenido = f"Resumen anterior:\n{resumen}\n\n" if resumen else ""
+        contenido += f"Mensajes nuevos:\n{conversacion}"
+        return [
+            {"role": "system", "content": PROMPT_RESUMEN},
+            {"role": "user", "content": contenido},
+        ]
+
+    def contar_resumen(self):
+        with self._lock:
+            self.metricas["resumenes"] += 1
+
+    def construir(
+        self,
+        prompt_sistema: str,
+        resumen: Optional[str],
+        recientes: List[Dict],
+        mensaje: str,
+        historial_completo: Optional[List[Dict]] = None,
+        adicionales: Optional[List[Dict]] = None,
+    ) -> List[Dict]:
+        """
+        Sistema + resumen + turnos recientes + mensaje actual (+ instrucciones
+        adicionales al final); registra los tokens del prompt
+        """
+        mensajes = [{"role": "system", "content": prompt_sistema}]
+        if resumen:
+            mensajes.append(
+                {"role": "system", "content": f"Resumen de la conversación anterior:\n{resumen}"}
+            )
+        mensajes.extend(_a_mensaje(t) for t in recientes)
+        mensajes.append({"role": "user", "content": mensaje})
+        mensajes.extend(adicionales or [])
+
+        tokens = tokens_mensajes(mensajes)
+        completo = tokens
+        if historial_completo is not None:
+            completo = tokens_mensajes(
+                [
+                    mensajes[0],
+                    *(_a_mensaje(t) for t in historial_completo),
+                    {"role": "user", "content": mensaje},
+                    *(adicionales or []),
+                ]
+            )
+        with self._lock:
+            self.metricas["prompts"] += 1
+            self.metricas["tokens_prompt"] += tokens
+            self.metricas["tokens_historial_completo"] += completo
+        logger.info(
+            f"🧮 Prompt de {tokens} tokens ({len(recientes)} turnos"
+            f"{' + resumen' if resumen else ''}; con todo el historial serían {completo})"
+        )
+        return mensajes
+
+    def resumen(self) -> Dict:
+        with self._lock:
+            metricas = dict(self.metricas)
+        if metricas["prompts"]:
+            metricas["tokens_promedio"] = round(metricas["tokens_prompt"] / metricas["prompts"], 1)
+            metricas["ahorro_porcentaje"] = round(
+                100 * (1 - metricas["tokens_prompt"] / metricas["tokens_historial_completo"]), 1
+            )
+        return metricas
+
+
+# Instancia global del constructor de prompts
+constructor_prompt = ConstructorPrompt()
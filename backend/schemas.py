@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, ConfigDict
-from typing import Optional, List
+from typing import Optional, List, Union
 from datetime import datetime
 
 # ==================== USUARIOS ====================
@@ -96,6 +96,11 @@ class MarketSource(BaseModel):
     url: Optional[str] = None
 
 
+class FailedMarketSource(BaseModel):
+    source: str
+    reason: str  # timeout, sin precio o el error de la fuente
+
+
 class PriceSuggestion(BaseModel):
     suggested_price: float
     min_price: float
@@ -103,6 +108,35 @@ class PriceSuggestion(BaseModel):
     avg_price: float
     market_sources: List[MarketSource]
     comparison_id: int
+    failed_sources: List[FailedMarketSource] = []
+    cache_hit: bool = False
+    cache_age_seconds: Optional[float] = None
+    cache_stale: bool = False
+    price_origin: str = "market"  # market (fuentes externas) | local (productos_scraped)
+    local_match_count: Optional[int] = None
+
+
+class PriceSuggestionBatchRequest(BaseModel):
+    product_ids: Optional[List[int]] = None
+    category: Optional[str] = None  # todos los productos de la categoría
+    refresh: bool = False  # ignorar la caché de precios de mercado
+    use_local: bool = True  # usar primero los precios ya scrapeados
+    concurrency: Optional[int] = None  # productos consultados a la vez (máx. 32)
+
+
+class UmbralAlertaRequest(BaseModel):
+    product_id: Optional[int] = None  # Umbral de un producto...
+    categoria: Optional[str] = None  # ...o de una categoría
+    variacion_porcentaje: Optional[float] = None  # Nulo = hereda
+    desviaciones: Optional[float] = None
+    cooldown_minutos: Optional[int] = None
+
+
+class UmbralAlertaResponse(UmbralAlertaRequest):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    creado_en: datetime
 
 
 class PriceComparisonResponse(BaseModel):
@@ -137,6 +171,7 @@ class GPTRespuestaEmpresaRequest(BaseModel):
     mensaje: str
     numero_proveedor: Optional[str] = "desconocido"
     tiene_precio: bool = False
+    modo: Optional[str] = None  # json | dos_llamadas (por defecto GPT_MODO_RESPUESTA)
 
 
 class GPTRespuestaEmpresaResponse(BaseModel):
@@ -153,11 +188,31 @@ class GPTExtraerPreciosRequest(BaseModel):
 class GPTExtraerPreciosResponse(BaseModel):
     tienePrecio: bool
     precios: List[str]
+    # Precios normalizados ("1.200,50" -> 1200.5), en el mismo orden que precios
+    valores: List[Optional[float]] = []
+    monedas: List[str] = []
+    cantidades: List[dict] = []
     productos: List[str]
     metodo: str
     exito: bool
 
 
+class GPTMensajeLote(BaseModel):
+    id: Optional[Union[int, str]] = None  # Se devuelve en la línea del resultado
+    mensaje: str
+
+
+class GPTExtraerPreciosLoteRequest(BaseModel):
+    mensajes: Optional[List[GPTMensajeLote]] = None
+    # "whatsapp_productos_cotizados": reprocesar mensaje_completo de esa tabla
+    origen: Optional[str] = None
+    solo_sin_precio: bool = False  # con origen: solo filas con tiene_precio falso
+    limite: Optional[int] = None
+    tamano_lote: Optional[int] = None  # mensajes por llamada a la IA
+    concurrencia: Optional[int] = None  # llamadas a la IA a la vez (máx. 16)
+    solo_regex: bool = False
+
+
 class GPTObtenerRespuestaRequest(BaseModel):
     mensaje: str
     numero_usuario: Optional[str] = "desconocido"
@@ -232,6 +287,7 @@ class WhatsAppProductoCotizadoResponse(WhatsAppProductoCotizadoBase):
     proveedor_id: Optional[int]
     timestamp: int
     created_at: datetime
+    producto_id: Optional[int] = None  # Producto del catálogo enlazado
 
 
 class WhatsAppProductoCotizadoList(BaseModel):
@@ -264,16 +320,53 @@ class ProductoScrapedResponse(ProductoScrapedBase):
     producto_id: Optional[int] = None
 
 
+class ScrapingCategoriasRequest(BaseModel):
+    categorias: List[int] = [1, 2, 3, 4]  # Categorías a barrer en paralelo
+    min_precio: int = 0
+    max_precio: int = 810
+    delay: float = 0.3  # Intervalo mínimo entre peticiones al mismo host
+    concurrencia: Optional[int] = None  # Peticiones simultáneas entre todas las categorías
+    modo: str = "biseccion"  # lineal | biseccion | incremental | paginado
+
+
+class HistorialPrecioResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    precio: float
+    observado_en: datetime
+
+
+class SeriePrecioPunto(BaseModel):
+    desde: datetime
+    hasta: datetime
+    precio: float  # Último precio vigente al cierre del intervalo
+    precio_min: float
+    precio_max: float
+    cambios: int  # Observaciones registradas dentro del intervalo
+
+
+class SeriePrecioResponse(BaseModel):
+    producto_id: int
+    total_observaciones: int
+    puntos: List[SeriePrecioPunto]
+
+
 class ScrapingRequest(BaseModel):
     categoria: int = 1  # 1=Bar, 2=Muebles Oficina, 3=Educativo, 4=Sillas Oficina
     min_precio: int = 0
     max_precio: int = 100
-    delay: float = 0.3
+    delay: float = 0.3  # Intervalo mínimo entre peticiones al mismo host
+    concurrencia: Optional[int] = None  # Peticiones simultáneas (None = por defecto)
+    modo: str = "lineal"  # lineal | biseccion | incremental | paginado
+    reanudar: bool = False  # Continuar desde el último checkpoint sin terminar
 
 
 class ScrapingFullRequest(BaseModel):
     categoria: int = 1  # 1=Bar, 2=Muebles Oficina, 3=Educativo, 4=Sillas Oficina
-    delay: float = 0.3
+    delay: float = 0.3  # Intervalo mínimo entre peticiones al mismo host
+    concurrencia: Optional[int] = None  # Peticiones simultáneas (None = por defecto)
+    modo: str = "lineal"  # lineal | biseccion | incremental | paginado
+    reanudar: bool = False  # Continuar desde el último checkpoint sin terminar
 
 
 class ScrapingResponse(BaseModel):
@@ -282,3 +375,67 @@ class ScrapingResponse(BaseModel):
     productos_duplicados: int
     productos: List[ProductoScrapedResponse]
     estadisticas: dict
+
+
+class ScrapingCheckpointResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    categoria: str
+    modo: str
+    min_precio: int
+    max_precio: int
+    ultimo_precio: Optional[int] = None
+    productos_nuevos: int
+    productos_duplicados: int
+    productos_actualizados: int
+    total_links: int = 0
+    iniciado_en: datetime
+    actualizado_en: Optional[datetime] = None
+    finalizado_en: Optional[datetime] = None
+
+
+class TrabajoScrapingProgreso(BaseModel):
+    precios_escaneados: int
+    precios_totales: int
+    productos_encontrados: int
+    peticiones_http: int
+    porcentaje: float
+    eta_segundos: Optional[float] = None
+
+
+class TrabajoScrapingResponse(BaseModel):
+    id: str
+    tipo: str  # rango, completo
+    categoria: str
+    estado: str  # pendiente, en_curso, completado, incompleto, cancelado, error
+    parametros: dict
+    creado_en: datetime
+    iniciado_en: Optional[datetime] = None
+    finalizado_en: Optional[datetime] = None
+    progreso: TrabajoScrapingProgreso
+    resultado: Optional[ScrapingResponse] = None
+    error: Optional[str] = None
+
+
+# ==================== EMPAREJAMIENTO CON EL CATÁLOGO ====================
+
+
+class EmparejamientoRevisionResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    origen: str  # scraping | whatsapp
+    registro_id: int
+    nombre: str
+    producto_id: int
+    similitud: float
+    alternativa_id: Optional[int] = None
+    similitud_alternativa: Optional[float] = None
+    estado: str
+    creado_en: datetime
+    resuelto_en: Optional[datetime] = None
+
+
+class EmparejamientoResolverRequest(BaseModel):
+    producto_id: Optional[int] = None  # Otro producto en lugar del candidato propuesto
@@ -1,74 +1,788 @@
-import requests
-from bs4 import BeautifulSoup
+import os
+import re
+import threading
 import time
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Dict, Optional, Tuple
+from sqlalchemy import insert as sql_insert, or_
 from sqlalchemy.orm import Session
-from models import ProductoScraped
-from datetime import datetime
+from cache_http import cache_http, HIT
+from http_client import cliente_http
+from parser_html import crear_parser
+from alertas_precios import motor_alertas
+from emparejamiento import normalizar_nombre
+from models import HistorialPrecioScraped, ProductoScraped, ScrapingCheckpoint
+from datetime import datetime, timezone
+
+# Peticiones simultáneas por defecto durante un barrido
+CONCURRENCIA_POR_DEFECTO = int(os.getenv("SCRAPER_CONCURRENCIA", "4"))
+
+# lineal: una petición por precio entero; biseccion: divide ventanas con resultados;
+# incremental: re-consulta los precios ya conocidos y busca solo lo que cambió;
+# paginado: recorre el listado (/page/N/) y lee el precio de cada tarjeta
+MODOS_ESCANEO = ("lineal", "biseccion", "incremental", "paginado")
+
+# Precios por tramo: tras cada tramo se hace commit y se guarda el checkpoint
+TRAMO_CHECKPOINT = int(os.getenv("SCRAPER_TRAMO_CHECKPOINT", "100"))
+
+# Filas por consulta de existencia / upsert al guardar productos
+TAMANO_LOTE_BD = 500
+
+# Columnas que se refrescan cuando un producto ya existente cambia
+CAMPOS_ACTUALIZABLES = ("precio", "nombre", "imagen")
+# Se reescriben junto con los anteriores
+CAMPOS_DERIVADOS = ("nombre_normalizado", "fecha_scraping")
+
+# Categorías de livingroom.com.bo disponibles para scraping
+CATEGORIAS_SCRAPING = {
+    1: {
+        "url": "https://www.livingroom.com.bo/product-category/bar/",
+        "nombre": "Bar",
+    },
+    2: {
+        "url": "https://www.livingroom.com.bo/product-category/muebles-de-oficina/",
+        "nombre": "Muebles de Oficina",
+    },
+    3: {
+        "url": "https://www.livingroom.com.bo/product-category/mobiliario_educativo/",
+        "nombre": "Mobiliario Educativo",
+    },
+    4: {
+        "url": "https://www.livingroom.com.bo/product-category/sillas-de-oficina/",
+        "nombre": "Sillas de Oficina",
+    },
+}
+
+
+class EscaneoCancelado(Exception):
+    """Se lanza dentro de un barrido cuando se solicitó su cancelación"""
+
+
+class ContextoEscaneo:
+    """Contadores y progreso compartidos por los hilos de un mismo barrido"""
+
+    def __init__(self, padre: Optional["ContextoEscaneo"] = None):
+        self._lock = threading.Lock()
+        # Un sub-barrido (p. ej. una categoría) suma también en el contexto padre
+        # y se cancela junto con él
+        self.padre = padre
+        self.cancelado = padre.cancelado if padre else threading.Event()
+        self.peticiones = 0
+        self.errores = 0
+        self.precios_totales = 0
+        self.precios_escaneados = 0
+        self.productos_encontrados = 0
+        self.cache = {"hit": 0, "revalidado": 0, "miss": 0}
+        # Ventanas (min, max) que no se pudieron consultar: pueden faltar productos
+        self.sin_resolver: List[Tuple[int, int]] = []
+
+    def registrar_peticion(self, error: bool = False, cache: Optional[str] = None):
+        """Cuenta una descarga; los aciertos de caché sin red no son peticiones"""
+        with self._lock:
+            if cache:
+                self.cache[cache] += 1
+            if cache != HIT:
+                self.peticiones += 1
+            if error:
+                self.errores += 1
+        if self.padre:
+            self.padre.registrar_peticion(error, cache)
+
+    def avanzar(self, precios: int, productos: int = 0):
+        """Marca precios como ya cubiertos por el barrido"""
+        with self._lock:
+            self.precios_escaneados += precios
+            self.productos_encontrados += productos
+        if self.padre:
+            self.padre.avanzar(precios, productos)
+
+    def marcar_sin_resolver(self, min_precio: int, max_precio: int):
+        """Registra una ventana cuya descarga falló (no se toma como vacía)"""
+        with self._lock:
+            self.sin_resolver.append((min_precio, max_precio))
+        if self.padre:
+            self.padre.marcar_sin_resolver(min_precio, max_precio)
+
+    def verificar_cancelacion(self):
+        if self.cancelado.is_set():
+            raise EscaneoCancelado()
 
 
 class ScraperService:
     def __init__(self):
-        self.headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-            "Accept-Language": "es-ES,es;q=0.9",
-        }
+        # Cliente compartido: keep-alive, reintentos, circuito y límite por host
+        self.http = cliente_http
+        # lxml/selectolax si están instalados (ver SCRAPER_PARSER_HTML)
+        self.parser = crear_parser()
+
+    def extraer_productos(
+        self, pagina: Dict, precio: Optional[int], categoria_nombre: str
+    ) -> List[Dict]:
+        """
+        Arma los productos de una página parseada. Si no se pasa `precio` se
+        usa el de la tarjeta (None si la tarjeta no lo muestra).
+        """
+        return [
+            {
+                "nombre": tarjeta["nombre"],
+                "precio": float(precio) if precio is not None else tarjeta["precio"],
+                "categoria": categoria_nombre,
+                "link": tarjeta["link"],
+                "imagen": tarjeta["imagen"],
+                "fuente": "livingroom.com.bo",
+            }
+            for tarjeta in pagina["tarjetas"]
+            if tarjeta["link"]
+        ]
 
-    def extraer_productos(self, soup, precio: int, categoria_nombre: str) -> List[Dict]:
-        """Extrae productos de una página"""
-        productos = soup.find_all("li", class_="product")
-        if not productos:
-            productos = soup.find_all("div", class_="product")
-
-        resultados = []
-        for prod in productos:
-            # Nombre
-            nombre = prod.find("p", class_="woocommerce-loop-product__title")
-            if nombre:
-                nombre_a = nombre.find("a")
-                nombre_texto = (
-                    nombre_a.text.strip() if nombre_a else nombre.text.strip()
+    @staticmethod
+    def contar_resultados(pagina: Dict, productos_en_pagina: int) -> Optional[int]:
+        """
+        Lee el total de resultados del filtro ("Mostrando 1–12 de 52 resultados").
+        Devuelve None si la página está paginada y no trae el contador.
+        """
+        contador = pagina["contador"]
+        if contador:
+            numeros = re.findall(r"\d+", contador)
+            if numeros:
+                return int(numeros[-1])
+            if "único" in contador.lower():
+                return 1
+        if pagina["paginacion"]:
+            return None
+        return productos_en_pagina
+
+    def _descargar(
+        self, url: str, delay: float, contexto: ContextoEscaneo
+    ) -> Optional[Dict]:
+        """
+        Descarga y parsea una página respetando el límite por host. El parseo
+        corre en el mismo hilo del pool de descargas, no en el que atiende la API.
+        Devuelve None si la descarga falló (error de red o estado distinto de
+        200); un 404 es una página sin productos (p. ej. /page/N/ fuera de rango).
+        """
+        contexto.verificar_cancelacion()
+        try:
+            response, estado_cache = cache_http.obtener(
+                self.http, url, timeout=10, intervalo=delay
+            )
+            if response.status_code == 404:
+                contexto.registrar_peticion(cache=estado_cache)
+                return {"tarjetas": [], "contador": None, "paginacion": False}
+            if response.status_code != 200:
+                contexto.registrar_peticion(error=True, cache=estado_cache)
+                print(f"Error descargando {url}: HTTP {response.status_code}")
+                return None
+            contexto.registrar_peticion(cache=estado_cache)
+            return self.parser.parsear_listado(response.text)
+        except Exception as e:
+            contexto.registrar_peticion(error=True)
+            print(f"Error descargando {url}: {e}")
+        return None
+
+    def consultar_ventana(
+        self,
+        min_precio: int,
+        max_precio: int,
+        categoria_url: str,
+        categoria_nombre: str,
+        delay: float,
+        contexto: ContextoEscaneo,
+    ) -> Dict:
+        """
+        Consulta una ventana min_price..max_price y devuelve el total de
+        resultados y los productos de la primera página. Si la ventana es un
+        precio exacto se recorren todas sus páginas y se asigna el precio.
+        `error` indica que alguna descarga falló: el total es desconocido (None)
+        o faltan páginas, nunca una ventana vacía.
+        """
+        url = f"{categoria_url}?min_price={min_precio}&max_price={max_precio}"
+        pagina = self._descargar(url, delay, contexto)
+        if pagina is None:
+            return {"total": None, "productos": [], "error": True}
+
+        precio = min_precio if min_precio == max_precio else None
+        productos = self.extraer_productos(pagina, precio, categoria_nombre)
+        total = self.contar_resultados(pagina, len(productos))
+
+        error = False
+        if precio is not None:
+            pagina = 2
+            while total is None or len(productos) < total:
+                url_pagina = (
+                    f"{categoria_url}page/{pagina}/"
+                    f"?min_price={min_precio}&max_price={max_precio}"
                 )
-            else:
-                nombre = prod.find("h2") or prod.find("h3")
-                nombre_texto = nombre.text.strip() if nombre else "Sin nombre"
-
-            # Link
-            link_tag = prod.find("a", href=True)
-            link = link_tag["href"] if link_tag else None
-
-            # Imagen
-            img = prod.find("img")
-            imagen = img.get("src") or img.get("data-src") if img else None
-
-            if link:
-                producto = {
-                    "nombre": nombre_texto,
-                    "precio": float(precio),
-                    "categoria": categoria_nombre,
-                    "link": link,
-                    "imagen": imagen,
-                    "fuente": "livingroom.com.bo",
-                }
-                resultados.append(producto)
+                siguiente = self._descargar(url_pagina, delay, contexto)
+                if siguiente is None:
+                    error = True
+                    break
+                extra = self.extraer_productos(siguiente, precio, categoria_nombre)
+                if not extra:
+                    break
+                productos.extend(extra)
+                pagina += 1
 
-        return resultados
+        return {"total": total, "productos": productos, "error": error}
 
     def escanear_precio(
-        self, precio: int, categoria_url: str, categoria_nombre: str
+        self,
+        precio: int,
+        categoria_url: str,
+        categoria_nombre: str,
+        delay: float = 0.3,
+        contexto: Optional[ContextoEscaneo] = None,
     ) -> List[Dict]:
-        """Escanea un precio específico"""
-        url = f"{categoria_url}?min_price={precio}&max_price={precio}"
+        """Escanea un precio específico respetando el límite por host"""
+        consulta = self.consultar_ventana(
+            precio,
+            precio,
+            categoria_url,
+            categoria_nombre,
+            delay,
+            contexto or ContextoEscaneo(),
+        )
+        return consulta["productos"]
 
-        try:
-            response = requests.get(url, headers=self.headers, timeout=10)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, "html.parser")
-                return self.extraer_productos(soup, precio, categoria_nombre)
-        except Exception as e:
-            print(f"Error escaneando precio {precio}: {e}")
-        return []
+    def recolectar_lineal(
+        self,
+        min_precio: int,
+        max_precio: int,
+        categoria_url: str,
+        categoria_nombre: str,
+        delay: float,
+        executor: ThreadPoolExecutor,
+        contexto: ContextoEscaneo,
+    ) -> List[Dict]:
+        """Una petición por cada precio entero del rango"""
+
+        def escanear(precio):
+            consulta = self.consultar_ventana(
+                precio, precio, categoria_url, categoria_nombre, delay, contexto
+            )
+            if consulta["error"]:
+                contexto.marcar_sin_resolver(precio, precio)
+            contexto.avanzar(1, len(consulta["productos"]))
+            return consulta["productos"]
+
+        # map conserva el orden de precios: el primer precio visto gana
+        resultados = executor.map(escanear, range(min_precio, max_precio + 1))
+        return [producto for productos in resultados for producto in productos]
+
+    def recolectar_biseccion(
+        self,
+        min_precio: int,
+        max_precio: int,
+        categoria_url: str,
+        categoria_nombre: str,
+        delay: float,
+        executor: ThreadPoolExecutor,
+        contexto: ContextoEscaneo,
+        conocidos: Optional[Dict[int, int]] = None,
+        conocidos_exactos: bool = True,
+        total_inicial: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        Bisección adaptativa: consulta ventanas amplias y solo divide las que
+        tienen resultados. El total de la mitad derecha se deduce restando el
+        de la izquierda al de la ventana padre, así que por cada división se
+        hace una sola petición. Los precios exactos se consultan en las hojas.
+
+        `conocidos` ({precio: productos}) son precios exactos ya consultados:
+        no se vuelven a pedir y una ventana se descarta cuando su total no
+        supera lo ya encontrado dentro de ella. Con `conocidos_exactos=False`
+        los conteos solo sirven para descartar ventanas (pueden faltar
+        productos en esos precios). `total_inicial` evita volver a pedir la
+        ventana completa si su total ya se conoce.
+
+        Si falla la consulta de la mitad izquierda, ambas mitades se vuelven a
+        pedir en la ronda siguiente; si falla una ventana pedida sin total
+        conocido, se registra como sin resolver en el contexto (nunca se
+        descarta como vacía).
+        """
+        conocidos = conocidos or {}
+
+        def consultado(precio):
+            return conocidos_exactos and precio in conocidos
+
+        def consultar(ventana):
+            return self.consultar_ventana(
+                ventana[0], ventana[1], categoria_url, categoria_nombre, delay, contexto
+            )
+
+        def resuelta(lo, hi, total):
+            """Ventana sin productos por descubrir (vacía o ya consultada)"""
+            if lo == hi and consultado(lo):
+                return True
+            if total is None:
+                return False
+            return total <= sum(n for p, n in conocidos.items() if lo <= p <= hi)
+
+        productos = []
+        # Cada nodo: [min, max, total (None = desconocido), consulta (None = no pedida)]
+        nivel = [[min_precio, max_precio, total_inicial, None]]
+
+        while nivel:
+            pedidos = []
+            for lo, hi, total, consulta in nivel:
+                if resuelta(lo, hi, total):
+                    continue
+                if consulta is None and (total is None or lo == hi):
+                    pedidos.append((lo, hi))
+                elif lo < hi and total is not None:
+                    medio = (lo + hi) // 2
+                    if not (lo == medio and consultado(lo)):
+                        pedidos.append((lo, medio))
+
+            respuestas = dict(zip(pedidos, executor.map(consultar, pedidos)))
+
+            siguiente = []
+            for lo, hi, total, consulta in nivel:
+                if resuelta(lo, hi, total):
+                    contexto.avanzar(hi - lo + 1)
+                    continue
+
+                if consulta is None and (lo, hi) in respuestas:
+                    consulta = respuestas[(lo, hi)]
+                    if lo != hi:
+                        if consulta["error"]:
+                            contexto.marcar_sin_resolver(lo, hi)
+                            contexto.avanzar(hi - lo + 1)
+                            continue
+                        # Ventana sin total conocido: dividir en la próxima ronda
+                        siguiente.append([lo, hi, consulta["total"], consulta])
+                        continue
+
+                if lo == hi:
+                    encontrados = consulta["productos"] if consulta else []
+                    productos.extend(encontrados)
+                    contexto.avanzar(1, len(encontrados))
+                    if consulta and consulta["error"]:
+                        contexto.marcar_sin_resolver(lo, hi)
+                    continue
+
+                medio = (lo + hi) // 2
+                if total is None:
+                    # Sin contador en la página: dividir a ciegas
+                    siguiente.append([lo, medio, None, None])
+                    siguiente.append([medio + 1, hi, None, None])
+                    continue
+
+                if lo == medio and consultado(lo):
+                    izquierda = {"total": conocidos[lo], "productos": [], "error": False}
+                else:
+                    izquierda = respuestas[(lo, medio)]
+                if izquierda["error"]:
+                    # Sin el total de la izquierda tampoco se conoce el de la
+                    # derecha: volver a pedir ambas mitades
+                    siguiente.append([lo, medio, None, None])
+                    siguiente.append([medio + 1, hi, None, None])
+                    continue
+                total_der = (
+                    total - izquierda["total"]
+                    if izquierda["total"] is not None
+                    else None
+                )
+                siguiente.append([lo, medio, izquierda["total"], izquierda])
+                siguiente.append([medio + 1, hi, total_der, None])
+
+            nivel = siguiente
+
+        return sorted(productos, key=lambda p: p["precio"])
+
+    def recolectar_paginado(
+        self,
+        min_precio: int,
+        max_precio: int,
+        categoria_url: str,
+        categoria_nombre: str,
+        delay: float,
+        executor: ThreadPoolExecutor,
+        contexto: ContextoEscaneo,
+    ) -> List[Dict]:
+        """
+        Recorre el listado paginado del rango (/page/N/) y toma el precio de
+        cada tarjeta. Las tarjetas sin precio legible se resuelven con una
+        bisección que solo baja a las ventanas donde faltan productos; si
+        ninguna tarjeta de la primera página trae precio se pasa directo a la
+        bisección reutilizando el total ya leído.
+        """
+        filtro = f"?min_price={min_precio}&max_price={max_precio}"
+        precios_rango = max_precio - min_precio + 1
+
+        def leer_pagina(numero):
+            pagina = self._descargar(
+                f"{categoria_url}page/{numero}/{filtro}", delay, contexto
+            )
+            if pagina is None:
+                return None
+            return self.extraer_productos(pagina, None, categoria_nombre)
+
+        primera = self._descargar(f"{categoria_url}{filtro}", delay, contexto)
+        if primera is None:
+            contexto.marcar_sin_resolver(min_precio, max_precio)
+            contexto.avanzar(precios_rango)
+            return []
+        productos = self.extraer_productos(primera, None, categoria_nombre)
+        total = self.contar_resultados(primera, len(productos))
+
+        def con_precio(producto):
+            return (
+                producto["precio"] is not None
+                and min_precio <= producto["precio"] <= max_precio
+            )
+
+        bisectar = partial(
+            self.recolectar_biseccion,
+            min_precio,
+            max_precio,
+            categoria_url,
+            categoria_nombre,
+            delay,
+            executor,
+            contexto,
+            total_inicial=total,
+        )
+        if productos and not any(con_precio(p) for p in productos):
+            # El sitio no muestra precios en las tarjetas
+            return bisectar()
+
+        if total is not None and productos:
+            paginas = -(-total // len(productos))
+            # Los productos de una página que falló se recuperan con la bisección
+            for extra in executor.map(leer_pagina, range(2, paginas + 1)):
+                productos.extend(extra or [])
+        elif total is None:
+            # Sin contador: avanzar hasta la primera página vacía
+            numero = 2
+            while True:
+                extra = leer_pagina(numero)
+                if extra is None:
+                    # No se sabe cuántos productos quedaron sin leer
+                    contexto.marcar_sin_resolver(min_precio, max_precio)
+                if not extra:
+                    break
+                productos.extend(extra)
+                numero += 1
+
+        leidos = [p for p in productos if con_precio(p)]
+        faltantes = (
+            total - len(leidos)
+            if total is not None
+            else len(productos) - len(leidos)
+        )
+        contexto.avanzar(0, len(leidos))
+        if faltantes <= 0:
+            contexto.avanzar(precios_rango)
+            return leidos
+
+        conocidos = {}
+        for producto in leidos:
+            precio = int(producto["precio"])
+            conocidos[precio] = conocidos.get(precio, 0) + 1
+        return leidos + bisectar(conocidos=conocidos, conocidos_exactos=False)
+
+    def recolectar_incremental(
+        self,
+        min_precio: int,
+        max_precio: int,
+        categoria_url: str,
+        categoria_nombre: str,
+        delay: float,
+        executor: ThreadPoolExecutor,
+        contexto: ContextoEscaneo,
+        precios_conocidos: List[int],
+    ) -> List[Dict]:
+        """
+        Re-escaneo incremental: consulta de forma exacta los precios donde ya
+        había productos y luego hace una bisección residual que solo baja a
+        las ventanas cuyo total supera lo ya encontrado (productos nuevos o
+        que pasaron a un precio desconocido). Un precio cuya consulta exacta
+        falló no cuenta como conocido, así la bisección lo vuelve a pedir.
+        """
+        precios = [p for p in precios_conocidos if min_precio <= p <= max_precio]
+        consultas = executor.map(
+            lambda precio: self.consultar_ventana(
+                precio, precio, categoria_url, categoria_nombre, delay, contexto
+            ),
+            precios,
+        )
+
+        productos = []
+        conocidos = {}
+        for precio, consulta in zip(precios, consultas):
+            if consulta["error"]:
+                continue
+            productos.extend(consulta["productos"])
+            conocidos[precio] = len(consulta["productos"])
+            contexto.avanzar(0, len(consulta["productos"]))
+
+        productos.extend(
+            self.recolectar_biseccion(
+                min_precio,
+                max_precio,
+                categoria_url,
+                categoria_nombre,
+                delay,
+                executor,
+                contexto,
+                conocidos=conocidos,
+            )
+        )
+        return sorted(productos, key=lambda p: p["precio"])
+
+    @staticmethod
+    def _upsert_productos(db: Session, filas: List[Dict]):
+        """
+        INSERT ... ON CONFLICT (link) DO UPDATE en un solo statement.
+        Solo reescribe la fila si cambió el precio, el nombre o la imagen.
+        """
+        dialecto = db.get_bind().dialect.name
+        if dialecto == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialecto == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            # Otros motores: upsert fila por fila con el ORM
+            for fila in filas:
+                existente = (
+                    db.query(ProductoScraped)
+                    .filter(ProductoScraped.link == fila["link"])
+                    .first()
+                )
+                if existente:
+                    for campo in CAMPOS_ACTUALIZABLES + CAMPOS_DERIVADOS:
+                        setattr(existente, campo, fila[campo])
+                else:
+                    db.add(ProductoScraped(**fila))
+            db.flush()
+            return
+
+        tabla = ProductoScraped.__table__
+        stmt = insert(tabla).values(filas)
+        excluido = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[tabla.c.link],
+            set_={
+                campo: excluido[campo]
+                for campo in CAMPOS_ACTUALIZABLES + CAMPOS_DERIVADOS
+            },
+            where=or_(
+                *[
+                    tabla.c[campo].is_distinct_from(excluido[campo])
+                    for campo in CAMPOS_ACTUALIZABLES
+                ]
+            ),
+        )
+        db.execute(stmt)
+
+    def guardar_productos(self, db: Session, productos: List[Dict]) -> Dict:
+        """
+        Guarda productos en bloque: una consulta de existencia y un upsert por
+        lote de TAMANO_LOTE_BD. Registra en el historial el precio de los
+        productos nuevos y de los que cambiaron de precio. No hace commit.
+        """
+        nuevos = duplicados = actualizados = 0
+        ahora = datetime.now(timezone.utc)
+
+        for inicio in range(0, len(productos), TAMANO_LOTE_BD):
+            lote = productos[inicio : inicio + TAMANO_LOTE_BD]
+            existentes = {
+                fila.link: fila
+                for fila in db.query(
+                    ProductoScraped.link,
+                    ProductoScraped.precio,
+                    ProductoScraped.nombre,
+                    ProductoScraped.imagen,
+                ).filter(ProductoScraped.link.in_([p["link"] for p in lote]))
+            }
+
+            filas = []
+            precios_observados = {}
+            for producto in lote:
+                existente = existentes.get(producto["link"])
+                if existente is None:
+                    nuevos += 1
+                    precios_observados[producto["link"]] = producto["precio"]
+                else:
+                    duplicados += 1
+                    if all(
+                        getattr(existente, campo) == producto[campo]
+                        for campo in CAMPOS_ACTUALIZABLES
+                    ):
+                        continue
+                    actualizados += 1
+                    if existente.precio != producto["precio"]:
+                        precios_observados[producto["link"]] = producto["precio"]
+                filas.append(
+                    {
+                        "nombre": producto["nombre"],
+                        "nombre_normalizado": normalizar_nombre(producto["nombre"]),
+                        "precio": producto["precio"],
+                        "categoria": producto["categoria"],
+                        "link": producto["link"],
+                        "imagen": producto["imagen"],
+                        "fuente": producto["fuente"],
+                        "fecha_scraping": ahora,
+                    }
+                )
+
+            if filas:
+                self._upsert_productos(db, filas)
+            if precios_observados:
+                self._registrar_historial(db, precios_observados, ahora)
+
+        return {
+            "nuevos": nuevos,
+            "duplicados": duplicados,
+            "actualizados": actualizados,
+        }
+
+    @staticmethod
+    def _registrar_historial(db: Session, precios: Dict[str, float], observado_en):
+        """
+        Inserta en bloque una observación de precio por link (tras el upsert)
+        y pasa las de productos enlazados al catálogo al motor de alertas
+        """
+        ids = db.query(
+            ProductoScraped.id, ProductoScraped.link, ProductoScraped.producto_id
+        ).filter(ProductoScraped.link.in_(list(precios))).all()
+        filas = [
+            {
+                "producto_scraped_id": fila.id,
+                "precio": precios[fila.link],
+                "observado_en": observado_en,
+            }
+            for fila in ids
+            if precios[fila.link] is not None
+        ]
+        if filas:
+            db.execute(sql_insert(HistorialPrecioScraped), filas)
+        motor_alertas.observar_lote(
+            db,
+            [(fila.producto_id, precios[fila.link]) for fila in ids if fila.producto_id],
+            "scraping",
+            observado_en,
+        )
+
+    @staticmethod
+    def reducir_serie(
+        observaciones: List[Tuple[float, datetime]],
+        desde: datetime,
+        hasta: datetime,
+        puntos: int,
+    ) -> List[Dict]:
+        """
+        Reduce el historial [(precio, fecha)] ordenado por fecha a `puntos`
+        intervalos iguales entre desde y hasta. El precio es escalonado: cada intervalo arrastra el
+        último precio conocido y reporta min/max de lo vigente dentro de él.
+        """
+        if not observaciones or hasta <= desde:
+            return []
+
+        paso = (hasta - desde) / puntos
+        serie = []
+        vigente = None
+        i = 0
+        # Las observaciones anteriores a `desde` solo fijan el precio inicial
+        while i < len(observaciones) and observaciones[i][1] < desde:
+            vigente = observaciones[i][0]
+            i += 1
+
+        for n in range(puntos):
+            inicio = desde + paso * n
+            fin = hasta if n == puntos - 1 else inicio + paso
+            precios = [vigente] if vigente is not None else []
+            cambios = 0
+            while i < len(observaciones) and (
+                observaciones[i][1] < fin
+                or (n == puntos - 1 and observaciones[i][1] <= fin)
+            ):
+                vigente = observaciones[i][0]
+                precios.append(vigente)
+                cambios += 1
+                i += 1
+            if vigente is None:
+                continue
+            serie.append(
+                {
+                    "desde": inicio,
+                    "hasta": fin,
+                    "precio": vigente,
+                    "precio_min": min(precios),
+                    "precio_max": max(precios),
+                    "cambios": cambios,
+                }
+            )
+        return serie
+
+    @staticmethod
+    def obtener_por_links(db: Session, links: List[str]) -> List[ProductoScraped]:
+        """Carga productos por link en lotes para no armar un IN gigante"""
+        productos = []
+        for inicio in range(0, len(links), TAMANO_LOTE_BD):
+            productos.extend(
+                db.query(ProductoScraped)
+                .filter(ProductoScraped.link.in_(links[inicio : inicio + TAMANO_LOTE_BD]))
+                .all()
+            )
+        return productos
+
+    @staticmethod
+    def buscar_checkpoint(
+        db: Session, categoria_url: str, modo: str, min_precio: int, max_precio: int
+    ) -> Optional[ScrapingCheckpoint]:
+        """Último barrido sin terminar para la misma categoría, modo y rango"""
+        return (
+            db.query(ScrapingCheckpoint)
+            .filter(
+                ScrapingCheckpoint.categoria_url == categoria_url,
+                ScrapingCheckpoint.modo == modo,
+                ScrapingCheckpoint.min_precio == min_precio,
+                ScrapingCheckpoint.max_precio == max_precio,
+                ScrapingCheckpoint.finalizado_en.is_(None),
+            )
+            .order_by(ScrapingCheckpoint.iniciado_en.desc())
+            .first()
+        )
+
+    def _preparar_recolector(
+        self,
+        db: Session,
+        modo: str,
+        categoria_nombre: str,
+        min_precio: int,
+        max_precio: int,
+    ):
+        """
+        Devuelve la función de recolección del modo y, en modo incremental,
+        la foto previa {link: precio} de la categoría en el rango.
+        """
+        if modo not in MODOS_ESCANEO:
+            raise ValueError(f"Modo de escaneo inválido: {modo}")
+
+        if modo != "incremental":
+            recolectar = {
+                "lineal": self.recolectar_lineal,
+                "biseccion": self.recolectar_biseccion,
+                "paginado": self.recolectar_paginado,
+            }[modo]
+            return recolectar, {}
+
+        # Foto de lo que ya conocíamos de la categoría en este rango
+        anteriores = dict(
+            db.query(ProductoScraped.link, ProductoScraped.precio).filter(
+                ProductoScraped.categoria == categoria_nombre,
+                ProductoScraped.precio >= min_precio,
+                ProductoScraped.precio <= max_precio,
+            )
+        )
+        recolectar = partial(
+            self.recolectar_incremental,
+            precios_conocidos=sorted({int(p) for p in anteriores.values()}),
+        )
+        return recolectar, anteriores
 
     def escanear_rango_rapido(
         self,
@@ -78,76 +792,188 @@ class ScraperService:
         categoria_url: str,
         categoria_nombre: str,
         delay: float = 0.3,
+        concurrencia: Optional[int] = None,
+        modo: str = "lineal",
+        contexto: Optional[ContextoEscaneo] = None,
+        reanudar: bool = False,
     ) -> Dict:
-        """Escanea un rango de precios y guarda en BD evitando duplicados"""
-        productos_unicos = {}
-        productos_nuevos = 0
-        productos_duplicados = 0
-
-        for precio in range(min_precio, max_precio + 1):
-            productos = self.escanear_precio(precio, categoria_url, categoria_nombre)
-
-            for producto_data in productos:
-                link = producto_data["link"]
-
-                # Verificar si ya existe en productos_unicos de esta sesión
-                if link not in productos_unicos:
-                    productos_unicos[link] = producto_data
-
-                    # Verificar si existe en BD
-                    existe = (
-                        db.query(ProductoScraped)
-                        .filter(ProductoScraped.link == link)
-                        .first()
-                    )
+        """
+        Escanea un rango de precios y guarda en BD evitando duplicados.
+        Las peticiones se hacen en paralelo (hasta `concurrencia` a la vez);
+        `delay` es el intervalo mínimo entre peticiones al mismo host.
+        `modo` puede ser "lineal" (un precio por petición), "biseccion",
+        "incremental" (usa los precios ya guardados de la categoría y reporta
+        productos nuevos, desaparecidos y con cambio de precio) o "paginado"
+        (lee los precios de las tarjetas del listado).
+        `contexto` permite seguir el progreso y cancelar desde otro hilo.
 
-                    if not existe:
-                        # Crear nuevo producto
-                        nuevo_producto = ProductoScraped(
-                            nombre=producto_data["nombre"],
-                            precio=producto_data["precio"],
-                            categoria=producto_data["categoria"],
-                            link=producto_data["link"],
-                            imagen=producto_data["imagen"],
-                            fuente=producto_data["fuente"],
-                        )
-                        db.add(nuevo_producto)
-                        productos_nuevos += 1
-                    else:
-                        productos_duplicados += 1
-
-            time.sleep(delay)
+        El rango se recorre en tramos de TRAMO_CHECKPOINT precios; tras cada
+        tramo se hace commit y se actualiza el checkpoint. Con `reanudar` se
+        continúa el último barrido sin terminar de la misma categoría, modo y rango.
+        Si en un tramo quedan ventanas sin resolver (descargas fallidas), se
+        guarda lo encontrado pero el checkpoint no avanza y el barrido se
+        detiene sin finalizar, así al reanudar se vuelve a recorrer ese tramo.
+        """
+        concurrencia = max(1, concurrencia or CONCURRENCIA_POR_DEFECTO)
+        contexto = contexto or ContextoEscaneo()
+        contexto.precios_totales += max_precio - min_precio + 1
+        sin_resolver_previas = len(contexto.sin_resolver)
+        recolectar, anteriores = self._preparar_recolector(
+            db, modo, categoria_nombre, min_precio, max_precio
+        )
 
-        db.commit()
+        checkpoint = None
+        if reanudar:
+            checkpoint = self.buscar_checkpoint(
+                db, categoria_url, modo, min_precio, max_precio
+            )
+        if checkpoint is None:
+            checkpoint = ScrapingCheckpoint(
+                categoria=categoria_nombre,
+                categoria_url=categoria_url,
+                modo=modo,
+                min_precio=min_precio,
+                max_precio=max_precio,
+                links_vistos=[],
+            )
+            db.add(checkpoint)
+            db.commit()
 
-        # Obtener todos los productos guardados
-        productos_guardados = (
-            db.query(ProductoScraped)
-            .filter(ProductoScraped.link.in_(productos_unicos.keys()))
-            .all()
+        links_vistos = list(checkpoint.links_vistos or [])
+        vistos = set(links_vistos)
+        inicio = (
+            checkpoint.ultimo_precio + 1
+            if checkpoint.ultimo_precio is not None
+            else min_precio
         )
+        contexto.avanzar(inicio - min_precio)
 
-        precios = sorted(set(p["precio"] for p in productos_unicos.values()))
+        incompleto = False
+        with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+            for tramo_min in range(inicio, max_precio + 1, TRAMO_CHECKPOINT):
+                tramo_max = min(tramo_min + TRAMO_CHECKPOINT - 1, max_precio)
+                sin_resolver_tramo = len(contexto.sin_resolver)
+                productos = recolectar(
+                    tramo_min,
+                    tramo_max,
+                    categoria_url,
+                    categoria_nombre,
+                    delay,
+                    executor,
+                    contexto,
+                )
+
+                # Deduplicar por link en todo el barrido (gana el primero visto)
+                productos_unicos = {}
+                for producto_data in productos:
+                    if producto_data["link"] not in vistos:
+                        productos_unicos.setdefault(producto_data["link"], producto_data)
+                vistos.update(productos_unicos)
+                links_vistos.extend(productos_unicos)
+
+                conteos = self.guardar_productos(db, list(productos_unicos.values()))
+                checkpoint.productos_nuevos += conteos["nuevos"]
+                checkpoint.productos_duplicados += conteos["duplicados"]
+                checkpoint.productos_actualizados += conteos["actualizados"]
+                incompleto = len(contexto.sin_resolver) > sin_resolver_tramo
+                if not incompleto:
+                    checkpoint.ultimo_precio = tramo_max
+                checkpoint.links_vistos = list(links_vistos)
+                checkpoint.actualizado_en = datetime.now(timezone.utc)
+                db.commit()
+                if incompleto:
+                    print(
+                        f"⚠️ Descargas fallidas en {categoria_nombre} {tramo_min}-{tramo_max}: "
+                        f"barrido detenido, reanudar para reintentar el tramo"
+                    )
+                    break
+
+        if not incompleto:
+            checkpoint.finalizado_en = datetime.now(timezone.utc)
+            db.commit()
+
+        # Obtener todos los productos guardados
+        productos_guardados = self.obtener_por_links(db, links_vistos)
+
+        precios = sorted(set(p.precio for p in productos_guardados))
+
+        estadisticas_extra = {}
+        if modo == "incremental":
+            sin_verificar = contexto.sin_resolver[sin_resolver_previas:]
+            if incompleto and tramo_max < max_precio:
+                # Tramos que no se llegaron a recorrer
+                sin_verificar = sin_verificar + [(tramo_max + 1, max_precio)]
+            estadisticas_extra["incremental"] = self.comparar_con_anteriores(
+                anteriores, productos_guardados, sin_verificar
+            )
 
         return {
-            "total_productos": len(productos_unicos),
-            "productos_nuevos": productos_nuevos,
-            "productos_duplicados": productos_duplicados,
+            "total_productos": len(links_vistos),
+            "productos_nuevos": checkpoint.productos_nuevos,
+            "productos_duplicados": checkpoint.productos_duplicados,
             "productos": productos_guardados,
             "estadisticas": {
+                "productos_actualizados": checkpoint.productos_actualizados,
                 "precios_diferentes": len(precios),
                 "precios": precios,
                 "precio_min": min(precios) if precios else 0,
                 "precio_max": max(precios) if precios else 0,
+                "modo": modo,
+                "peticiones_http": contexto.peticiones,
+                "errores_http": contexto.errores,
+                "ventanas_sin_resolver": contexto.sin_resolver[sin_resolver_previas:],
+                "cache_http": dict(contexto.cache),
+                "checkpoint_id": checkpoint.id,
+                "incompleto": incompleto,
+                "reanudado_desde": inicio if inicio != min_precio else None,
+                **estadisticas_extra,
             },
         }
 
+    @staticmethod
+    def comparar_con_anteriores(
+        anteriores: Dict[str, float],
+        productos: List[ProductoScraped],
+        sin_verificar: Optional[List[Tuple[int, int]]] = None,
+    ) -> Dict:
+        """
+        Productos nuevos, desaparecidos y con cambio de precio respecto a la
+        foto previa. Los productos anteriores cuyo precio cae en una ventana de
+        `sin_verificar` (descargas fallidas) no se reportan como desaparecidos.
+        """
+        actuales = {p.link: p.precio for p in productos}
+        ventanas = sin_verificar or []
+
+        def verificado(precio):
+            return not any(lo <= int(precio) <= hi for lo, hi in ventanas)
+
+        no_vistos = [link for link in anteriores if link not in actuales]
+        return {
+            "precios_conocidos": len(set(anteriores.values())),
+            "nuevos": [link for link in actuales if link not in anteriores],
+            "desaparecidos": [link for link in no_vistos if verificado(anteriores[link])],
+            "sin_verificar": [link for link in no_vistos if not verificado(anteriores[link])],
+            "cambios_precio": [
+                {
+                    "link": link,
+                    "precio_anterior": anteriores[link],
+                    "precio_actual": precio,
+                }
+                for link, precio in actuales.items()
+                if link in anteriores and anteriores[link] != precio
+            ],
+        }
+
     def escanear_completo(
         self,
         db: Session,
         categoria_url: str,
         categoria_nombre: str,
         delay: float = 0.3,
+        concurrencia: Optional[int] = None,
+        modo: str = "lineal",
+        contexto: Optional[ContextoEscaneo] = None,
+        reanudar: bool = False,
     ) -> Dict:
         """Escaneo completo optimizado: primero detecta el rango máximo"""
         # Intentar detectar precio máximo
@@ -155,8 +981,157 @@ class ScraperService:
 
         # Escanear de 0 al máximo
         return self.escanear_rango_rapido(
-            db, 0, max_precio, categoria_url, categoria_nombre, delay
+            db,
+            0,
+            max_precio,
+            categoria_url,
+            categoria_nombre,
+            delay,
+            concurrencia,
+            modo,
+            contexto,
+            reanudar,
         )
 
+    def escanear_categorias(
+        self,
+        db: Session,
+        categorias: List[Dict],
+        min_precio: int = 0,
+        max_precio: int = 810,
+        delay: float = 0.3,
+        concurrencia: Optional[int] = None,
+        modo: str = "biseccion",
+        contexto: Optional[ContextoEscaneo] = None,
+    ) -> Dict:
+        """
+        Barre varias categorías ({"url", "nombre"}) en paralelo. Todas comparten
+        un único pool de `concurrencia` descargas y el límite por host, así
+        que el presupuesto de peticiones es global. Al final se hace una sola
+        pasada de deduplicación por link (gana la primera categoría pedida) y
+        un único guardado en lote. Sin checkpoints: cada categoría se recolecta
+        completa en memoria.
+        """
+        concurrencia = max(1, concurrencia or CONCURRENCIA_POR_DEFECTO)
+        contexto = contexto or ContextoEscaneo()
+        contexto.precios_totales += len(categorias) * (max_precio - min_precio + 1)
+
+        preparadas = []
+        for categoria in categorias:
+            recolectar, anteriores = self._preparar_recolector(
+                db, modo, categoria["nombre"], min_precio, max_precio
+            )
+            preparadas.append((categoria, recolectar, anteriores, ContextoEscaneo(contexto)))
+        # No retener una conexión del pool de BD mientras se descarga
+        db.commit()
+
+        def barrer(categoria, recolectar, subcontexto, descargas):
+            inicio = time.monotonic()
+            error = None
+            try:
+                productos = recolectar(
+                    min_precio,
+                    max_precio,
+                    categoria["url"],
+                    categoria["nombre"],
+                    delay,
+                    descargas,
+                    subcontexto,
+                )
+            except EscaneoCancelado:
+                raise
+            except Exception as e:
+                print(f"❌ Error barriendo {categoria['nombre']}: {e}")
+                productos, error = [], str(e)
+            return productos, time.monotonic() - inicio, error
+
+        inicio_total = time.monotonic()
+        with ThreadPoolExecutor(
+            max_workers=concurrencia
+        ) as descargas, ThreadPoolExecutor(max_workers=len(categorias) or 1) as barridos:
+            futuros = [
+                barridos.submit(barrer, categoria, recolectar, subcontexto, descargas)
+                for categoria, recolectar, _, subcontexto in preparadas
+            ]
+            resultados = [futuro.result() for futuro in futuros]
+
+        # Deduplicación única entre categorías
+        unicos = {}
+        categorias_por_link: Dict[str, List[str]] = {}
+        por_categoria = []
+        for (categoria, _, anteriores, subcontexto), (productos, segundos, error) in zip(
+            preparadas, resultados
+        ):
+            asignados = []
+            for producto in productos:
+                nombres = categorias_por_link.setdefault(producto["link"], [])
+                if categoria["nombre"] not in nombres:
+                    nombres.append(categoria["nombre"])
+                if producto["link"] not in unicos:
+                    unicos[producto["link"]] = producto
+                    asignados.append(producto["link"])
+            por_categoria.append(
+                {
+                    "categoria": categoria["nombre"],
+                    "segundos": round(segundos, 2),
+                    "peticiones_http": subcontexto.peticiones,
+                    "errores_http": subcontexto.errores,
+                    "ventanas_sin_resolver": list(subcontexto.sin_resolver),
+                    "cache_http": dict(subcontexto.cache),
+                    "productos_encontrados": len({p["link"] for p in productos}),
+                    "productos_asignados": len(asignados),
+                    "error": error,
+                    "_links": asignados,
+                    "_anteriores": anteriores,
+                }
+            )
+
+        conteos = self.guardar_productos(db, list(unicos.values()))
+        db.commit()
+        productos_guardados = self.obtener_por_links(db, list(unicos))
+
+        por_link = {p.link: p for p in productos_guardados}
+        for resumen in por_categoria:
+            links = resumen.pop("_links")
+            anteriores = resumen.pop("_anteriores")
+            if modo == "incremental":
+                # Una categoría que falló entera no se pudo verificar
+                sin_verificar = (
+                    [(min_precio, max_precio)]
+                    if resumen["error"]
+                    else resumen["ventanas_sin_resolver"]
+                )
+                resumen["incremental"] = self.comparar_con_anteriores(
+                    anteriores,
+                    [por_link[link] for link in links if link in por_link],
+                    sin_verificar,
+                )
+
+        precios = sorted(set(p.precio for p in productos_guardados))
+        compartidos = {
+            link: nombres for link, nombres in categorias_por_link.items() if len(nombres) > 1
+        }
+
+        return {
+            "total_productos": len(unicos),
+            "productos_nuevos": conteos["nuevos"],
+            "productos_duplicados": conteos["duplicados"],
+            "productos": productos_guardados,
+            "estadisticas": {
+                "productos_actualizados": conteos["actualizados"],
+                "precios_diferentes": len(precios),
+                "precio_min": min(precios) if precios else 0,
+                "precio_max": max(precios) if precios else 0,
+                "modo": modo,
+                "peticiones_http": contexto.peticiones,
+                "errores_http": contexto.errores,
+                "ventanas_sin_resolver": list(contexto.sin_resolver),
+                "cache_http": dict(contexto.cache),
+                "segundos": round(time.monotonic() - inicio_total, 2),
+                "categorias": por_categoria,
+                "compartidos_entre_categorias": compartidos,
+            },
+        }
+
 
 scraper_service = ScraperService()
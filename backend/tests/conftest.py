@@ -0,0 +1,68 @@
+"""
+Configuración común de las pruebas: base SQLite temporal, cachés en un
+directorio temporal y sin clave real de OpenAI. Las variables se fijan antes
+de importar los módulos del backend porque leen la configuración al importarse.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+_TEMPORAL = Path(tempfile.mkdtemp(prefix="mobicorp_tests_"))
+
+os.environ["DATABASE_URL"] = f"sqlite:///{_TEMPORAL / 'mobicorp.db'}"
+os.environ["CONVERSACIONES_DB_URL"] = f"sqlite:///{_TEMPORAL / 'conversaciones.db'}"
+os.environ["GPT_CACHE_DB"] = str(_TEMPORAL / "cache_gpt.db")
+os.environ["SCRAPER_CACHE_HTTP"] = "false"
+os.environ["SCRAPER_CACHE_DIR"] = str(_TEMPORAL / "cache_http")
+os.environ["OPENAI_API_KEY"] = "sk-pruebas"
+os.environ["OPENAI_API_BASE"] = "http://127.0.0.1:9"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import Base, SessionLocal, engine  # noqa: E402
+import models  # noqa: E402,F401
+
+
+@pytest.fixture
+def db():
+    """Sesión sobre tablas recién creadas"""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    sesion = SessionLocal()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+
+
+@pytest.fixture
+def api(db, monkeypatch):
+    """TestClient de main.app con un usuario autenticado y caché de precios vacía"""
+    from fastapi.testclient import TestClient
+
+    import main
+    from models import User
+    from price_cache import MarketPriceCache
+
+    usuario = User(email="ventas@mobicorp.test", full_name="Ventas", role="admin")
+    db.add(usuario)
+    db.commit()
+    usuario_id = usuario.id
+
+    def usuario_actual():
+        sesion = SessionLocal()
+        try:
+            return sesion.get(User, usuario_id)
+        finally:
+            sesion.close()
+
+    monkeypatch.setattr(main, "market_price_cache", MarketPriceCache())
+    main.app.dependency_overrides[main.get_current_user] = usuario_actual
+    try:
+        yield TestClient(main.app)
+    finally:
+        main.app.dependency_overrides.clear()
@@ -0,0 +1,102 @@
+"""
+Tienda WooCommerce simulada para probar los barridos sin red: responde los
+listados filtrados por ?min_price=&max_price= (y /page/N/) con el mismo HTML
+que livingroom.com.bo, y puede hacer fallar las URLs que se le indiquen.
+"""
+
+import threading
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+CATEGORIA_URL = "https://tienda.test/product-category/sillas/"
+
+
+class SitioFalso:
+    def __init__(self, precios, por_pagina=12, fallas=None):
+        # {link: precio}
+        self.precios = dict(precios)
+        self.por_pagina = por_pagina
+        # URLs (o fragmentos de URL) que responden 503; cada una falla `veces`
+        self.fallas = dict(fallas or {})
+        self.peticiones = []
+        self._lock = threading.Lock()
+
+    def _debe_fallar(self, url):
+        with self._lock:
+            self.peticiones.append(url)
+            for fragmento, veces in self.fallas.items():
+                if fragmento in url and veces:
+                    self.fallas[fragmento] = veces - 1
+                    return True
+        return False
+
+    def get(self, url, timeout=None, headers=None, **kwargs):
+        response = requests.Response()
+        response.url = url
+        response.encoding = "utf-8"
+        if self._debe_fallar(url):
+            response.status_code = 503
+            response._content = b""
+            return response
+
+        partes = urlparse(url)
+        filtro = parse_qs(partes.query)
+        minimo = int(filtro["min_price"][0])
+        maximo = int(filtro["max_price"][0])
+        pagina = 1
+        if "/page/" in partes.path:
+            pagina = int(partes.path.rstrip("/").rsplit("/", 1)[1])
+
+        encontrados = sorted(
+            (precio, link) for link, precio in self.precios.items() if minimo <= precio <= maximo
+        )
+        inicio = (pagina - 1) * self.por_pagina
+        if pagina > 1 and inicio >= len(encontrados):
+            response.status_code = 404
+            response._content = b"<html><body>No encontrado</body></html>"
+            return response
+
+        response.status_code = 200
+        response._content = self.html(encontrados, inicio).encode("utf-8")
+        return response
+
+    def html(self, encontrados, inicio):
+        tarjetas = "".join(
+            f'<li class="product"><a href="{link}"><img src="{link}.jpg"></a>'
+            f'<p class="woocommerce-loop-product__title"><a href="{link}">Producto {link[-8:]}</a></p>'
+            f'<span class="price"><span class="amount">Bs.{precio:.2f}</span></span></li>'
+            for precio, link in encontrados[inicio : inicio + self.por_pagina]
+        )
+        if not encontrados:
+            return '<html><body><p class="woocommerce-info">No se encontraron productos</p></body></html>'
+        contador = f'<p class="woocommerce-result-count">Mostrando {len(encontrados)} resultados</p>'
+        paginacion = (
+            '<nav class="woocommerce-pagination"></nav>'
+            if len(encontrados) > self.por_pagina
+            else ""
+        )
+        return f'<html><body>{contador}<ul class="products">{tarjetas}</ul>{paginacion}</body></html>'
+
+
+def catalogo(cantidad, precio_min=0, precio_max=810, paso=7):
+    """{link: precio} de `cantidad` productos repartidos en el rango"""
+    rango = precio_max - precio_min + 1
+    return {
+        f"https://tienda.test/producto/p{n:05d}": precio_min + (n * paso) % rango
+        for n in range(cantidad)
+    }
+
+
+class TiendaFalsa:
+    """Varias categorías: deriva cada URL al SitioFalso de su categoría"""
+
+    def __init__(self, sitios):
+        # {url de categoría: SitioFalso}
+        self.sitios = sitios
+
+    def get(self, url, **kwargs):
+        for categoria_url, sitio in self.sitios.items():
+            if url.startswith(categoria_url):
+                return sitio.get(url, **kwargs)
+        raise AssertionError(f"URL fuera de las categorías simuladas: {url}")
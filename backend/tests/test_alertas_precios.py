@@ -0,0 +1,137 @@
+"""Motor de alertas de precio: media móvil, umbrales y cooldown"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from alertas_precios import MotorAlertas
+from models import EstadisticaPrecio, PriceAlert, Product, ProductoScraped, UmbralAlerta
+from scraper_service import TAMANO_LOTE_BD, ScraperService
+
+INICIO = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def silla(db):
+    product = Product(name="Silla Ejecutiva", category="Sillas", price=100.0)
+    db.add(product)
+    db.commit()
+    return product
+
+
+def motor(**por_defecto):
+    motor = MotorAlertas(alfa=0.5)
+    motor.por_defecto.update(
+        {"variacion_porcentaje": 10, "desviaciones": 0, "cooldown_minutos": 60, **por_defecto}
+    )
+    return motor
+
+
+def test_media_y_varianza_moviles_exponenciales(db, silla):
+    m = motor(variacion_porcentaje=1000)
+
+    for precio in (100.0, 110.0, 90.0):
+        m.observar_lote(db, [(silla.id, precio)], "scraping", INICIO)
+    db.commit()
+
+    estadistica = db.get(EstadisticaPrecio, silla.id)
+    # media: 100 -> 105 -> 97.5; varianza: 0 -> 25 -> 0.5 * (25 + 0.5 * 225)
+    assert estadistica.observaciones == 3
+    assert estadistica.media == pytest.approx(97.5)
+    assert estadistica.varianza == pytest.approx(68.75)
+    assert estadistica.ultimo_precio == 90.0
+
+
+def test_alerta_contra_catalogo_y_cooldown(db, silla):
+    m = motor()
+
+    primera = m.observar_lote(db, [(silla.id, 130.0)], "scraping", INICIO)
+    # Dentro del cooldown: se suprime aunque la variación siga alta
+    segunda = m.observar_lote(db, [(silla.id, 200.0)], "scraping", INICIO + timedelta(minutes=30))
+    tercera = m.observar_lote(db, [(silla.id, 300.0)], "scraping", INICIO + timedelta(minutes=61))
+    db.commit()
+
+    assert len(primera) == 1
+    assert primera[0].old_price == 100.0 and primera[0].new_price == 130.0
+    assert segunda == []
+    assert len(tercera) == 1
+    assert m.metricas == {"observaciones": 3, "alertas": 2, "suprimidas": 1}
+    assert db.query(PriceAlert).count() == 2
+
+
+def test_umbral_de_producto_sobre_categoria_y_por_defecto(db, silla):
+    db.add(UmbralAlerta(categoria="sillas", variacion_porcentaje=50))
+    db.commit()
+    m = motor()
+
+    assert m.umbral(db, silla.id, "Sillas")["variacion_porcentaje"] == 50
+    assert m.observar_lote(db, [(silla.id, 130.0)], "scraping", INICIO) == []
+
+    db.add(UmbralAlerta(product_id=silla.id, variacion_porcentaje=5, cooldown_minutos=0))
+    db.commit()
+    m.invalidar_umbrales()
+    umbral = m.umbral(db, silla.id, "Sillas")
+    assert umbral["variacion_porcentaje"] == 5
+    assert umbral["cooldown_minutos"] == 0
+    # La referencia ya es la media móvil (130)
+    assert len(m.observar_lote(db, [(silla.id, 140.0)], "scraping", INICIO)) == 1
+
+
+def test_regla_de_desviaciones(db, silla):
+    m = motor(variacion_porcentaje=1000, desviaciones=2)
+    for precio in (100.0, 102.0, 98.0, 101.0):
+        assert m.observar_lote(db, [(silla.id, precio)], "scraping", INICIO) == []
+
+    alertas = m.observar_lote(db, [(silla.id, 120.0)], "scraping", INICIO)
+
+    assert len(alertas) == 1
+
+
+def test_muchas_filas_enlazadas_en_varios_lotes_de_guardado(db, silla):
+    """Un mismo producto del catálogo visto en más de un lote de TAMANO_LOTE_BD"""
+    cantidad = TAMANO_LOTE_BD + 100
+    for n in range(cantidad):
+        db.add(
+            ProductoScraped(
+                nombre=f"Silla {n}", precio=100.0, categoria="Sillas de Oficina",
+                link=f"https://tienda.test/{n}", producto_id=silla.id,
+            )
+        )
+    db.commit()
+    productos = [
+        {
+            "nombre": f"Silla {n}", "precio": 120.0, "categoria": "Sillas de Oficina",
+            "link": f"https://tienda.test/{n}", "imagen": None, "fuente": "livingroom.com.bo",
+        }
+        for n in range(cantidad)
+    ]
+
+    ScraperService().guardar_productos(db, productos)
+    db.commit()
+
+    estadistica = db.query(EstadisticaPrecio).one()
+    assert estadistica.product_id == silla.id
+    assert estadistica.observaciones == cantidad
+
+
+def test_evaluar_variacion_tras_observar_sin_flush(db, silla):
+    m = motor()
+    m.observar_lote(db, [(silla.id, 100.0)], "scraping", INICIO)
+
+    alerta = m.evaluar_variacion(db, silla.id, "Sillas", 100.0, 150.0, "sugerencia")
+    db.commit()
+
+    assert alerta is not None
+    assert db.query(EstadisticaPrecio).count() == 1
+    # evaluar_variacion no toca la media móvil
+    assert db.get(EstadisticaPrecio, silla.id).observaciones == 1
+
+
+def test_endpoints_de_alertas_requieren_autenticacion():
+    from fastapi.testclient import TestClient
+
+    from main import app
+
+    cliente = TestClient(app)
+    for ruta in ("/api/prices/alerts/umbrales", "/api/prices/alerts/metricas"):
+        assert cliente.get(ruta).status_code == 401
@@ -0,0 +1,80 @@
+"""Caché de respuestas de GPT: TTL, límite de entradas y métricas"""
+
+import time
+
+import cache_gpt as modulo
+from cache_gpt import CacheGPT
+
+
+def _cache(tmp_path, **kwargs):
+    return CacheGPT(ruta=tmp_path / "cache.db", activa=True, **kwargs)
+
+
+def test_clave_estable_e_independiente_del_orden_de_parametros():
+    mensajes = [{"role": "user", "content": "mesa a 1200"}]
+    a = CacheGPT.clave("gpt", mensajes, max_tokens=10, temperature=0)
+    b = CacheGPT.clave("gpt", mensajes, temperature=0, max_tokens=10)
+    assert a == b
+    assert a != CacheGPT.clave("gpt", mensajes, max_tokens=11, temperature=0)
+    assert a != CacheGPT.clave("otro", mensajes, max_tokens=10, temperature=0)
+
+
+def test_guardar_y_obtener_entre_instancias(tmp_path):
+    cache = _cache(tmp_path)
+    assert cache.obtener("k") is None
+    cache.guardar("k", "respuesta", tokens=40)
+
+    # Otra instancia (otro proceso) lee del mismo archivo
+    otra = _cache(tmp_path)
+    assert otra.obtener("k") == "respuesta"
+    assert otra.metricas()["tokens_ahorrados"] == 40
+    assert cache.obtener("k") == "respuesta"
+    assert cache.metricas()["hits_memoria"] == 1
+
+
+def test_respuesta_vencida_se_descarta(tmp_path):
+    cache = _cache(tmp_path, ttl=60)
+    cache.guardar("k", "vieja")
+    cache._conexion().execute("UPDATE respuestas SET creado_en = ?", (time.time() - 120,))
+    cache._memoria.clear()
+
+    assert cache.obtener("k") is None
+    assert cache.metricas()["entradas"] == 0
+
+
+def test_purgar_conserva_las_mas_usadas(tmp_path):
+    cache = _cache(tmp_path, max_entradas=3)
+    for i in range(5):
+        cache.guardar(f"k{i}", str(i))
+    ahora = time.time()
+    for i in range(5):
+        cache._conexion().execute(
+            "UPDATE respuestas SET usado_en = ? WHERE clave = ?", (ahora + i, f"k{i}")
+        )
+
+    assert cache.purgar() == 2
+    cache._memoria.clear()
+    assert [cache.obtener(f"k{i}") for i in range(5)] == [None, None, "2", "3", "4"]
+
+
+def test_purga_automatica_cada_n_escrituras(tmp_path, monkeypatch):
+    monkeypatch.setattr(modulo, "_PURGAR_CADA", 4)
+    cache = _cache(tmp_path, max_entradas=2)
+    for i in range(4):
+        cache.guardar(f"k{i}", str(i))
+    assert cache.metricas()["entradas"] == 2
+
+
+def test_metricas_y_cache_inactiva(tmp_path):
+    cache = _cache(tmp_path)
+    cache.guardar("k", "r")
+    cache.obtener("k")
+    cache.obtener("no")
+    metricas = cache.metricas()
+    assert (metricas["hits"], metricas["misses"], metricas["guardadas"]) == (1, 1, 1)
+    assert metricas["tasa_aciertos"] == 0.5
+
+    inactiva = CacheGPT(ruta=tmp_path / "nada.db", activa=False)
+    inactiva.guardar("k", "r")
+    assert inactiva.obtener("k") is None
+    assert not (tmp_path / "nada.db").exists()
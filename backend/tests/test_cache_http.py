@@ -0,0 +1,93 @@
+"""Caché HTTP en disco del scraping: revalidación, vencimiento y tamaño máximo"""
+
+import json
+import time
+
+import requests
+
+import cache_http as modulo
+from cache_http import HIT, MISS, REVALIDADO, CacheHTTP
+
+
+class Servidor:
+    """Sesión falsa: responde 304 si el ETag coincide"""
+
+    def __init__(self, etag=None, tamano=100):
+        self.etag = etag
+        self.tamano = tamano
+        self.peticiones = 0
+
+    def get(self, url, timeout=None, headers=None, **kwargs):
+        self.peticiones += 1
+        response = requests.Response()
+        response.url = url
+        if self.etag and (headers or {}).get("If-None-Match") == self.etag:
+            response.status_code = 304
+            response._content = b""
+            return response
+        response.status_code = 200
+        response._content = b"x" * self.tamano
+        if self.etag:
+            response.headers["ETag"] = self.etag
+        return response
+
+
+def envejecer(cache, segundos):
+    for ruta in cache.directorio.glob("*.json"):
+        meta = json.loads(ruta.read_text())
+        meta["guardado_en"] -= segundos
+        ruta.write_text(json.dumps(meta))
+
+
+def test_hit_sin_validadores_y_revalidacion_con_etag(tmp_path):
+    cache = CacheHTTP(tmp_path, ttl=60, activa=True)
+    sin_etag, con_etag = Servidor(), Servidor(etag='"v1"')
+
+    assert cache.obtener(sin_etag, "https://a.test/1")[1] == MISS
+    assert cache.obtener(sin_etag, "https://a.test/1")[1] == HIT
+    assert sin_etag.peticiones == 1
+
+    assert cache.obtener(con_etag, "https://a.test/2")[1] == MISS
+    response, estado = cache.obtener(con_etag, "https://a.test/2")
+    assert estado == REVALIDADO
+    assert response.content == b"x" * 100
+
+
+def test_purgar_elimina_vencidas_y_respeta_el_tamano_maximo(tmp_path):
+    cache = CacheHTTP(tmp_path, ttl=60, activa=True, retencion=3600, max_mb=1)
+    cache.obtener(Servidor(), "https://a.test/sin-validadores")
+    cache.obtener(Servidor(etag='"v1"'), "https://a.test/con-etag")
+    envejecer(cache, 120)
+
+    # Sin validadores y pasado el TTL ya no sirve; con ETag se puede revalidar
+    assert cache.purgar() == 1
+    assert cache.metricas()["entradas"] == 1
+
+    envejecer(cache, 3600)
+    assert cache.purgar() == 1
+    assert cache.metricas()["entradas"] == 0
+
+    grande = Servidor(etag='"v1"', tamano=400 * 1024)
+    for n in range(4):
+        cache.obtener(grande, f"https://a.test/grande/{n}")
+        time.sleep(0.01)
+    assert cache.purgar() == 2
+    # Se conservan las más recientes
+    assert cache.obtener(grande, "https://a.test/grande/3")[1] == REVALIDADO
+    assert cache.obtener(grande, "https://a.test/grande/0")[1] == MISS
+
+
+def test_se_purga_al_escribir(tmp_path, monkeypatch):
+    monkeypatch.setattr(modulo, "_PURGAR_CADA", 5)
+    cache = CacheHTTP(tmp_path, ttl=60, activa=True, max_mb=250 / (1024 * 1024))
+    servidor = Servidor(tamano=100)
+
+    for n in range(10):
+        cache.obtener(servidor, f"https://a.test/{n}")
+
+    # Tras la décima escritura el directorio vuelve a quedar bajo el límite
+    assert cache.metricas()["megabytes"] * 1024 * 1024 <= 250
+    entradas = cache.metricas()["entradas"]
+    assert entradas < 10
+    assert cache.limpiar() == entradas
+    assert cache.metricas()["entradas"] == 0
@@ -0,0 +1,131 @@
+"""Historial de conversaciones: límites por número y copias en memoria entre workers"""
+
+import pytest
+
+from conversaciones import HistorialConversaciones
+from prompt_conversacion import TOKENS_POR_MENSAJE, contar_tokens
+
+
+@pytest.fixture
+def url(tmp_path):
+    return f"sqlite:///{tmp_path / 'conversaciones.db'}"
+
+
+def _mensajes(historial, numero):
+    return [m["mensaje"] for m in historial.obtener(numero)]
+
+
+def test_recorta_por_cantidad_de_mensajes(url):
+    historial = HistorialConversaciones(url=url, max_mensajes=3, max_tokens=10_000)
+    for i in range(5):
+        historial.agregar("591", f"mensaje {i}")
+
+    assert _mensajes(historial, "591") == ["mensaje 2", "mensaje 3", "mensaje 4"]
+    assert historial.metricas["recortados"] == 2
+    # El recorte quedó en la tabla, no solo en memoria
+    assert _mensajes(HistorialConversaciones(url=url), "591") == _mensajes(historial, "591")
+
+
+def test_recorta_por_tokens_y_conserva_el_ultimo(url):
+    texto = "palabra " * 20
+    por_mensaje = contar_tokens(texto) + TOKENS_POR_MENSAJE
+    historial = HistorialConversaciones(url=url, max_mensajes=50, max_tokens=por_mensaje * 2)
+    for i in range(4):
+        historial.agregar("591", f"{texto}{i}")
+
+    assert [m[-1] for m in _mensajes(historial, "591")] == ["2", "3"]
+
+    # Un mensaje que solo ya excede el presupuesto se guarda igual
+    historial.agregar("591", "x" * (por_mensaje * 40))
+    assert len(_mensajes(historial, "591")) == 1
+
+
+def test_mensaje_de_otro_worker_invalida_la_copia_en_memoria(url):
+    a = HistorialConversaciones(url=url)
+    # Sin tiempo de validez: cada lectura compara el último id con la tabla
+    b = HistorialConversaciones(url=url, validez=0)
+    a.agregar("591", "hola")
+    assert _mensajes(b, "591") == ["hola"]
+
+    a.agregar("591", "precio?", tipo="bot")
+    assert _mensajes(b, "591") == ["hola", "precio?"]
+    assert b.metricas["lecturas_bd"] == 2
+
+    _mensajes(b, "591")
+    assert b.metricas["aciertos"] == 1
+
+
+def test_limpiar_en_otro_worker_invalida_el_resumen(url):
+    a = HistorialConversaciones(url=url)
+    b = HistorialConversaciones(url=url)
+    for i in range(3):
+        a.agregar("591", f"mensaje {i}")
+    hasta_id = a.obtener("591")[1]["id"]
+    a.guardar_resumen("591", hasta_id, "mesa a 1200")
+    assert b.obtener_resumen("591") == (hasta_id, "mesa a 1200")
+
+    a.limpiar("591")
+    assert b.obtener_resumen("591") == (0, None)
+
+    # Mensajes nuevos tras limpiar no reviven el resumen anterior
+    a.agregar("591", "conversación nueva")
+    assert b.obtener_resumen("591") == (0, None)
+
+
+def test_resumen_de_otro_worker_se_relee_al_cambiar_los_mensajes(url):
+    a = HistorialConversaciones(url=url)
+    b = HistorialConversaciones(url=url)
+    a.agregar("591", "uno")
+    a.guardar_resumen("591", 1, "primero")
+    assert b.obtener_resumen("591") == (1, "primero")
+
+    a.agregar("591", "dos")
+    a.guardar_resumen("591", 2, "segundo")
+    assert b.obtener_resumen("591") == (2, "segundo")
+    assert a.obtener_resumen("591") == (2, "segundo")
+
+
+def test_copia_vigente_y_agregar_sin_releer_el_historial(url):
+    from sqlalchemy import event
+
+    historial = HistorialConversaciones(url=url, max_mensajes=3, validez=60)
+    sentencias = []
+    event.listen(
+        historial._motor(), "before_cursor_execute",
+        lambda conexion, cursor, sql, *args: sentencias.append(sql.split()[0].upper()),
+    )
+    for i in range(5):
+        historial.agregar("591", f"mensaje {i}")
+    for _ in range(3):
+        assert _mensajes(historial, "591") == ["mensaje 2", "mensaje 3", "mensaje 4"]
+
+    # Por mensaje: INSERT, id anterior y a lo sumo un DELETE; obtener no consulta
+    assert sentencias.count("INSERT") == 5
+    assert sentencias.count("SELECT") == 5
+    assert sentencias.count("DELETE") == 2
+    assert historial.metricas["lecturas_bd"] == 0
+    assert historial.metricas["recortados"] == 2
+    assert _mensajes(HistorialConversaciones(url=url), "591") == _mensajes(historial, "591")
+
+
+def test_copia_de_otro_worker_se_extiende_leyendo_solo_lo_reciente(url):
+    a = HistorialConversaciones(url=url, max_mensajes=3)
+    b = HistorialConversaciones(url=url, max_mensajes=3)
+    b.agregar("591", "mensaje 0")
+    for i in range(1, 4):
+        a.agregar("591", f"mensaje {i}")
+
+    # La copia de b quedó atrás: relee los más nuevos y recorta
+    b.agregar("591", "mensaje 4")
+    assert b.metricas["lecturas_bd"] == 1
+    assert _mensajes(b, "591") == ["mensaje 2", "mensaje 3", "mensaje 4"]
+    assert _mensajes(HistorialConversaciones(url=url), "591") == _mensajes(b, "591")
+
+
+def test_pool_con_los_limites_de_database(url):
+    from database import engine
+
+    motor = HistorialConversaciones(url=url)._motor()
+    assert motor.pool.size() == engine.pool.size()
+    assert motor.pool._max_overflow == engine.pool._max_overflow
+    assert motor.pool._timeout == engine.pool._timeout
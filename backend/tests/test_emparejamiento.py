@@ -0,0 +1,161 @@
+"""Emparejamiento con el catálogo: umbrales, cola de revisión y pasadas incrementales"""
+
+import pytest
+
+import emparejamiento
+from emparejamiento import EmparejadorProductos
+from models import EmparejamientoAvance, EmparejamientoRevision, Product, ProductoScraped
+
+CATALOGO = [
+    "Silla Ejecutiva Gerencial",
+    "Mesa Redonda Bar",
+    "Escritorio en L Melamina",
+    "Silla Ergonómica Negra",
+    "Silla Ergonómica Negro",
+]
+
+
+@pytest.fixture
+def catalogo(db):
+    productos = [Product(name=nombre, category="Oficina", price=500.0) for nombre in CATALOGO]
+    db.add_all(productos)
+    db.commit()
+    return {p.name: p.id for p in productos}
+
+
+def scrapeado(db, nombre, precio=480.0):
+    fila = ProductoScraped(
+        nombre=nombre, precio=precio, categoria="Muebles de Oficina",
+        link=f"https://tienda.test/{nombre}", fuente="livingroom.com.bo",
+    )
+    db.add(fila)
+    db.commit()
+    return fila
+
+
+def enlace(db, fila):
+    db.expire_all()
+    return db.get(ProductoScraped, fila.id).producto_id
+
+
+def test_enlaza_sobre_el_umbral_y_descarta_lo_lejano(db, catalogo):
+    exacta = scrapeado(db, "SILLA EJECUTIVA GERENCIAL")
+    escritorio = scrapeado(db, "Escritorio L melamina")
+    lampara = scrapeado(db, "Lámpara de pie")
+
+    estadisticas = EmparejadorProductos().emparejar(db, origenes=["scraping"])
+
+    assert estadisticas["scraping"] == {"evaluados": 3, "enlazados": 2, "en_revision": 0}
+    assert enlace(db, exacta) == catalogo["Silla Ejecutiva Gerencial"]
+    assert enlace(db, escritorio) == catalogo["Escritorio en L Melamina"]
+    assert enlace(db, lampara) is None
+    assert db.query(EmparejamientoRevision).count() == 0
+
+
+def test_casos_dudosos_van_a_revision(db, catalogo):
+    # Similitud intermedia (entre MATCH_UMBRAL_REVISION y MATCH_UMBRAL_AUTO)
+    intermedia = scrapeado(db, "Silla ejecutiva gerencial cromada")
+    # Dos candidatos empatados: no se enlaza aunque supere el umbral
+    empate = scrapeado(db, "Silla Ergonómica Negr")
+
+    estadisticas = EmparejadorProductos().emparejar(db, origenes=["scraping"])
+
+    assert estadisticas["scraping"]["en_revision"] == 2
+    assert enlace(db, intermedia) is None and enlace(db, empate) is None
+    revisiones = {r.registro_id: r for r in db.query(EmparejamientoRevision)}
+    assert revisiones[intermedia.id].producto_id == catalogo["Silla Ejecutiva Gerencial"]
+    assert {revisiones[empate.id].producto_id, revisiones[empate.id].alternativa_id} == {
+        catalogo["Silla Ergonómica Negra"], catalogo["Silla Ergonómica Negro"]
+    }
+    assert revisiones[empate.id].estado == "pendiente"
+
+
+def test_pasadas_incrementales_con_avance_persistente(db, catalogo):
+    scrapeado(db, "SILLA EJECUTIVA GERENCIAL")
+    scrapeado(db, "Lámpara de pie")
+    emparejador = EmparejadorProductos()
+    assert emparejador.emparejar(db)["scraping"]["evaluados"] == 2
+    assert emparejador.emparejar(db)["scraping"]["evaluados"] == 0
+
+    nueva = scrapeado(db, "MESA REDONDA BAR")
+    # Otro worker (o un reinicio) retoma el avance guardado en la BD
+    otro = EmparejadorProductos()
+    assert otro.emparejar(db)["scraping"]["evaluados"] == 1
+    assert enlace(db, nueva) == catalogo["Mesa Redonda Bar"]
+    avance = db.get(EmparejamientoAvance, "scraping")
+    assert avance.evaluados_hasta == nueva.id
+    assert EmparejadorProductos().emparejar(db)["scraping"]["evaluados"] == 0
+
+    # completo=True vuelve a mirar la fila sin coincidencia
+    assert otro.emparejar(db, completo=True)["scraping"]["evaluados"] == 1
+
+    # Un producto nuevo en el catálogo reabre las filas sin enlace
+    db.add(Product(name="Lámpara de Pie", category="Oficina", price=80.0))
+    db.commit()
+    estadisticas = emparejador.emparejar(db)["scraping"]
+    assert estadisticas == {"evaluados": 1, "enlazados": 1, "en_revision": 0}
+
+
+def test_emparejar_nuevos_usa_su_propia_sesion(db, catalogo):
+    fila = scrapeado(db, "SILLA EJECUTIVA GERENCIAL")
+
+    emparejamiento.emparejar_nuevos(["scraping"])
+
+    assert enlace(db, fila) == catalogo["Silla Ejecutiva Gerencial"]
+    assert db.get(EmparejamientoAvance, "scraping").evaluados_hasta == fila.id
+    assert db.get(EmparejamientoAvance, "whatsapp") is None
+
+
+def test_barrido_sincronico_enlaza_en_segundo_plano(api, db, monkeypatch):
+    import main
+    from sitio_falso import SitioFalso
+
+    producto = Product(name="Producto p00003", category="Sillas", price=100.0)
+    db.add(producto)
+    db.commit()
+    precios = {f"https://tienda.test/producto/p{n:05d}": 10 + n for n in range(5)}
+    monkeypatch.setattr(main.scraper_service, "http", SitioFalso(precios))
+    monkeypatch.setattr(emparejamiento, "emparejador", EmparejadorProductos())
+
+    respuesta = api.post(
+        "/api/scraping/rango",
+        json={"categoria": 4, "min_precio": 0, "max_precio": 30, "delay": 0, "modo": "biseccion"},
+    )
+
+    assert respuesta.status_code == 200, respuesta.text
+    assert respuesta.json()["total_productos"] == 5
+    fila = db.query(ProductoScraped).filter(
+        ProductoScraped.link == "https://tienda.test/producto/p00003"
+    ).one()
+    assert fila.producto_id == producto.id
+
+
+def cotizacion(api, id, nombre, precio):
+    return api.post(
+        "/api/whatsapp/productos",
+        json={
+            "id": id, "timestamp": id, "proveedor_numero": "59170000000",
+            "proveedor_nombre": "Suplidor 1", "nombre_producto": nombre,
+            "tipo_producto": "silla", "precio": precio, "tiene_precio": True,
+            "mensaje_completo": f"{nombre} a {precio} Bs", "fecha": "2024-01-01T10:00:00",
+        },
+    )
+
+
+def test_cotizacion_de_whatsapp_se_enlaza_y_genera_alerta(api, db, catalogo, monkeypatch):
+    from models import PriceAlert, WhatsAppProductoCotizado
+
+    monkeypatch.setattr(emparejamiento, "emparejador", EmparejadorProductos())
+    silla = catalogo["Silla Ejecutiva Gerencial"]
+
+    assert cotizacion(api, 1_700_000_002_000, "Lámpara de pie", 90.0).status_code == 200
+    emparejamiento.emparejador.emparejar(db, origenes=["whatsapp"])
+    # Llega después con un timestamp anterior al avance guardado
+    respuesta = cotizacion(api, 1_700_000_001_000, "SILLA EJECUTIVA GERENCIAL", 700.0)
+
+    assert respuesta.status_code == 200, respuesta.text
+    db.expire_all()
+    assert db.get(WhatsAppProductoCotizado, 1_700_000_001_000).producto_id == silla
+    alerta = db.query(PriceAlert).filter(PriceAlert.product_id == silla).one()
+    assert (alerta.old_price, alerta.new_price) == (500.0, 700.0)
+    assert db.get(EmparejamientoAvance, "whatsapp").evaluados_hasta == 1_700_000_002_000
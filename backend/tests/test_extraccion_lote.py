@@ -0,0 +1,116 @@
+"""Extracción de precios por lotes: regex primero, el resto agrupado en llamadas a la IA"""
+
+import asyncio
+import io
+import json
+
+import pytest
+
+import extraer_precios_lote
+from gpt_client import GPTClient, gpt_client
+
+CON_PRECIO = ["Mesa de reuniones a 1200 Bs", "Escritorio en L 850 Bs"]
+SIN_PRECIO = ["la mesa cuesta mil doscientos", "tenemos escritorios disponibles"]
+
+
+def mensajes():
+    textos = [CON_PRECIO[0], SIN_PRECIO[0], CON_PRECIO[1], SIN_PRECIO[1], SIN_PRECIO[0]]
+    return [{"id": n, "mensaje": texto} for n, texto in enumerate(textos, 1)]
+
+
+@pytest.fixture
+def ia(monkeypatch):
+    """Reemplaza llamar_openai_async del cliente global; devuelve las llamadas hechas"""
+    llamadas = []
+
+    async def llamar(mensajes_ia, **kwargs):
+        llamadas.append((mensajes_ia, kwargs))
+        return json.dumps({"resultados": [
+            {"n": 1, "tienePrecio": True, "precios": [1200], "productos": ["mesa"]},
+            {"n": 2, "tienePrecio": False, "precios": [], "productos": ["escritorio"]},
+        ]})
+
+    monkeypatch.setattr(gpt_client, "api_key", "sk-pruebas")
+    monkeypatch.setattr(gpt_client, "llamar_openai_async", llamar)
+    return llamadas
+
+
+async def recolectar(lineas):
+    return [linea async for linea in lineas]
+
+
+def test_regex_evita_la_ia_y_el_resto_va_en_una_llamada(ia):
+    lineas = asyncio.run(recolectar(gpt_client.extraer_precios_lote(mensajes(), tamano_lote=20)))
+
+    # Una sola llamada con los dos textos sin precio (el repetido se analiza una vez)
+    assert len(ia) == 1
+    contenido = ia[0][0][1]["content"]
+    assert contenido == f"[1] {SIN_PRECIO[0]}\n\n[2] {SIN_PRECIO[1]}"
+    assert ia[0][1]["formato_json"] is True
+
+    por_id = {linea["id"]: linea for linea in lineas[:-1]}
+    assert {por_id[1]["metodo"], por_id[3]["metodo"]} == {"regex"}
+    assert por_id[2]["metodo"] == por_id[5]["metodo"] == "ia"
+    assert por_id[2]["valores"] == [1200.0] and por_id[5]["tienePrecio"] is True
+    assert por_id[4]["tienePrecio"] is False
+    # Los aciertos de regex salen antes que los de la IA; el resumen al final
+    assert [linea["id"] for linea in lineas[:2]] == [1, 3]
+    resumen = lineas[-1]
+    assert resumen["status"] == "resumen"
+    conteos = ("total", "con_precio", "regex", "ia", "errores", "llamadas_ia")
+    assert [resumen[k] for k in conteos] == [5, 4, 2, 3, 0, 1]
+
+
+def test_lotes_por_tamano_y_errores_con_el_resultado_de_regex(monkeypatch):
+    cliente = GPTClient()
+    monkeypatch.setattr(cliente, "api_key", "sk-pruebas")
+    llamadas = []
+
+    async def falla(mensajes_ia, **kwargs):
+        llamadas.append(mensajes_ia)
+        raise TimeoutError("OpenAI no respondió dentro del tiempo límite")
+
+    monkeypatch.setattr(cliente, "llamar_openai_async", falla)
+    lineas = asyncio.run(recolectar(cliente.extraer_precios_lote(mensajes(), tamano_lote=1)))
+
+    assert len(llamadas) == 2
+    errores = [linea for linea in lineas if linea["status"] == "error"]
+    assert sorted(linea["id"] for linea in errores) == [2, 4, 5]
+    assert all(linea["metodo"] == "regex" for linea in errores)
+    assert all("tiempo límite" in linea["detail"] for linea in errores)
+    assert lineas[-1]["errores"] == 3 and lineas[-1]["llamadas_ia"] == 2
+
+
+def test_solo_regex_no_llama_a_la_ia(ia):
+    lineas = asyncio.run(recolectar(gpt_client.extraer_precios_lote(mensajes(), usar_ia=False)))
+
+    assert ia == []
+    assert lineas[-1]["regex"] == 5 and lineas[-1]["con_precio"] == 2
+
+
+def test_endpoint_responde_ndjson(api, ia):
+    respuesta = api.post("/api/gpt/extraer-precios/lote", json={"mensajes": mensajes()})
+
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-type"].startswith("application/x-ndjson")
+    lineas = [json.loads(linea) for linea in respuesta.text.splitlines()]
+    assert len(lineas) == 6
+    assert sorted(linea["id"] for linea in lineas[:-1]) == [1, 2, 3, 4, 5]
+    assert lineas[-1]["status"] == "resumen" and lineas[-1]["llamadas_ia"] == 1
+
+
+def test_script_escribe_ndjson_y_devuelve_el_resumen(ia, tmp_path):
+    ruta = tmp_path / "cotizaciones.json"
+    ruta.write_text(json.dumps({"cotizaciones": [
+        {"id": m["id"], "mensajeCompleto": m["mensaje"]} for m in mensajes()
+    ] + [{"id": 99, "mensajeCompleto": ""}]}), encoding="utf-8")
+    salida = io.StringIO()
+
+    resumen = asyncio.run(
+        extraer_precios_lote.procesar(extraer_precios_lote.mensajes_json(ruta), salida)
+    )
+
+    lineas = [json.loads(linea) for linea in salida.getvalue().splitlines()]
+    assert len(lineas) == 6 and lineas[-1] == resumen
+    assert resumen["total"] == 5 and resumen["ia"] == 3
+    assert len(ia) == 1
@@ -0,0 +1,91 @@
+"""Extractor de una pasada comparado con los patrones anteriores (benchmark_extraccion.anterior)"""
+
+import json
+
+import pytest
+
+from benchmark_extraccion import COTIZACIONES, anterior, valores
+from extraccion_mensajes import extraer, extraer_precios, patron_sin_respuesta
+
+CASOS = [
+    "Las sillas cuestan $500 y los escritorios $1.200,50",
+    "Precio 350 bs por unidad, tenemos 47 disponibles",
+    "El armario sale 1200 dólares, la mesa 800 dolares",
+    "Costo aproximado: desde 150 hasta 300 pesos",
+    "entre $90 y $120 según el modelo de estante",
+    "Cajonera de oficina a 576 bolivianos",
+    "Tengo 5 sillas a 500 dólar cada una",
+    "precio 2.500 Bs. el escritorio en L",
+    "US$ 99,90 la silla ergonómica",
+    "aprox 1,500.75 soles",
+    "Hola, enseguida te contesto",
+    "Recibido, gracias",
+    "No tenemos stock por ahora",
+    "",
+]
+
+
+def _mensajes_guardados():
+    if not COTIZACIONES.exists():
+        return []
+    datos = json.loads(COTIZACIONES.read_text(encoding="utf-8"))
+    return [c["mensajeCompleto"] for c in datos.get("cotizaciones", []) if c.get("mensajeCompleto")]
+
+
+@pytest.mark.parametrize("mensaje", CASOS + _mensajes_guardados())
+def test_no_pierde_nada_de_lo_que_encontraban_los_patrones_anteriores(mensaje):
+    precios_a, productos_a, sin_a = anterior(mensaje)
+    resultado = extraer(mensaje)
+
+    assert valores(precios_a) <= valores(resultado["precios"])
+    assert set(productos_a) == set(resultado["productos"])
+    assert sin_a == (patron_sin_respuesta(mensaje) is not None)
+
+
+@pytest.mark.parametrize(
+    "mensaje, precios, valores_esperados, monedas",
+    [
+        ("$1.200,50 la silla", ["1.200,50"], [1200.5], ["USD"]),
+        ("aprox 1,500.75 soles", ["1,500.75"], [1500.75], ["PEN"]),
+        ("precio 2.500 Bs. el escritorio", ["2.500"], [2500.0], ["BOB"]),
+        ("576 bolivianos o 80 dólares", ["576", "80"], [576.0, 80.0], ["BOB", "USD"]),
+        ("US$ 99,90 y $99,90", ["99,90"], [99.9], ["USD"]),
+    ],
+)
+def test_normaliza_valores_y_monedas(mensaje, precios, valores_esperados, monedas):
+    resultado = extraer(mensaje)
+    assert resultado["precios"] == precios
+    assert resultado["valores"] == valores_esperados
+    assert resultado["monedas"] == monedas
+
+
+def test_cantidades_no_se_toman_como_precios():
+    resultado = extraer("Tenemos 47 disponibles y 5 sillas, precio 30 unidades aparte de $120")
+    assert resultado["precios"] == ["120"]
+    assert resultado["cantidades"] == [
+        {"cantidad": 47, "unidad": "disponibles"},
+        {"cantidad": 5, "unidad": "silla"},
+        {"cantidad": 30, "unidad": "unidades"},
+    ]
+    assert resultado["productos"] == ["silla"]
+
+
+def test_formato_de_extraer_precios():
+    sin_precio = extraer_precios("Hola, ¿qué muebles de oficina buscan?")
+    assert sin_precio["tienePrecio"] is False
+    assert sin_precio["productos"] == ["oficina"]
+    assert sin_precio["metodo"] == "regex"
+    assert extraer_precios("mesa a $300")["tienePrecio"] is True
+
+
+@pytest.mark.parametrize(
+    "mensaje, patron",
+    [
+        ("Dame un minuto y te paso los precios", "dame un minuto"),
+        ("ENTENDIDO", "entendido"),
+        ("El escritorio cuesta $400", None),
+        (None, None),
+    ],
+)
+def test_patron_sin_respuesta(mensaje, patron):
+    assert patron_sin_respuesta(mensaje) == patron
@@ -0,0 +1,173 @@
+"""Camino async de OpenAI: ciclo de vida del cliente HTTP"""
+
+import asyncio
+import json
+import threading
+
+import httpx
+import pytest
+
+from gpt_client import GPTClient
+
+
+def test_cerrar_cierra_el_cliente_en_su_loop():
+    cliente = GPTClient()
+
+    async def usar_y_cerrar():
+        http, _ = cliente._recursos_async()
+        await cliente.cerrar()
+        return http
+
+    http = asyncio.run(usar_y_cerrar())
+
+    assert http.is_closed
+    assert cliente._http is None
+
+
+def test_al_cambiar_de_loop_cierra_el_cliente_anterior_en_el_suyo():
+    cliente = GPTClient()
+    loop_viejo = asyncio.new_event_loop()
+    hilo = threading.Thread(target=loop_viejo.run_forever, daemon=True)
+    hilo.start()
+
+    async def recursos():
+        return cliente._recursos_async()[0]
+
+    try:
+        viejo = asyncio.run_coroutine_threadsafe(recursos(), loop_viejo).result()
+
+        async def en_otro_loop():
+            nuevo = cliente._recursos_async()[0]
+            await cliente.cerrar()
+            return nuevo
+
+        nuevo = asyncio.run(en_otro_loop())
+        # El cierre del anterior corre en su propio loop
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), loop_viejo).result()
+
+        assert nuevo is not viejo
+        assert viejo.is_closed
+        assert nuevo.is_closed
+    finally:
+        loop_viejo.call_soon_threadsafe(loop_viejo.stop)
+        hilo.join()
+        loop_viejo.close()
+
+
+def test_cache_de_llamadas_async_fuera_del_event_loop(monkeypatch, tmp_path):
+    import httpx
+
+    import gpt_client as modulo
+    from cache_gpt import CacheGPT
+
+    cache = CacheGPT(ruta=tmp_path / "cache.db", activa=True)
+    hilos = []
+
+    def registrar(metodo):
+        def envoltura(*args, **kwargs):
+            hilos.append(threading.get_ident())
+            return metodo(*args, **kwargs)
+        return envoltura
+
+    monkeypatch.setattr(cache, "obtener", registrar(cache.obtener))
+    monkeypatch.setattr(cache, "guardar", registrar(cache.guardar))
+    monkeypatch.setattr(modulo, "cache_gpt", cache)
+
+    peticiones = []
+
+    def responder(request):
+        peticiones.append(request)
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": "{\"precio\": 1200}"}}],
+            "usage": {"total_tokens": 55},
+        })
+
+    cliente_original = httpx.AsyncClient
+    monkeypatch.setattr(
+        httpx, "AsyncClient",
+        lambda **kwargs: cliente_original(transport=httpx.MockTransport(responder), **kwargs),
+    )
+    cliente = GPTClient()
+    mensajes = [{"role": "user", "content": "mesa a 1200"}]
+
+    async def dos_llamadas():
+        try:
+            primera = await cliente.llamar_openai_async(mensajes, cachear=True, sanitizar=False)
+            segunda = await cliente.llamar_openai_async(mensajes, cachear=True, sanitizar=False)
+            return primera, segunda, threading.get_ident()
+        finally:
+            await cliente.cerrar()
+
+    primera, segunda, hilo_loop = asyncio.run(dos_llamadas())
+
+    assert primera == segunda == "{\"precio\": 1200}"
+    assert len(peticiones) == 1
+    assert cache.metricas()["tokens_ahorrados"] == 55
+    # obtener, guardar, obtener: ninguna en el hilo del event loop
+    assert len(hilos) == 3
+    assert hilo_loop not in hilos
+
+
+def openai_falso(monkeypatch, responder):
+    """Redirige el cliente async de GPTClient a un transporte en memoria"""
+    cliente_original = httpx.AsyncClient
+    monkeypatch.setattr(
+        httpx, "AsyncClient",
+        lambda **kwargs: cliente_original(transport=httpx.MockTransport(responder), **kwargs),
+    )
+
+
+def llamar_json(cliente, veces=1):
+    async def llamadas():
+        try:
+            return [
+                await cliente.llamar_openai_async(
+                    [{"role": "user", "content": "mesa a 1200"}], formato_json=True, sanitizar=False
+                )
+                for _ in range(veces)
+            ]
+        finally:
+            await cliente.cerrar()
+
+    return asyncio.run(llamadas())
+
+
+def test_sin_modo_json_repite_sin_response_format(monkeypatch):
+    cuerpos = []
+
+    def responder(request):
+        cuerpo = json.loads(request.content)
+        cuerpos.append(cuerpo)
+        if "response_format" in cuerpo:
+            return httpx.Response(400, json={"error": {
+                "message": "'response_format' of type 'json_object' is not supported with this model.",
+                "param": "response_format",
+            }})
+        return httpx.Response(200, json={"choices": [{"message": {"content": "{}"}}]})
+
+    openai_falso(monkeypatch, responder)
+    cliente = GPTClient()
+
+    assert llamar_json(cliente, veces=2) == ["{}", "{}"]
+    assert cliente._json_nativo is False
+    # La segunda llamada ya no pide el modo JSON
+    assert ["response_format" in cuerpo for cuerpo in cuerpos] == [True, False, False]
+
+
+def test_otro_400_no_desactiva_el_modo_json(monkeypatch):
+    cuerpos = []
+
+    def responder(request):
+        cuerpos.append(json.loads(request.content))
+        return httpx.Response(400, json={"error": {
+            "message": "This model's maximum context length is 4097 tokens.",
+            "param": "messages",
+        }})
+
+    openai_falso(monkeypatch, responder)
+    cliente = GPTClient()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        llamar_json(cliente)
+    assert cliente._json_nativo is True
+    assert len(cuerpos) == 1
@@ -0,0 +1,133 @@
+"""Guardado en lote de productos scrapeados (upsert por link)"""
+
+from datetime import datetime, timezone
+
+from models import ProductoScraped
+from scraper_service import TAMANO_LOTE_BD, ScraperService
+
+
+def producto(n, precio=100.0, nombre=None, imagen=None):
+    return {
+        "nombre": nombre or f"Silla {n}",
+        "precio": precio,
+        "categoria": "Sillas de Oficina",
+        "link": f"https://tienda.test/producto/{n}",
+        "imagen": imagen,
+        "fuente": "livingroom.com.bo",
+    }
+
+
+def test_upsert_inserta_y_actualiza_solo_lo_que_cambio(db):
+    scraper = ScraperService()
+    conteos = scraper.guardar_productos(db, [producto(n) for n in range(5)])
+    db.commit()
+    assert conteos == {"nuevos": 5, "duplicados": 0, "actualizados": 0}
+
+    antes = {p.link: p.fecha_scraping for p in db.query(ProductoScraped)}
+    segunda = [
+        producto(0, precio=120.0),
+        producto(1, nombre="Silla 1 ergonómica"),
+        producto(2),
+        producto(3),
+        producto(4),
+        producto(5),
+    ]
+    conteos = scraper.guardar_productos(db, segunda)
+    db.commit()
+    db.expire_all()
+
+    assert conteos == {"nuevos": 1, "duplicados": 5, "actualizados": 2}
+    filas = {p.link: p for p in db.query(ProductoScraped)}
+    assert len(filas) == 6
+    assert filas["https://tienda.test/producto/0"].precio == 120.0
+    assert filas["https://tienda.test/producto/1"].nombre == "Silla 1 ergonómica"
+    assert filas["https://tienda.test/producto/1"].nombre_normalizado == "silla 1 ergonomica"
+    assert filas["https://tienda.test/producto/5"].nombre_normalizado == "silla 5"
+    # Las filas sin cambios no se reescriben (el ON CONFLICT lleva WHERE)
+    for n in (2, 3, 4):
+        link = f"https://tienda.test/producto/{n}"
+        assert filas[link].fecha_scraping == antes[link]
+
+
+def test_upsert_reparte_en_lotes(db):
+    scraper = ScraperService()
+    cantidad = TAMANO_LOTE_BD * 2 + 7
+    conteos = scraper.guardar_productos(db, [producto(n) for n in range(cantidad)])
+    db.commit()
+
+    assert conteos["nuevos"] == cantidad
+    assert db.query(ProductoScraped).count() == cantidad
+
+
+def derivados(nombre):
+    return {
+        "nombre_normalizado": nombre.lower(),
+        "fecha_scraping": datetime.now(timezone.utc),
+    }
+
+
+def test_upsert_fila_por_fila_en_otros_motores(db, monkeypatch):
+    """Motores sin ON CONFLICT usan el ORM con el mismo resultado"""
+    scraper = ScraperService()
+    scraper.guardar_productos(db, [producto(0), producto(1)])
+    db.commit()
+
+    monkeypatch.setattr(db.get_bind().dialect, "name", "otro")
+    scraper._upsert_productos(
+        db,
+        [
+            {**producto(1, precio=90.0), **derivados("Silla 1")},
+            {**producto(2), **derivados("Silla 2")},
+        ],
+    )
+    db.commit()
+
+    precios = {p.link: p.precio for p in db.query(ProductoScraped)}
+    assert precios == {
+        "https://tienda.test/producto/0": 100.0,
+        "https://tienda.test/producto/1": 90.0,
+        "https://tienda.test/producto/2": 100.0,
+    }
+
+
+def test_historial_registra_solo_productos_nuevos_y_cambios_de_precio(db):
+    from models import HistorialPrecioScraped
+
+    scraper = ScraperService()
+    scraper.guardar_productos(db, [producto(0), producto(1, precio=None)])
+    db.commit()
+    scraper.guardar_productos(db, [producto(0), producto(1, precio=None)])
+    db.commit()
+    # Cambio de nombre sin cambio de precio: no es una observación nueva
+    scraper.guardar_productos(db, [producto(0, nombre="Otra")])
+    db.commit()
+    scraper.guardar_productos(db, [producto(0, precio=80.0, nombre="Otra")])
+    db.commit()
+
+    historial = [
+        (h.producto_scraped.link, h.precio)
+        for h in db.query(HistorialPrecioScraped).order_by(HistorialPrecioScraped.id)
+    ]
+    assert historial == [
+        ("https://tienda.test/producto/0", 100.0),
+        ("https://tienda.test/producto/0", 80.0),
+    ]
+
+
+def test_reducir_serie_arrastra_el_ultimo_precio():
+    from datetime import timedelta
+
+    desde = datetime(2024, 1, 1)
+    observaciones = [
+        (100.0, desde - timedelta(days=3)),
+        (90.0, desde + timedelta(hours=30)),
+        (95.0, desde + timedelta(hours=40)),
+    ]
+
+    serie = ScraperService.reducir_serie(observaciones, desde, desde + timedelta(days=3), 3)
+
+    assert [(p["precio"], p["precio_min"], p["precio_max"], p["cambios"]) for p in serie] == [
+        (100.0, 100.0, 100.0, 0),
+        (95.0, 90.0, 100.0, 2),
+        (95.0, 95.0, 95.0, 0),
+    ]
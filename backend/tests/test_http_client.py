@@ -0,0 +1,94 @@
+"""Cliente HTTP compartido: reintentos acotados por plazo"""
+
+import time
+
+import pytest
+import requests
+
+from http_client import ClienteHTTP
+from price_sources import WooCommerceSource
+
+
+def respuesta(estado):
+    response = requests.Response()
+    response.status_code = estado
+    response._content = b""
+    return response
+
+
+class SesionFalsa:
+    def __init__(self, estado=503, demora=0.0, error=None, cabeceras=None):
+        self.estado = estado
+        self.demora = demora
+        self.error = error
+        self.cabeceras = cabeceras or {}
+        self.timeouts = []
+
+    def get(self, url, timeout=None, headers=None, **kwargs):
+        self.timeouts.append(timeout)
+        time.sleep(min(self.demora, timeout))
+        if self.error:
+            raise self.error
+        response = respuesta(self.estado)
+        response.headers.update(self.cabeceras)
+        return response
+
+
+def cliente(sesion, **kwargs):
+    cliente = ClienteHTTP(reintentos=3, backoff_base=0.05, backoff_max=1, **kwargs)
+    cliente.session = sesion
+    return cliente
+
+
+def test_reintenta_503_hasta_agotar_los_reintentos():
+    sesion = SesionFalsa(estado=503)
+
+    response = cliente(sesion).get("https://a.test/", timeout=5)
+
+    assert response.status_code == 503
+    assert len(sesion.timeouts) == 4
+
+
+def test_el_plazo_acota_reintentos_y_esperas():
+    sesion = SesionFalsa(estado=503, demora=0.15)
+    inicio = time.monotonic()
+
+    response = cliente(sesion).get("https://b.test/", timeout=5, plazo=0.4)
+
+    assert response.status_code == 503
+    assert time.monotonic() - inicio < 0.6
+    assert len(sesion.timeouts) < 4
+    assert all(t <= 0.4 for t in sesion.timeouts)
+
+
+def test_el_plazo_corta_esperas_de_retry_after():
+    sesion = SesionFalsa(estado=429, cabeceras={"Retry-After": "30"})
+    inicio = time.monotonic()
+
+    cliente(sesion).get("https://c.test/", timeout=5, plazo=1)
+
+    # Retry-After de 30 s no entra en el plazo: no se espera ni se reintenta
+    assert time.monotonic() - inicio < 0.5
+    assert len(sesion.timeouts) == 1
+
+
+def test_error_de_red_final_se_propaga_dentro_del_plazo():
+    sesion = SesionFalsa(error=requests.ConnectionError("sin conexión"), demora=0.1)
+
+    with pytest.raises(requests.ConnectionError):
+        cliente(sesion).get("https://d.test/", timeout=5, plazo=0.3)
+    assert sum(sesion.timeouts) <= 0.6
+
+
+def test_fuente_woocommerce_respeta_su_timeout(monkeypatch):
+    import price_sources
+
+    sesion = SesionFalsa(estado=503, demora=0.2)
+    monkeypatch.setattr(price_sources, "cliente_http", cliente(sesion))
+    fuente = WooCommerceSource("Lenta", "https://lenta.test", timeout=0.5)
+    inicio = time.monotonic()
+
+    with pytest.raises(requests.HTTPError):
+        fuente.fetch("silla ergonómica")
+
+    assert time.monotonic() - inicio < 0.8
@@ -0,0 +1,123 @@
+"""Fuente local de precios (productos_scraped) para /api/prices/suggest"""
+
+from emparejamiento import normalizar_nombre
+from local_prices import LocalPriceSource
+from models import Product, ProductoScraped
+
+
+def scrapeado(db, nombre, precio, categoria="Sillas de Oficina", producto_id=None):
+    fila = ProductoScraped(
+        nombre=nombre,
+        nombre_normalizado=normalizar_nombre(nombre),
+        precio=precio,
+        categoria=categoria,
+        link=f"https://tienda.test/{nombre}/{precio}",
+        fuente="livingroom.com.bo",
+        producto_id=producto_id,
+    )
+    db.add(fila)
+    return fila
+
+
+def producto(db, nombre="Silla Ejecutiva", categoria="Sillas"):
+    product = Product(name=nombre, category=categoria)
+    db.add(product)
+    db.commit()
+    return product
+
+
+def test_enlace_explicito_alcanza_con_una_fila(db):
+    product = producto(db)
+    scrapeado(db, "Cualquier nombre", 500.0, producto_id=product.id)
+    db.commit()
+
+    stats = LocalPriceSource(min_matches=3).market_stats(db, product)
+
+    assert stats["match"] == "producto_id"
+    assert stats["count"] == 1
+
+
+def test_por_nombre_exige_el_minimo_de_coincidencias(db):
+    product = producto(db)
+    for precio in (400.0, 450.0):
+        scrapeado(db, "Sillas Ejecutivas Gerenciales", precio)
+    db.commit()
+    fuente = LocalPriceSource(min_matches=3)
+
+    assert fuente.market_stats(db, product) is None
+
+    scrapeado(db, "Silla ejecutiva negra", 500.0)
+    db.commit()
+    stats = fuente.market_stats(db, product)
+    assert stats["match"] == "nombre"
+    assert stats["count"] == 3
+    assert stats["avg_price"] == 450.0
+
+
+def test_por_nombre_solo_en_categorias_coincidentes(db):
+    product = producto(db, "Mesa Redonda", "Bar")
+    for precio in (100.0, 110.0, 120.0):
+        scrapeado(db, "Mesa redonda de reuniones", precio, categoria="Muebles de Oficina")
+    db.commit()
+    fuente = LocalPriceSource(min_matches=3)
+
+    assert fuente.market_stats(db, product) is None
+
+    for precio in (200.0, 210.0, 220.0):
+        scrapeado(db, "Mesa redonda alta", precio, categoria="Bar")
+    db.commit()
+    stats = fuente.market_stats(db, product)
+    assert stats["count"] == 3
+    assert stats["min_price"] == 200.0
+
+
+def test_sin_categoria_no_usa_coincidencias_por_nombre(db):
+    product = producto(db, "Silla Ejecutiva", None)
+    for precio in (400.0, 450.0, 500.0):
+        scrapeado(db, "Silla Ejecutiva", precio)
+    db.commit()
+
+    assert LocalPriceSource(min_matches=1).market_stats(db, product) is None
+
+
+def test_por_nombre_empieza_por_la_primera_palabra(db):
+    product = producto(db, "Silla Ejecutiva", "Sillas")
+    scrapeado(db, "Mesa con silla ejecutiva", 900.0)
+    scrapeado(db, "Silla gerencial", 800.0)
+    scrapeado(db, "Sillas Gamer Ejecutivas", 300.0)
+    scrapeado(db, "SILLA  ejecutiva_cromada", 320.0)
+    db.commit()
+
+    stats = LocalPriceSource(min_matches=1).market_stats(db, product)
+
+    assert stats["count"] == 2
+    assert (stats["min_price"], stats["max_price"]) == (300.0, 320.0)
+
+
+def test_comodines_en_el_nombre_no_amplian_la_busqueda(db):
+    product = producto(db, "Silla %_ 100%", "Sillas")
+    scrapeado(db, "Silla azul", 100.0)
+    scrapeado(db, "Silla 100 cromada", 130.0)
+    db.commit()
+
+    stats = LocalPriceSource(min_matches=1).market_stats(db, product)
+    assert stats["count"] == 1
+    assert stats["min_price"] == 130.0
+
+
+def test_por_nombre_solo_sin_enlaces(db):
+    product = producto(db)
+    for precio in (400.0, 410.0, 420.0):
+        scrapeado(db, "Silla ejecutiva negra", precio)
+    db.commit()
+    fuente = LocalPriceSource(min_matches=3)
+    assert fuente.market_stats(db, product)["match"] == "nombre"
+
+    scrapeado(db, "Otro nombre cualquiera", 999.0, producto_id=product.id)
+    db.commit()
+    stats = fuente.market_stats(db, product)
+
+    # Con un enlace del emparejador se ignoran las coincidencias por nombre
+    assert stats["match"] == "producto_id"
+    assert stats["count"] == 1
+    assert stats["avg_price"] == 999.0
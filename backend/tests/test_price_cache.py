@@ -0,0 +1,124 @@
+"""Caché de precios de mercado con stale-while-revalidate"""
+
+import threading
+import time
+
+from price_cache import MarketPriceCache, normalize_key
+
+
+class Consultas:
+    """fetch falso que cuenta las llamadas y puede demorarse"""
+
+    def __init__(self, demora=0.0, fuentes=True, precio=100.0):
+        self.precio = precio
+        self.llamadas = 0
+        self.demora = demora
+        self.fuentes = fuentes
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.llamadas += 1
+            n = self.llamadas
+        time.sleep(self.demora)
+        sources = [{"source": "Agimex", "price": self.precio + n, "url": "u"}] if self.fuentes else []
+        return {"sources": sources, "failed_sources": []}
+
+
+def envejecer(cache, segundos):
+    for entrada in cache._entries.values():
+        entrada.fetched_at -= segundos
+
+
+def esperar_refrescos(cache):
+    cache._executor.submit(lambda: None).result()
+    while cache.metrics()["refreshing"]:
+        time.sleep(0.01)
+
+
+def test_normaliza_nombre_y_categoria():
+    assert normalize_key("  Silla  Ergonómica ", "Oficina") == normalize_key("silla ergonomica", "OFICINA")
+
+
+def test_sirve_vigente_sin_consultar():
+    cache = MarketPriceCache(ttl=60, stale=600)
+    fetch = Consultas()
+
+    cache.get("Silla", "Oficina", fetch)
+    entrada, meta = cache.get("silla", "oficina", fetch)
+
+    assert fetch.llamadas == 1
+    assert meta["cache_hit"] is True and meta["cache_stale"] is False
+    assert entrada.result["sources"][0]["price"] == 101.0
+
+
+def test_sirve_la_copia_vieja_y_refresca_una_sola_vez_en_segundo_plano():
+    cache = MarketPriceCache(ttl=60, stale=600)
+    fetch = Consultas()
+    cache.get("Silla", None, fetch)
+    envejecer(cache, 120)
+    lento = Consultas(demora=0.2, precio=200.0)
+
+    respuestas = [cache.get("Silla", None, lento) for _ in range(5)]
+
+    # Todas reciben la copia vieja al instante
+    assert all(meta["cache_stale"] for _, meta in respuestas)
+    assert all(e.result["sources"][0]["price"] == 101.0 for e, _ in respuestas)
+    esperar_refrescos(cache)
+    assert lento.llamadas == 1
+    entrada, meta = cache.get("Silla", None, lento)
+    assert meta["cache_stale"] is False
+    assert entrada.result["sources"][0]["price"] == 201.0
+    assert cache.metrics()["refreshes"] == 1
+
+
+def test_mas_alla_de_stale_consulta_de_nuevo():
+    cache = MarketPriceCache(ttl=60, stale=600)
+    fetch = Consultas()
+    cache.get("Silla", None, fetch)
+    envejecer(cache, 601)
+
+    _, meta = cache.get("Silla", None, fetch)
+
+    assert meta["cache_hit"] is False
+    assert fetch.llamadas == 2
+
+
+def test_consultas_simultaneas_de_una_clave_nueva_hacen_un_solo_fetch():
+    cache = MarketPriceCache(ttl=60, stale=600)
+    fetch = Consultas(demora=0.2)
+    resultados = []
+
+    hilos = [
+        threading.Thread(target=lambda: resultados.append(cache.get("Mesa", None, fetch)))
+        for _ in range(5)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert fetch.llamadas == 1
+    assert sum(1 for _, meta in resultados if not meta["cache_hit"]) == 1
+
+
+def test_no_guarda_resultados_sin_fuentes():
+    cache = MarketPriceCache(ttl=60, stale=600)
+    vacia = Consultas(fuentes=False)
+
+    cache.get("Armario", None, vacia)
+    cache.get("Armario", None, vacia)
+
+    assert vacia.llamadas == 2
+    assert cache.metrics()["entries"] == 0
+
+
+def test_expulsa_las_menos_usadas():
+    cache = MarketPriceCache(ttl=60, stale=600, max_entries=2)
+    fetch = Consultas()
+    for nombre in ("a", "b"):
+        cache.get(nombre, None, fetch)
+    cache.get("a", None, fetch)
+    cache.get("c", None, fetch)
+
+    assert set(cache._entries) == {("a", ""), ("c", "")}
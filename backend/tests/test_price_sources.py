@@ -0,0 +1,44 @@
+"""Adaptadores de fuentes de precio y su consulta en paralelo"""
+
+import pytest
+
+from price_sources import PriceSource, PriceSourceRegistry
+
+
+class FuenteFija(PriceSource):
+    def __init__(self, name, price, timeout=1.0):
+        super().__init__(name, timeout)
+        self.price = price
+
+    def fetch(self, product_name, category=None):
+        if isinstance(self.price, Exception):
+            raise self.price
+        if self.price is None:
+            return None
+        return {"source": self.name, "price": self.price, "url": f"https://{self.name}.test"}
+
+
+def test_fuente_sin_fetch_falla_al_crearla():
+    class SinFetch(PriceSource):
+        pass
+
+    with pytest.raises(TypeError):
+        SinFetch("Incompleta")
+    with pytest.raises(TypeError):
+        PriceSource("Base")
+
+
+def test_registro_separa_precios_y_fuentes_fallidas():
+    registro = PriceSourceRegistry(max_workers=4)
+    registro.register(FuenteFija("A", 100.0))
+    registro.register(FuenteFija("B", RuntimeError("HTTP 500")))
+    registro.register(FuenteFija("C", None))
+    registro.register(FuenteFija("D", 120.0))
+
+    resultado = registro.fetch_all("silla ergonómica")
+
+    assert [p["source"] for p in resultado["sources"]] == ["A", "D"]
+    assert {f["source"]: f["reason"] for f in resultado["failed_sources"]} == {
+        "B": "HTTP 500",
+        "C": "sin precio",
+    }
@@ -0,0 +1,151 @@
+"""Prompt de conversación: presupuesto de tokens y resumen acumulado"""
+
+import asyncio
+
+import pytest
+
+import gpt_client as modulo
+from conversaciones import HistorialConversaciones
+from gpt_client import GPTClient
+from prompt_conversacion import TOKENS_POR_MENSAJE, ConstructorPrompt, contar_tokens
+
+TEXTO = "la mesa de reuniones sale a 1200 bolivianos con entrega en dos semanas"
+# Todos los turnos de las pruebas tienen id de un dígito, así miden lo mismo
+POR_TURNO = contar_tokens(f"{TEXTO} 0") + TOKENS_POR_MENSAJE
+
+
+def turnos(cantidad, desde=1):
+    return [
+        {"id": i, "tipo": "bot" if i % 2 else "usuario", "mensaje": f"{TEXTO} {i}"}
+        for i in range(desde, desde + cantidad)
+    ]
+
+
+def ids(lista):
+    return [t["id"] for t in lista]
+
+
+def test_los_turnos_mas_viejos_quedan_fuera_del_presupuesto():
+    constructor = ConstructorPrompt(presupuesto=POR_TURNO * 3, max_turnos=10, resumen_minimo=0)
+
+    por_resumir, recientes = constructor.dividir(turnos(6), None)
+
+    assert ids(por_resumir) == [1, 2, 3]
+    assert ids(recientes) == [4, 5, 6]
+
+
+def test_max_turnos_limita_aunque_sobre_presupuesto():
+    constructor = ConstructorPrompt(presupuesto=10_000, max_turnos=2, resumen_minimo=0)
+
+    por_resumir, recientes = constructor.dividir(turnos(5), None)
+
+    assert ids(recientes) == [4, 5]
+    assert ids(por_resumir) == [1, 2, 3]
+
+
+def test_el_resumen_espera_a_juntar_una_tanda():
+    constructor = ConstructorPrompt(
+        presupuesto=POR_TURNO * 3, max_turnos=10, resumen_minimo=POR_TURNO * 2
+    )
+
+    # Un solo turno fuera de la ventana: sigue completo en el prompt
+    assert constructor.dividir(turnos(4), None) == ([], turnos(4))
+    por_resumir, recientes = constructor.dividir(turnos(5), None)
+    assert (ids(por_resumir), ids(recientes)) == ([1, 2], [3, 4, 5])
+
+
+def test_los_turnos_ya_resumidos_no_vuelven():
+    constructor = ConstructorPrompt(presupuesto=POR_TURNO * 3, max_turnos=10, resumen_minimo=0)
+
+    por_resumir, recientes = constructor.dividir(turnos(8), resumido_hasta=3)
+
+    assert ids(por_resumir) == [4, 5]
+    assert ids(recientes) == [6, 7, 8]
+
+
+def test_el_prompt_de_sistema_nunca_se_recorta():
+    constructor = ConstructorPrompt(presupuesto=POR_TURNO, max_turnos=10, resumen_minimo=0)
+    sistema = "Eres un comprador de muebles de oficina. " * 50
+    _, recientes = constructor.dividir(turnos(4), None)
+
+    mensajes = constructor.construir(
+        sistema, "mesa a 1200", recientes, "¿y la silla?", historial_completo=turnos(4)
+    )
+
+    assert mensajes[0] == {"role": "system", "content": sistema}
+    assert mensajes[1]["role"] == "system" and mensajes[1]["content"].endswith("mesa a 1200")
+    assert [m["content"] for m in mensajes[2:]] == [f"{TEXTO} 4", "¿y la silla?"]
+    assert mensajes[2]["role"] == "user"
+    metricas = constructor.resumen()
+    assert metricas["tokens_prompt"] < metricas["tokens_historial_completo"]
+
+
+def test_un_turno_que_solo_excede_el_presupuesto_se_conserva():
+    constructor = ConstructorPrompt(presupuesto=1, max_turnos=10, resumen_minimo=0)
+
+    por_resumir, recientes = constructor.dividir(turnos(3), None)
+
+    assert ids(recientes) == [3]
+    assert ids(por_resumir) == [1, 2]
+
+
+@pytest.fixture
+def conversacion(monkeypatch, tmp_path):
+    """Historial en una base temporal y un presupuesto de tres turnos"""
+    historial = HistorialConversaciones(url=f"sqlite:///{tmp_path / 'conversaciones.db'}")
+    monkeypatch.setattr(modulo, "historial_conversaciones", historial)
+    monkeypatch.setattr(
+        modulo,
+        "constructor_prompt",
+        ConstructorPrompt(presupuesto=POR_TURNO * 3, max_turnos=10, resumen_minimo=0),
+    )
+    llamadas = []
+
+    async def llamar(mensajes, **kwargs):
+        llamadas.append(mensajes)
+        return f"resumen {len(llamadas)}"
+
+    cliente = GPTClient()
+    monkeypatch.setattr(cliente, "llamar_openai_async", llamar)
+    return historial, cliente, llamadas
+
+
+def test_resumen_acumulado_de_los_turnos_viejos(conversacion):
+    historial, cliente, llamadas = conversacion
+    for i in range(1, 6):
+        historial.agregar("591", f"{TEXTO} {i}", "bot" if i % 2 else "usuario")
+
+    contexto = asyncio.run(cliente._contexto_conversacion("591"))
+
+    assert contexto["resumen"] == "resumen 1"
+    assert [t["mensaje"][-1] for t in contexto["recientes"]] == ["3", "4", "5"]
+    assert historial.obtener_resumen("591") == (2, "resumen 1")
+    assert f"Comprador: {TEXTO} 1" in llamadas[0][1]["content"]
+    assert "Resumen anterior" not in llamadas[0][1]["content"]
+
+    # Con más turnos el resumen nuevo parte del anterior y solo recibe lo pendiente
+    for i in range(6, 8):
+        historial.agregar("591", f"{TEXTO} {i}", "bot" if i % 2 else "usuario")
+    contexto = asyncio.run(cliente._contexto_conversacion("591"))
+
+    assert contexto["resumen"] == "resumen 2"
+    assert [t["mensaje"][-1] for t in contexto["recientes"]] == ["5", "6", "7"]
+    contenido = llamadas[1][1]["content"]
+    assert contenido.startswith("Resumen anterior:\nresumen 1")
+    assert f"{TEXTO} 3" in contenido and f"{TEXTO} 2" not in contenido
+
+
+def test_sin_resumen_nuevo_los_turnos_van_completos(conversacion, monkeypatch):
+    historial, cliente, _ = conversacion
+    for i in range(1, 6):
+        historial.agregar("591", f"{TEXTO} {i}")
+
+    async def falla(mensajes, **kwargs):
+        raise TimeoutError("OpenAI no respondió dentro del tiempo límite")
+
+    monkeypatch.setattr(cliente, "llamar_openai_async", falla)
+    contexto = asyncio.run(cliente._contexto_conversacion("591"))
+
+    assert contexto["resumen"] is None
+    assert len(contexto["recientes"]) == 5
+    assert historial.obtener_resumen("591") == (0, None)
@@ -0,0 +1,384 @@
+"""Barridos de precios contra una tienda simulada, con y sin descargas fallidas"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from scraper_service import ContextoEscaneo, ScraperService
+from sitio_falso import CATEGORIA_URL, SitioFalso, catalogo
+
+CATEGORIA = "Sillas de Oficina"
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        yield pool
+
+
+def servicio(sitio):
+    scraper = ScraperService()
+    scraper.http = sitio
+    return scraper
+
+
+def links(productos):
+    return {p["link"] for p in productos}
+
+
+def test_biseccion_encuentra_todo_con_menos_peticiones_que_lineal(executor):
+    precios = catalogo(300)
+    sitio = SitioFalso(precios)
+    contexto = ContextoEscaneo()
+
+    productos = servicio(sitio).recolectar_biseccion(
+        0, 810, CATEGORIA_URL, CATEGORIA, 0, executor, contexto
+    )
+
+    assert links(productos) == set(precios)
+    assert all(p["precio"] == precios[p["link"]] for p in productos)
+    assert contexto.peticiones < 811
+    assert contexto.sin_resolver == []
+    assert contexto.precios_escaneados == 811
+
+
+def test_biseccion_reintenta_la_mitad_izquierda_que_fallo(executor):
+    precios = catalogo(300)
+    # La primera división pide 0..405; falla una vez
+    sitio = SitioFalso(precios, fallas={"min_price=0&max_price=405": 1})
+    contexto = ContextoEscaneo()
+
+    productos = servicio(sitio).recolectar_biseccion(
+        0, 810, CATEGORIA_URL, CATEGORIA, 0, executor, contexto
+    )
+
+    assert contexto.errores == 1
+    assert links(productos) == set(precios)
+    assert contexto.sin_resolver == []
+
+
+def test_biseccion_no_toma_una_ventana_fallida_como_vacia(executor):
+    precios = catalogo(300)
+    sitio = SitioFalso(precios, fallas={"min_price=0&max_price=405": 5})
+    contexto = ContextoEscaneo()
+
+    productos = servicio(sitio).recolectar_biseccion(
+        0, 810, CATEGORIA_URL, CATEGORIA, 0, executor, contexto
+    )
+
+    assert contexto.sin_resolver == [(0, 405)]
+    # Lo de la otra mitad se encuentra igual
+    assert links(productos) == {link for link, precio in precios.items() if precio > 405}
+    assert contexto.precios_escaneados == 811
+
+
+def test_biseccion_marca_el_precio_exacto_que_fallo(executor):
+    precios = {"https://tienda.test/producto/a": 150, "https://tienda.test/producto/b": 300}
+    sitio = SitioFalso(precios, fallas={"min_price=150&max_price=150": 5})
+    contexto = ContextoEscaneo()
+
+    productos = servicio(sitio).recolectar_biseccion(
+        0, 810, CATEGORIA_URL, CATEGORIA, 0, executor, contexto
+    )
+
+    assert links(productos) == {"https://tienda.test/producto/b"}
+    assert contexto.sin_resolver == [(150, 150)]
+
+
+def test_lineal_marca_los_precios_que_fallaron(executor):
+    precios = {"https://tienda.test/producto/a": 12, "https://tienda.test/producto/b": 15}
+    sitio = SitioFalso(precios, fallas={"min_price=12&max_price=12": 1})
+    contexto = ContextoEscaneo()
+
+    productos = servicio(sitio).recolectar_lineal(
+        10, 20, CATEGORIA_URL, CATEGORIA, 0, executor, contexto
+    )
+
+    assert links(productos) == {"https://tienda.test/producto/b"}
+    assert contexto.sin_resolver == [(12, 12)]
+
+
+def test_precio_exacto_con_pagina_fallida_queda_sin_resolver(executor):
+    precios = {f"https://tienda.test/producto/{n}": 99 for n in range(30)}
+    sitio = SitioFalso(precios, fallas={"page/2/": 1})
+    contexto = ContextoEscaneo()
+
+    consulta = servicio(sitio).consultar_ventana(
+        99, 99, CATEGORIA_URL, CATEGORIA, 0, contexto
+    )
+
+    assert consulta["error"] is True
+    assert consulta["total"] == 30
+    assert len(consulta["productos"]) == 12
+
+
+def test_paginado_recupera_con_biseccion_una_pagina_fallida(executor):
+    precios = catalogo(100)
+    sitio = SitioFalso(precios, fallas={"page/3/": 1})
+    contexto = ContextoEscaneo()
+
+    productos = servicio(sitio).recolectar_paginado(
+        0, 810, CATEGORIA_URL, CATEGORIA, 0, executor, contexto
+    )
+
+    assert links(productos) == set(precios)
+    assert contexto.sin_resolver == []
+
+
+def test_paginado_marca_el_rango_si_falla_la_primera_pagina(executor):
+    sitio = SitioFalso(catalogo(20), fallas={"?min_price=0&max_price=810": 1})
+    contexto = ContextoEscaneo()
+
+    productos = servicio(sitio).recolectar_paginado(
+        0, 810, CATEGORIA_URL, CATEGORIA, 0, executor, contexto
+    )
+
+    assert productos == []
+    assert contexto.sin_resolver == [(0, 810)]
+
+
+def test_checkpoint_no_avanza_sobre_un_tramo_con_fallas_y_se_reanuda(db, monkeypatch):
+    import scraper_service
+    from models import ProductoScraped, ScrapingCheckpoint
+
+    monkeypatch.setattr(scraper_service, "TRAMO_CHECKPOINT", 100)
+    precios = catalogo(120, 0, 399)
+    sitio = SitioFalso(precios, fallas={"min_price=200&max_price=299": 5})
+    scraper = servicio(sitio)
+
+    resultado = scraper.escanear_rango_rapido(
+        db, 0, 399, CATEGORIA_URL, CATEGORIA, delay=0, modo="biseccion"
+    )
+
+    estadisticas = resultado["estadisticas"]
+    assert estadisticas["incompleto"] is True
+    assert estadisticas["ventanas_sin_resolver"] == [(200, 299)]
+    checkpoint = db.get(ScrapingCheckpoint, estadisticas["checkpoint_id"])
+    assert checkpoint.ultimo_precio == 199
+    assert checkpoint.finalizado_en is None
+    # No se siguió con los tramos posteriores
+    assert resultado["total_productos"] == sum(1 for p in precios.values() if p < 200)
+
+    sitio.fallas.clear()
+    resultado = scraper.escanear_rango_rapido(
+        db, 0, 399, CATEGORIA_URL, CATEGORIA, delay=0, modo="biseccion", reanudar=True
+    )
+
+    estadisticas = resultado["estadisticas"]
+    assert estadisticas["checkpoint_id"] == checkpoint.id
+    assert estadisticas["reanudado_desde"] == 200
+    assert estadisticas["incompleto"] is False
+    assert estadisticas["ventanas_sin_resolver"] == []
+    db.refresh(checkpoint)
+    assert checkpoint.ultimo_precio == 399
+    assert checkpoint.finalizado_en is not None
+    assert resultado["total_productos"] == len(precios)
+    assert {p.link for p in db.query(ProductoScraped)} == set(precios)
+    # Ya finalizado: reanudar arranca un barrido nuevo
+    assert scraper.buscar_checkpoint(db, CATEGORIA_URL, "biseccion", 0, 399) is None
+
+
+def test_trabajo_con_ventanas_sin_resolver_queda_incompleto(monkeypatch):
+    import trabajos_scraping
+    from trabajos_scraping import GestorTrabajosScraping
+
+    monkeypatch.setattr(
+        trabajos_scraping.emparejador, "emparejar", lambda db, **kwargs: None
+    )
+    gestor = GestorTrabajosScraping(max_simultaneos=1)
+    resultado = {
+        "total_productos": 0,
+        "productos_nuevos": 0,
+        "productos_duplicados": 0,
+        "productos": [],
+        "estadisticas": {"ventanas_sin_resolver": [(200, 299)]},
+    }
+
+    trabajo = gestor.lanzar("rango", CATEGORIA, {}, lambda db, contexto: resultado)
+    gestor.executor.shutdown(wait=True)
+
+    assert trabajo.estado == "incompleto"
+    assert trabajo.terminado
+
+
+def sembrar(db, precios):
+    """Guarda {link: precio} como foto previa de la categoría"""
+    from models import ProductoScraped
+
+    for link, precio in precios.items():
+        db.add(
+            ProductoScraped(
+                nombre=link, precio=float(precio), categoria=CATEGORIA, link=link,
+                fuente="livingroom.com.bo",
+            )
+        )
+    db.commit()
+
+
+def test_incremental_reporta_nuevos_desaparecidos_y_cambios(db):
+    anteriores = catalogo(40, 0, 399)
+    sembrar(db, anteriores)
+    actuales = dict(anteriores)
+    nuevo = "https://tienda.test/producto/nuevo"
+    desaparecido, cambiado = sorted(anteriores)[:2]
+    actuales[nuevo] = 123
+    del actuales[desaparecido]
+    actuales[cambiado] = anteriores[cambiado] + 1
+
+    resultado = servicio(SitioFalso(actuales)).escanear_rango_rapido(
+        db, 0, 399, CATEGORIA_URL, CATEGORIA, delay=0, modo="incremental"
+    )
+
+    incremental = resultado["estadisticas"]["incremental"]
+    assert incremental["nuevos"] == [nuevo]
+    assert incremental["desaparecidos"] == [desaparecido]
+    assert [c["link"] for c in incremental["cambios_precio"]] == [cambiado]
+    assert incremental["sin_verificar"] == []
+
+
+def test_incremental_vuelve_a_pedir_un_precio_exacto_que_fallo(db):
+    precios = {f"https://tienda.test/producto/{n}": 250 for n in range(10)}
+    precios["https://tienda.test/producto/otro"] = 40
+    sembrar(db, precios)
+    # La consulta exacta falla una vez; la bisección residual la repite
+    sitio = SitioFalso(precios, fallas={"min_price=250&max_price=250": 1})
+
+    resultado = servicio(sitio).escanear_rango_rapido(
+        db, 0, 399, CATEGORIA_URL, CATEGORIA, delay=0, modo="incremental"
+    )
+
+    incremental = resultado["estadisticas"]["incremental"]
+    assert incremental["desaparecidos"] == []
+    assert incremental["sin_verificar"] == []
+    assert resultado["total_productos"] == len(precios)
+
+
+def test_incremental_no_reporta_desaparecidos_en_ventanas_fallidas(db):
+    precios = {f"https://tienda.test/producto/{n}": 250 for n in range(10)}
+    precios["https://tienda.test/producto/otro"] = 40
+    sembrar(db, precios)
+    sitio = SitioFalso(precios, fallas={"min_price=250&max_price=250": 10})
+
+    resultado = servicio(sitio).escanear_rango_rapido(
+        db, 0, 399, CATEGORIA_URL, CATEGORIA, delay=0, modo="incremental"
+    )
+
+    estadisticas = resultado["estadisticas"]
+    assert estadisticas["errores_http"] > 0
+    assert estadisticas["incompleto"] is True
+    incremental = estadisticas["incremental"]
+    assert incremental["desaparecidos"] == []
+    assert sorted(incremental["sin_verificar"]) == sorted(
+        link for link, precio in precios.items() if precio == 250
+    )
+
+
+MESAS_URL = "https://tienda.test/product-category/mesas/"
+
+
+def test_varias_categorias_separan_resultados_y_compartidos(db):
+    from models import ProductoScraped
+    from sitio_falso import TiendaFalsa
+
+    sillas = catalogo(40, 0, 399)
+    mesas = {
+        f"https://tienda.test/producto/m{n:03d}": 100 + n * 9 for n in range(25)
+    }
+    compartido = next(iter(sillas))
+    mesas[compartido] = sillas[compartido]
+    tienda = TiendaFalsa({CATEGORIA_URL: SitioFalso(sillas), MESAS_URL: SitioFalso(mesas)})
+
+    resultado = servicio(tienda).escanear_categorias(
+        db,
+        [{"url": CATEGORIA_URL, "nombre": CATEGORIA}, {"url": MESAS_URL, "nombre": "Mesas"}],
+        0, 399, delay=0, modo="biseccion",
+    )
+
+    por_categoria = {c["categoria"]: c for c in resultado["estadisticas"]["categorias"]}
+    assert por_categoria[CATEGORIA]["productos_encontrados"] == len(sillas)
+    assert por_categoria[CATEGORIA]["productos_asignados"] == len(sillas)
+    assert por_categoria["Mesas"]["productos_encontrados"] == len(mesas)
+    # El link compartido queda en la primera categoría pedida
+    assert por_categoria["Mesas"]["productos_asignados"] == len(mesas) - 1
+    assert resultado["estadisticas"]["compartidos_entre_categorias"] == {
+        compartido: [CATEGORIA, "Mesas"]
+    }
+    assert sum(c["peticiones_http"] for c in por_categoria.values()) == (
+        resultado["estadisticas"]["peticiones_http"]
+    )
+    guardados = {p.link: p.categoria for p in db.query(ProductoScraped)}
+    assert guardados == {
+        **{link: "Mesas" for link in mesas},
+        **{link: CATEGORIA for link in sillas},
+    }
+
+
+def test_varias_categorias_aislan_las_ventanas_fallidas(db):
+    from sitio_falso import TiendaFalsa
+
+    sillas = catalogo(40, 0, 399)
+    mesas = catalogo(30, 0, 399, paso=11)
+    mesas = {link.replace("/producto/p", "/producto/m"): precio for link, precio in mesas.items()}
+    tienda = TiendaFalsa({
+        CATEGORIA_URL: SitioFalso(sillas),
+        MESAS_URL: SitioFalso(mesas, fallas={"min_price=0&max_price=399": 1}),
+    })
+
+    resultado = servicio(tienda).escanear_categorias(
+        db,
+        [{"url": CATEGORIA_URL, "nombre": CATEGORIA}, {"url": MESAS_URL, "nombre": "Mesas"}],
+        0, 399, delay=0, modo="biseccion",
+    )
+
+    por_categoria = {c["categoria"]: c for c in resultado["estadisticas"]["categorias"]}
+    assert por_categoria[CATEGORIA]["ventanas_sin_resolver"] == []
+    assert por_categoria[CATEGORIA]["errores_http"] == 0
+    assert por_categoria[CATEGORIA]["productos_encontrados"] == len(sillas)
+    assert por_categoria["Mesas"]["errores_http"] == 1
+    assert por_categoria["Mesas"]["ventanas_sin_resolver"] == [(0, 399)]
+    assert resultado["estadisticas"]["ventanas_sin_resolver"] == [(0, 399)]
+
+
+def test_checkpoints_separados_por_categoria_y_modo(db, monkeypatch):
+    import scraper_service
+    from models import ScrapingCheckpoint
+    from sitio_falso import TiendaFalsa
+
+    monkeypatch.setattr(scraper_service, "TRAMO_CHECKPOINT", 100)
+    sillas = catalogo(60, 0, 299)
+    mesas = {link.replace("/producto/p", "/producto/m"): precio for link, precio in catalogo(50, 0, 299).items()}
+    tienda = TiendaFalsa({
+        CATEGORIA_URL: SitioFalso(sillas, fallas={"min_price=100&max_price=199": 5}),
+        MESAS_URL: SitioFalso(mesas),
+    })
+    scraper = servicio(tienda)
+
+    detenido = scraper.escanear_rango_rapido(
+        db, 0, 299, CATEGORIA_URL, CATEGORIA, delay=0, modo="biseccion"
+    )["estadisticas"]
+    assert detenido["incompleto"] is True
+
+    # Otra categoría con el mismo rango no retoma el checkpoint de sillas
+    otra = scraper.escanear_rango_rapido(
+        db, 0, 299, MESAS_URL, "Mesas", delay=0, modo="biseccion", reanudar=True
+    )
+    assert otra["estadisticas"]["checkpoint_id"] != detenido["checkpoint_id"]
+    assert otra["estadisticas"]["reanudado_desde"] is None
+    assert otra["total_productos"] == len(mesas)
+
+    # Otro modo sobre la misma categoría tampoco
+    tienda.sitios[CATEGORIA_URL].fallas.clear()
+    paginado = scraper.escanear_rango_rapido(
+        db, 0, 299, CATEGORIA_URL, CATEGORIA, delay=0, modo="paginado", reanudar=True
+    )["estadisticas"]
+    assert paginado["checkpoint_id"] != detenido["checkpoint_id"]
+    assert paginado["reanudado_desde"] is None
+    assert db.get(ScrapingCheckpoint, detenido["checkpoint_id"]).finalizado_en is None
+
+    # El mismo modo sí lo retoma desde el tramo que falló
+    reanudado = scraper.escanear_rango_rapido(
+        db, 0, 299, CATEGORIA_URL, CATEGORIA, delay=0, modo="biseccion", reanudar=True
+    )["estadisticas"]
+    assert reanudado["checkpoint_id"] == detenido["checkpoint_id"]
+    assert reanudado["reanudado_desde"] == 100
+    assert reanudado["incompleto"] is False
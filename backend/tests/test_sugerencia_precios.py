@@ -0,0 +1,153 @@
+"""Endpoints de precio sugerido: individual y en lote (NDJSON)"""
+
+import json
+
+import pytest
+
+import main
+from models import PriceComparison, Product
+
+
+@pytest.fixture
+def mercado(monkeypatch):
+    """Fuentes de mercado fijas; cuenta las consultas"""
+    consultas = []
+
+    def fetch_market_prices(nombre, categoria):
+        consultas.append(nombre)
+        return {
+            "sources": [
+                {"source": "A", "price": 100.0, "url": "https://a.test"},
+                {"source": "B", "price": 140.0, "url": "https://b.test"},
+            ],
+            "failed_sources": [],
+        }
+
+    monkeypatch.setattr(main.price_scraper, "fetch_market_prices", fetch_market_prices)
+    return consultas
+
+
+@pytest.fixture
+def silla(db):
+    producto = Product(name="Silla Ergo", category="Sillas", price=100.0)
+    db.add(producto)
+    db.commit()
+    return producto
+
+
+def sugerir(api, product_id):
+    respuesta = api.post(
+        "/api/prices/suggest", params={"product_id": product_id, "use_local": False}
+    )
+    assert respuesta.status_code == 200, respuesta.text
+    return respuesta.json()
+
+
+def test_reutiliza_la_comparacion_solo_con_el_mismo_precio(api, db, silla, mercado):
+    primera = sugerir(api, silla.id)
+    assert sugerir(api, silla.id)["comparison_id"] == primera["comparison_id"]
+    assert db.query(PriceComparison).count() == 1
+
+    silla.price = 90.0
+    db.commit()
+    tercera = sugerir(api, silla.id)
+
+    assert tercera["cache_hit"] is True
+    assert tercera["comparison_id"] != primera["comparison_id"]
+    assert db.query(PriceComparison).count() == 2
+    assert len(mercado) == 1
+
+
+def test_lote_reutiliza_la_comparacion_solo_con_el_mismo_precio(api, db, silla, mercado):
+    def lote():
+        respuesta = api.post(
+            "/api/prices/suggest/batch", json={"product_ids": [silla.id], "use_local": False}
+        )
+        return [line for line in respuesta.text.splitlines() if line][-1]
+
+    primera = json.loads(lote())["comparison_ids"]
+    assert json.loads(lote())["comparison_ids"] == primera
+
+    silla.price = 90.0
+    db.commit()
+    tercera = json.loads(lote())["comparison_ids"]
+
+    assert tercera[str(silla.id)] != primera[str(silla.id)]
+    assert db.query(PriceComparison).count() == 2
+
+
+def lineas_lote(api, **cuerpo):
+    respuesta = api.post("/api/prices/suggest/batch", json=cuerpo)
+    assert respuesta.status_code == 200, respuesta.text
+    assert respuesta.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(linea) for linea in respuesta.text.splitlines() if linea]
+
+
+def test_lote_ndjson_orden_y_resumen(api, db, monkeypatch):
+    from models import ProductoScraped
+
+    local = Product(name="Silla Local", category="Sillas", price=300.0)
+    mercado_ok = Product(name="Mesa Ok", category="Sillas", price=100.0)
+    sin_precios = Product(name="Mesa Sin Precios", category="Sillas", price=100.0)
+    db.add_all([local, mercado_ok, sin_precios])
+    db.commit()
+    db.add(
+        ProductoScraped(
+            nombre="Silla Local Tienda", precio=320.0, categoria="Sillas de Oficina",
+            link="https://tienda.test/silla-local", fuente="livingroom.com.bo",
+            producto_id=local.id,
+        )
+    )
+    db.commit()
+
+    def fetch_market_prices(nombre, categoria):
+        fuentes = [] if nombre == "Mesa Sin Precios" else [
+            {"source": "A", "price": 150.0, "url": "https://a.test"}
+        ]
+        return {"sources": fuentes, "failed_sources": [{"source": "B", "reason": "timeout"}]}
+
+    monkeypatch.setattr(main.price_scraper, "fetch_market_prices", fetch_market_prices)
+
+    lineas = lineas_lote(
+        api, product_ids=[local.id, mercado_ok.id, sin_precios.id, 9999], concurrency=2
+    )
+
+    # No encontrados, luego locales, luego los de mercado según terminan; el resumen al final
+    assert lineas[0] == {
+        "product_id": 9999, "status": "error", "detail": "Producto no encontrado"
+    }
+    assert lineas[1]["product_id"] == local.id
+    assert lineas[1]["price_origin"] == "local"
+    por_producto = {linea["product_id"]: linea for linea in lineas[2:4]}
+    assert por_producto[mercado_ok.id]["status"] == "ok"
+    assert por_producto[mercado_ok.id]["price_origin"] == "market"
+    assert por_producto[sin_precios.id]["status"] == "error"
+    assert por_producto[sin_precios.id]["failed_sources"] == [
+        {"source": "B", "reason": "timeout"}
+    ]
+
+    resumen = lineas[-1]
+    assert len(lineas) == 5
+    assert resumen["status"] == "done"
+    assert (resumen["total"], resumen["ok"], resumen["errors"]) == (4, 2, 2)
+    assert set(resumen["comparison_ids"]) == {str(local.id), str(mercado_ok.id)}
+    assert db.query(PriceComparison).count() == 2
+
+
+def test_lote_por_categoria_no_usa_comodines(api, db, mercado):
+    db.add_all([
+        Product(name="Silla A", category="Sillas", price=100.0),
+        Product(name="Silla B", category="sillas", price=100.0),
+        Product(name="Mesa", category="Mesas", price=100.0),
+    ])
+    db.commit()
+
+    lineas = lineas_lote(api, category="SILLAS", use_local=False)
+    assert lineas[-1]["total"] == 2
+
+    for comodin in ("%", "_esas", "S%"):
+        respuesta = api.post(
+            "/api/prices/suggest/batch", json={"category": comodin, "use_local": False}
+        )
+        assert respuesta.status_code == 404
+    assert len(mercado) == 2
@@ -0,0 +1,147 @@
+"""Ciclo de vida de los barridos en segundo plano contra la tienda simulada"""
+
+import threading
+
+import pytest
+
+from scraper_service import ScraperService
+from sitio_falso import CATEGORIA_URL, SitioFalso, catalogo
+from trabajos_scraping import GestorTrabajosScraping
+
+CATEGORIA = "Sillas de Oficina"
+
+
+class SitioRetenido(SitioFalso):
+    """Tienda que no responde hasta que se libera (para ver el trabajo en curso)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pedido = threading.Event()
+        self.liberado = threading.Event()
+
+    def get(self, url, **kwargs):
+        self.pedido.set()
+        assert self.liberado.wait(5)
+        return super().get(url, **kwargs)
+
+
+def barrido(sitio, max_precio=199):
+    scraper = ScraperService()
+    scraper.http = sitio
+
+    def ejecutar(db, contexto):
+        return scraper.escanear_rango_rapido(
+            db, 0, max_precio, CATEGORIA_URL, CATEGORIA,
+            delay=0, concurrencia=2, modo="biseccion", contexto=contexto,
+        )
+
+    return ejecutar
+
+
+@pytest.fixture
+def gestor():
+    gestor = GestorTrabajosScraping(max_simultaneos=1)
+    yield gestor
+    gestor.executor.shutdown(wait=True)
+
+
+def test_pendiente_en_curso_y_completado(db, gestor):
+    precios = catalogo(60, 0, 199)
+    sitio = SitioRetenido(precios)
+
+    trabajo = gestor.lanzar("rango", CATEGORIA, {"modo": "biseccion"}, barrido(sitio))
+    segundo = gestor.lanzar("rango", CATEGORIA, {}, barrido(SitioFalso(precios)))
+    assert sitio.pedido.wait(5)
+
+    assert trabajo.estado == "en_curso"
+    assert trabajo.iniciado_en is not None and not trabajo.terminado
+    assert segundo.estado == "pendiente"
+    assert [t.id for t in gestor.listar()] == [segundo.id, trabajo.id]
+
+    sitio.liberado.set()
+    gestor.executor.shutdown(wait=True)
+
+    assert trabajo.estado == "completado"
+    assert trabajo.finalizado_en >= trabajo.iniciado_en
+    assert trabajo.resultado.total_productos == len(precios)
+    assert trabajo.resultado.productos_nuevos == len(precios)
+    progreso = trabajo.progreso()
+    assert progreso["precios_escaneados"] == progreso["precios_totales"] == 200
+    assert progreso["porcentaje"] == 100.0
+    assert progreso["productos_encontrados"] == len(precios)
+    assert progreso["peticiones_http"] == len(sitio.peticiones)
+    assert progreso["eta_segundos"] is None
+    # El segundo barrido ve los mismos productos ya guardados
+    assert segundo.estado == "completado"
+    assert segundo.resultado.productos_nuevos == 0
+    assert segundo.resultado.productos_duplicados == len(precios)
+
+
+def test_cancelar_pendiente_no_lo_ejecuta(db, gestor):
+    sitio = SitioRetenido(catalogo(10, 0, 199))
+    primero = gestor.lanzar("rango", CATEGORIA, {}, barrido(sitio))
+    assert sitio.pedido.wait(5)
+    otro_sitio = SitioFalso(catalogo(10, 0, 199))
+    pendiente = gestor.lanzar("rango", CATEGORIA, {}, barrido(otro_sitio))
+
+    assert gestor.cancelar(pendiente.id).estado == "cancelado"
+    sitio.liberado.set()
+    gestor.executor.shutdown(wait=True)
+
+    assert primero.estado == "completado"
+    assert pendiente.estado == "cancelado"
+    assert pendiente.iniciado_en is None
+    assert otro_sitio.peticiones == []
+
+
+def test_cancelar_en_curso_detiene_el_barrido(db, gestor):
+    sitio = SitioRetenido(catalogo(60, 0, 199))
+    trabajo = gestor.lanzar("rango", CATEGORIA, {}, barrido(sitio))
+    assert sitio.pedido.wait(5)
+
+    gestor.cancelar(trabajo.id)
+    assert trabajo.estado == "en_curso"
+    sitio.liberado.set()
+    gestor.executor.shutdown(wait=True)
+
+    assert trabajo.estado == "cancelado"
+    assert trabajo.resultado is None
+    assert trabajo.finalizado_en is not None
+    # Solo llegaron las peticiones ya en vuelo al cancelar
+    assert len(sitio.peticiones) <= 2
+    # Un trabajo terminado no cambia al cancelarlo de nuevo
+    assert gestor.cancelar(trabajo.id).estado == "cancelado"
+
+
+def test_error_en_el_barrido_queda_registrado(db, gestor):
+    def fallar(db, contexto):
+        raise RuntimeError("tienda caída")
+
+    trabajo = gestor.lanzar("rango", CATEGORIA, {}, fallar)
+    gestor.executor.shutdown(wait=True)
+
+    assert trabajo.estado == "error"
+    assert trabajo.error == "tienda caída"
+    assert trabajo.terminado and trabajo.finalizado_en is not None
+    assert trabajo.a_dict()["estado"] == "error"
+
+
+def test_solo_se_conservan_los_ultimos_terminados(db, gestor, monkeypatch):
+    import trabajos_scraping
+
+    monkeypatch.setattr(trabajos_scraping, "TRABAJOS_HISTORIAL", 2)
+    resultado = {
+        "total_productos": 0, "productos_nuevos": 0, "productos_duplicados": 0,
+        "productos": [], "estadisticas": {},
+    }
+    lanzados = []
+    for _ in range(4):
+        lanzados.append(gestor.lanzar("rango", CATEGORIA, {}, lambda db, c: resultado))
+        gestor.executor.submit(lambda: None).result()
+
+    gestor.lanzar("rango", CATEGORIA, {}, lambda db, c: resultado)
+    gestor.executor.shutdown(wait=True)
+
+    assert gestor.obtener(lanzados[0].id) is None
+    assert gestor.obtener(lanzados[1].id) is None
+    assert gestor.obtener(lanzados[3].id).estado == "completado"
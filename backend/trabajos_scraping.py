@@ -0,0 +1,178 @@
+"""
+Trabajos de scraping en segundo plano
+Los barridos largos corren en un pool propio para no bloquear los workers de
+la API ni retener conexiones del pool de BD mientras se descargan páginas
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from database import SessionLocal
+from emparejamiento import emparejador
+from schemas import ScrapingResponse
+from scraper_service import ContextoEscaneo, EscaneoCancelado
+
+# Barridos que pueden correr a la vez (cada uno usa su propio pool de descargas)
+TRABAJOS_SIMULTANEOS = int(os.getenv("SCRAPER_TRABAJOS_SIMULTANEOS", "2"))
+
+# Trabajos terminados que se conservan en memoria para consulta
+TRABAJOS_HISTORIAL = 50
+
+
+class TrabajoScraping:
+    """Estado de un barrido lanzado en segundo plano"""
+
+    def __init__(self, tipo: str, categoria: str, parametros: Dict):
+        self.id = uuid.uuid4().hex
+        self.tipo = tipo
+        self.categoria = categoria
+        self.parametros = parametros
+        # pendiente, en_curso, completado, incompleto (con ventanas sin resolver), cancelado, error
+        self.estado = "pendiente"
+        self.contexto = ContextoEscaneo()
+        self.creado_en = datetime.now(timezone.utc)
+        self.iniciado_en: Optional[datetime] = None
+        self.finalizado_en: Optional[datetime] = None
+        self._inicio_monotonico: Optional[float] = None
+        self.resultado: Optional[ScrapingResponse] = None
+        self.error: Optional[str] = None
+
+    @property
+    def terminado(self) -> bool:
+        return self.estado in ("completado", "incompleto", "cancelado", "error")
+
+    def progreso(self) -> Dict:
+        """Precios cubiertos, productos encontrados y tiempo restante estimado"""
+        ctx = self.contexto
+        fraccion = (
+            ctx.precios_escaneados / ctx.precios_totales if ctx.precios_totales else 0.0
+        )
+        eta = None
+        if self.estado == "en_curso" and self._inicio_monotonico and fraccion > 0:
+            transcurrido = time.monotonic() - self._inicio_monotonico
+            eta = round(transcurrido * (1 - fraccion) / fraccion, 1)
+
+        return {
+            "precios_escaneados": ctx.precios_escaneados,
+            "precios_totales": ctx.precios_totales,
+            "productos_encontrados": ctx.productos_encontrados,
+            "peticiones_http": ctx.peticiones,
+            "porcentaje": round(fraccion * 100, 1),
+            "eta_segundos": eta,
+        }
+
+    def a_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "tipo": self.tipo,
+            "categoria": self.categoria,
+            "estado": self.estado,
+            "parametros": self.parametros,
+            "creado_en": self.creado_en,
+            "iniciado_en": self.iniciado_en,
+            "finalizado_en": self.finalizado_en,
+            "progreso": self.progreso(),
+            "resultado": self.resultado,
+            "error": self.error,
+        }
+
+
+class GestorTrabajosScraping:
+    """Cola de barridos con progreso consultable y cancelación"""
+
+    def __init__(self, max_simultaneos: int = TRABAJOS_SIMULTANEOS):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_simultaneos, thread_name_prefix="scraping"
+        )
+        self._lock = threading.Lock()
+        self.trabajos: "OrderedDict[str, TrabajoScraping]" = OrderedDict()
+
+    def lanzar(
+        self,
+        tipo: str,
+        categoria: str,
+        parametros: Dict,
+        ejecutar: Callable,
+    ) -> TrabajoScraping:
+        """
+        Encola un barrido. `ejecutar(db, contexto)` debe devolver el dict de
+        resultado del ScraperService; se ejecuta con su propia sesión de BD.
+        """
+        trabajo = TrabajoScraping(tipo, categoria, parametros)
+        with self._lock:
+            self.trabajos[trabajo.id] = trabajo
+            self._purgar()
+        self.executor.submit(self._correr, trabajo, ejecutar)
+        return trabajo
+
+    def _correr(self, trabajo: TrabajoScraping, ejecutar: Callable):
+        if trabajo.contexto.cancelado.is_set():
+            trabajo.estado = "cancelado"
+            trabajo.finalizado_en = datetime.now(timezone.utc)
+            return
+
+        trabajo.estado = "en_curso"
+        trabajo.iniciado_en = datetime.now(timezone.utc)
+        trabajo._inicio_monotonico = time.monotonic()
+
+        db = SessionLocal()
+        try:
+            resultado = ejecutar(db, trabajo.contexto)
+            # Serializar mientras la sesión sigue abierta
+            trabajo.resultado = ScrapingResponse.model_validate(resultado)
+            # Con descargas fallidas el checkpoint queda sin finalizar para reanudar
+            trabajo.estado = (
+                "incompleto"
+                if resultado["estadisticas"].get("ventanas_sin_resolver")
+                else "completado"
+            )
+            try:
+                # Enlazar los productos nuevos con el catálogo
+                emparejador.emparejar(db, origenes=["scraping"])
+            except Exception as e:
+                db.rollback()
+                print(f"⚠️ Error emparejando productos del trabajo {trabajo.id}: {e}")
+        except EscaneoCancelado:
+            db.rollback()
+            trabajo.estado = "cancelado"
+        except Exception as e:
+            db.rollback()
+            print(f"❌ Error en trabajo de scraping {trabajo.id}: {e}")
+            trabajo.error = str(e)
+            trabajo.estado = "error"
+        finally:
+            db.close()
+            trabajo.finalizado_en = datetime.now(timezone.utc)
+
+    def _purgar(self):
+        """Descarta los trabajos terminados más antiguos"""
+        terminados = [t.id for t in self.trabajos.values() if t.terminado]
+        for trabajo_id in terminados[: max(0, len(terminados) - TRABAJOS_HISTORIAL)]:
+            del self.trabajos[trabajo_id]
+
+    def obtener(self, trabajo_id: str) -> Optional[TrabajoScraping]:
+        return self.trabajos.get(trabajo_id)
+
+    def listar(self) -> List[TrabajoScraping]:
+        with self._lock:
+            return list(reversed(self.trabajos.values()))
+
+    def cancelar(self, trabajo_id: str) -> Optional[TrabajoScraping]:
+        """Pide la cancelación; el barrido se detiene antes de su próxima petición"""
+        trabajo = self.obtener(trabajo_id)
+        if trabajo and not trabajo.terminado:
+            trabajo.contexto.cancelado.set()
+            if trabajo.estado == "pendiente":
+                trabajo.estado = "cancelado"
+                trabajo.finalizado_en = datetime.now(timezone.utc)
+        return trabajo
+
+
+# Instancia global del gestor
+trabajos_scraping = GestorTrabajosScraping()
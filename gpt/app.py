@@ -8,6 +8,7 @@ Maneja todas las llamadas a OpenAI desde el bot de WhatsApp
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
+import sys
 import json
 import re
 import unicodedata
@@ -36,14 +37,17 @@ else:
 
 MODEL = os.getenv("AI_MODEL", "gpt-3.5-turbo")
 
+# Caché de respuestas e historial de conversaciones compartidos con el backend
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+from cache_gpt import cache_gpt  # noqa: E402
+from conversaciones import historial_conversaciones  # noqa: E402
+from prompt_conversacion import PROMPT_TOKENS_RESUMEN, constructor_prompt  # noqa: E402
+import extraccion_mensajes  # noqa: E402
+
 # Crear aplicación Flask
 app = Flask(__name__)
 CORS(app)
 
-# Almacenamiento en memoria para historial de conversaciones
-# En producción usar una base de datos real
-conversaciones = {}
-
 
 # ============================================
 # FUNCIONES AUXILIARES
@@ -52,17 +56,38 @@ conversaciones = {}
 
 def obtener_historial_conversacion(numero):
     """Obtiene el historial de conversación de una persona/proveedor"""
-    if numero not in conversaciones:
-        conversaciones[numero] = []
-    return conversaciones[numero]
+    return historial_conversaciones.obtener(numero)
 
 
 def agregar_al_historial(numero, mensaje, tipo="usuario"):
     """Agrega un mensaje al historial de conversación"""
-    if numero not in conversaciones:
-        conversaciones[numero] = []
+    historial_conversaciones.agregar(numero, mensaje, tipo)
 
-    conversaciones[numero].append({"tipo": tipo, "mensaje": mensaje})
+
+def contexto_conversacion(numero):
+    """
+    Historial recortado al presupuesto de tokens del prompt; los turnos que
+    quedan fuera se agregan al resumen acumulado (ver prompt_conversacion.py)
+    """
+    historial = obtener_historial_conversacion(numero)
+    resumido_hasta, resumen = historial_conversaciones.obtener_resumen(numero)
+    por_resumir, recientes = constructor_prompt.dividir(historial, resumido_hasta)
+    if por_resumir:
+        try:
+            resumen = llamar_openai(
+                constructor_prompt.mensajes_resumen(resumen, por_resumir),
+                max_tokens=PROMPT_TOKENS_RESUMEN,
+                temperature=0.3,
+            )
+            historial_conversaciones.guardar_resumen(
+                numero, por_resumir[-1]["id"], resumen
+            )
+            constructor_prompt.contar_resumen()
+        except Exception as e:
+            # Sin resumen nuevo los turnos pendientes van completos en el prompt
+            logger.warning(f"No se pudo actualizar el resumen de {numero}: {e}")
+            recientes = por_resumir + recientes
+    return {"historial": historial, "resumen": resumen, "recientes": recientes}
 
 
 def sanitizar_texto(texto):
@@ -105,7 +130,9 @@ def sanitizar_texto(texto):
     return texto
 
 
-def llamar_openai(mensajes, max_tokens=300, temperature=0.7):
+def llamar_openai(
+    mensajes, max_tokens=300, temperature=0.7, sanitizar=True, cachear=False
+):
     """
     Llamar a la API de OpenAI
 
@@ -113,10 +140,22 @@ def llamar_openai(mensajes, max_tokens=300, temperature=0.7):
         mensajes: Lista de mensajes en formato OpenAI
         max_tokens: Número máximo de tokens
         temperature: Temperatura de creatividad
+        sanitizar: Limpiar el texto para WhatsApp
+        cachear: Reutilizar la respuesta de una llamada idéntica
 
     Returns:
         str: Respuesta del modelo
     """
+    clave = None
+    if cachear:
+        clave = cache_gpt.clave(
+            MODEL, mensajes,
+            max_tokens=max_tokens, temperature=temperature, formato_json=False,
+        )
+        contenido = cache_gpt.obtener(clave)
+        if contenido is not None:
+            return sanitizar_texto(contenido) if sanitizar else contenido
+
     try:
         response = openai.ChatCompletion.create(
             model=MODEL,
@@ -125,7 +164,11 @@ def llamar_openai(mensajes, max_tokens=300, temperature=0.7):
             temperature=temperature,
             timeout=15,
         )
-        return sanitizar_texto(response.choices[0].message.content.strip())
+        contenido = response.choices[0].message.content.strip()
+        if clave:
+            uso = response.get("usage") or {}
+            cache_gpt.guardar(clave, contenido, uso.get("total_tokens", 0))
+        return sanitizar_texto(contenido) if sanitizar else contenido
     except Exception as e:
         logger.error(f"Error llamando a OpenAI: {e}")
         raise
@@ -133,65 +176,15 @@ def llamar_openai(mensajes, max_tokens=300, temperature=0.7):
 
 def extraer_precios_regex(mensaje):
     """
-    Extrae precios del mensaje usando regex
+    Extrae precios del mensaje usando regex (una pasada, ver extraccion_mensajes)
 
     Args:
         mensaje: Texto del mensaje
 
     Returns:
-        dict: Información de precios encontrados
+        dict: Precios tal como aparecen y normalizados, monedas, cantidades y productos
     """
-    # Patrones para detectar precios
-    patrones_precio = [
-        r"\$[\d.,]+",  # $100, $1,000.50
-        r"[\d.,]+\s*(?:pesos|dólares|dolares|bs|soles|pesos)",  # 100 pesos, 50 dólares
-        r"(?:desde|entre|aprox|aproximadamente|costo|precio)\s*[\$]?[\d.,]+",  # desde $100
-    ]
-
-    precios = []
-    for patron in patrones_precio:
-        matches = re.findall(patron, mensaje, re.IGNORECASE)
-        if matches:
-            # Extraer solo los números
-            for match in matches:
-                numeros = re.findall(r"[\d.,]+", match)
-                if numeros:
-                    precios.extend(numeros)
-
-    return {
-        "tienePrecio": len(precios) > 0,
-        "precios": list(set(precios)),  # Eliminar duplicados
-        "metodo": "regex",
-    }
-
-
-def extraer_productos_regex(mensaje):
-    """
-    Extrae nombres de productos del mensaje
-
-    Args:
-        mensaje: Texto del mensaje
-
-    Returns:
-        list: Productos encontrados
-    """
-    productos_buscados = [
-        "silla",
-        "escritorio",
-        "mesa",
-        "armario",
-        "estante",
-        "cajonera",
-        "oficina",
-    ]
-    productos_encontrados = []
-
-    mensaje_lower = mensaje.lower()
-    for producto in productos_buscados:
-        if producto in mensaje_lower:
-            productos_encontrados.append(producto)
-
-    return list(set(productos_encontrados))
+    return extraccion_mensajes.extraer_precios(mensaje)
 
 
 # ============================================
@@ -203,7 +196,14 @@ def extraer_productos_regex(mensaje):
 def health():
     """Verifica el estado del servidor"""
     return jsonify(
-        {"status": "ok", "message": "Servidor de GPT activo", "model": MODEL}
+        {
+            "status": "ok",
+            "message": "Servidor de GPT activo",
+            "model": MODEL,
+            "cache": cache_gpt.metricas(),
+            "historial": historial_conversaciones.resumen(),
+            "prompts": constructor_prompt.resumen(),
+        }
     )
 
 
@@ -231,41 +231,15 @@ def generar_respuesta_empresa():
 
         logger.info(f"Generando respuesta para proveedor {numero_proveedor}")
 
-        # Obtener historial
-        historial = obtener_historial_conversacion(numero_proveedor)
-
         # ============================================
         # EVALUAR SI ES NECESARIO RESPONDER CON IA
         # ============================================
 
-        # Primero usar patrones simples rápidos
-        patrones_sin_respuesta = [
-            r"enseguida te contesto",
-            r"luego te contesto",
-            r"ahorita te contesto",
-            r"un momento",
-            r"espera un segundo",
-            r"deja que",
-            r"dame un minuto",
-            r"estoy ocupado",
-            r"en un momento",
-            r"después te contesto",
-            r"ahora no puedo",
-            r"gracias por esperar",
-            r"recibido",
-            r"copiar",
-            r"entendido",
-        ]
-
-        mensaje_lower = mensaje_proveedor.lower()
-
-        # Verificar si contiene algún patrón de "no responder"
-        necesita_respuesta = True
-        for patron in patrones_sin_respuesta:
-            if re.search(patron, mensaje_lower):
-                necesita_respuesta = False
-                logger.info(f"Patrón detectado: '{patron}' - NO es necesario responder")
-                break
+        # Primero usar patrones simples rápidos (una sola búsqueda precompilada)
+        patron = extraccion_mensajes.patron_sin_respuesta(mensaje_proveedor)
+        necesita_respuesta = patron is None
+        if patron:
+            logger.info(f"Patrón detectado: '{patron}' - NO es necesario responder")
 
         # Si no necesita respuesta por patrón, retornar vacío
         if not necesita_respuesta:
@@ -297,7 +271,9 @@ Responde SOLO con "NO" o "SÍ".""",
         ]
 
         # Llamar a IA para evaluar
-        evaluacion = llamar_openai(mensajes_evaluacion, max_tokens=5, temperature=0)
+        evaluacion = llamar_openai(
+            mensajes_evaluacion, max_tokens=5, temperature=0, cachear=True
+        )
         evaluacion_lower = evaluacion.lower().strip()
 
         if "no" in evaluacion_lower:
@@ -343,27 +319,27 @@ Siempre sé breve y natural, como hablas por chat con colegas de negocios""",
             }
         ]
 
-        # Agregar historial
-        for msg in historial:
-            mensajes_ia.append(
-                {
-                    "role": "assistant" if msg["tipo"] == "bot" else "user",
-                    "content": msg["mensaje"],
-                }
-            )
-
-        # Agregar mensaje actual del proveedor
-        mensajes_ia.append({"role": "user", "content": mensaje_proveedor})
-
         # Si ya tenemos precios, indicar que debe cerrar
+        adicionales = []
         if tiene_precio:
-            mensajes_ia.append(
+            adicionales.append(
                 {
                     "role": "system",
                     "content": "Ya obtuviste información de precios. Agradece de forma profesional y menciona que evaluarás la propuesta y te pondrás en contacto pronto.",
                 }
             )
 
+        # Historial recortado al presupuesto de tokens + resumen de lo anterior
+        contexto = contexto_conversacion(numero_proveedor)
+        mensajes_ia = constructor_prompt.construir(
+            mensajes_ia[0]["content"],
+            contexto["resumen"],
+            contexto["recientes"],
+            mensaje_proveedor,
+            historial_completo=contexto["historial"],
+            adicionales=adicionales,
+        )
+
         # Llamar a OpenAI
         respuesta = llamar_openai(mensajes_ia, max_tokens=200, temperature=0.7)
 
@@ -416,28 +392,12 @@ def extraer_precios():
             logger.info(
                 f"✅ Precios detectados por regex: {resultado_regex['precios']}"
             )
-            return jsonify(
-                {
-                    "tienePrecio": True,
-                    "precios": resultado_regex["precios"],
-                    "productos": extraer_productos_regex(mensaje),
-                    "metodo": "regex",
-                    "exito": True,
-                }
-            )
+            return jsonify({**resultado_regex, "exito": True})
 
         # Si no encuentra precios y tenemos API key, usar IA
         if not os.getenv("OPENAI_API_KEY"):
             logger.warning("API Key no configurada, retornando resultado de regex")
-            return jsonify(
-                {
-                    "tienePrecio": False,
-                    "precios": [],
-                    "productos": extraer_productos_regex(mensaje),
-                    "metodo": "regex",
-                    "exito": True,
-                }
-            )
+            return jsonify({**resultado_regex, "exito": True})
 
         logger.info("Usando IA para analizar precios")
 
@@ -472,7 +432,9 @@ Importante:
             },
         ]
 
-        respuesta_ia = llamar_openai(mensajes_ia, max_tokens=300, temperature=0.3)
+        respuesta_ia = llamar_openai(
+            mensajes_ia, max_tokens=300, temperature=0.3, cachear=True
+        )
 
         logger.info(f"Respuesta IA: {respuesta_ia}")
 
@@ -480,15 +442,7 @@ Importante:
         json_match = re.search(r"\{.*\}", respuesta_ia, re.DOTALL)
         if not json_match:
             logger.warning("No se pudo parsear respuesta de IA")
-            return jsonify(
-                {
-                    "tienePrecio": False,
-                    "precios": [],
-                    "productos": extraer_productos_regex(mensaje),
-                    "metodo": "regex",
-                    "exito": True,
-                }
-            )
+            return jsonify({**resultado_regex, "exito": True})
 
         analisis_ia = json.loads(json_match.group())
 
@@ -578,9 +532,8 @@ def limpiar_historial():
         data = request.get_json()
         numero = data.get("numero")
 
-        if numero in conversaciones:
-            del conversaciones[numero]
-            logger.info(f"Historial limpiado para {numero}")
+        historial_conversaciones.limpiar(numero)
+        logger.info(f"Historial limpiado para {numero}")
 
         return jsonify({"exito": True, "mensaje": "Historial limpiado"})
 
@@ -680,9 +633,8 @@ Contenido del PDF:
 {resumen_paginas}"""
 
         try:
-            response = openai.ChatCompletion.create(
-                model=MODEL,
-                messages=[
+            resultado_texto = llamar_openai(
+                [
                     {
                         "role": "system",
                         "content": "Eres un asistente especializado en analizar catálogos PDF de muebles. Debes identificar páginas sobre muebles de oficina y responder SOLO con JSON válido.",
@@ -691,10 +643,9 @@ Contenido del PDF:
                 ],
                 temperature=0.3,
                 max_tokens=200,
-                timeout=15,
+                sanitizar=False,
+                cachear=True,
             )
-
-            resultado_texto = response.choices[0].message.content.strip()
             logger.info(f"📊 Respuesta de OpenAI: {resultado_texto}")
 
             # Parsear respuesta JSON
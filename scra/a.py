@@ -1,4 +1,4 @@
-import requests
+from sesion_http import sesion
 from bs4 import BeautifulSoup
 import json
 import re
@@ -78,7 +78,7 @@ class ScraperMuebles:
             print(f"🌐 URL: {url}")
             
             try:
-                response = requests.get(url, headers=self.headers, timeout=15)
+                response = sesion.get(url, headers=self.headers, timeout=15)
                 
                 if response.status_code != 200:
                     print(f"❌ Error {response.status_code}")
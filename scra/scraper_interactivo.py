@@ -1,4 +1,4 @@
-import requests
+from sesion_http import sesion
 from bs4 import BeautifulSoup
 import json
 from datetime import datetime
@@ -60,7 +60,7 @@ class ScraperPreciosRapido:
         url = f"{categoria_url}?min_price={precio}&max_price={precio}"
         
         try:
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = sesion.get(url, headers=self.headers, timeout=10)
             if response.status_code == 200:
                 soup = BeautifulSoup(response.text, "html.parser")
                 return self.extraer_productos(soup, precio, categoria_nombre)
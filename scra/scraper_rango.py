@@ -1,4 +1,4 @@
-import requests
+from sesion_http import sesion
 from bs4 import BeautifulSoup
 import json
 import time
@@ -44,7 +44,7 @@ for precio in range(PRECIO_MIN, PRECIO_MAX + 1):
     print(f"[{progreso:5.1f}%] Buscando precio Bs {precio}...", end=" ", flush=True)
     
     try:
-        response = requests.get(url, headers=headers, timeout=30, allow_redirects=True)
+        response = sesion.get(url, headers=headers, timeout=30, allow_redirects=True)
         
         if response.status_code == 200:
             soup = BeautifulSoup(response.text, "html.parser")
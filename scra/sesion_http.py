@@ -0,0 +1,29 @@
+"""
+Sesión HTTP compartida para los scripts de scraping
+Reutiliza conexiones keep-alive y reintenta con backoff exponencial ante
+429/5xx y errores de conexión (respeta Retry-After)
+"""
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def crear_sesion(reintentos=3, backoff=0.5, pool=10):
+    """Crea una sesión con pool de conexiones y reintentos automáticos"""
+    retry = Retry(
+        total=reintentos,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET", "HEAD"),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adaptador = HTTPAdapter(pool_connections=pool, pool_maxsize=pool, max_retries=retry)
+    sesion = requests.Session()
+    sesion.mount("https://", adaptador)
+    sesion.mount("http://", adaptador)
+    return sesion
+
+
+# Sesión global para los scripts
+sesion = crear_sesion()
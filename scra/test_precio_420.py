@@ -1,4 +1,4 @@
-import requests
+from sesion_http import sesion
 from bs4 import BeautifulSoup
 
 # Probar precio específico 420
@@ -18,7 +18,7 @@ headers = {
 
 try:
     print("📡 Haciendo request...")
-    response = requests.get(url, headers=headers, timeout=30, allow_redirects=True)
+    response = sesion.get(url, headers=headers, timeout=30, allow_redirects=True)
     print(f"✅ Status Code: {response.status_code}")
     print(f"📦 Content Length: {len(response.content)} bytes")
     print(f"🔗 URL Final: {response.url}\n")
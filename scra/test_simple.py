@@ -1,4 +1,4 @@
-import requests
+from sesion_http import sesion
 from bs4 import BeautifulSoup
 import json
 import time
@@ -61,7 +61,7 @@ class ScraperPreciosExactos:
         url = f"{categoria_url}?min_price={precio}&max_price={precio}"
         
         try:
-            response = requests.get(url, headers=self.headers, timeout=30, allow_redirects=True)
+            response = sesion.get(url, headers=self.headers, timeout=30, allow_redirects=True)
             if response.status_code == 200:
                 soup = BeautifulSoup(response.text, "html.parser")
                 productos = self.extraer_productos(soup, precio, categoria_nombre)